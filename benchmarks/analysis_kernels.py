@@ -0,0 +1,106 @@
+'''Analysis kernels of the pipeline benchmark: micro time histograms,
+FLIM cubes and cross correlation of decoded EVENT_DTYPE events.
+
+They are reference implementations to time the synthetic streams with,
+not part of bhpy.
+'''
+import numpy as np
+import numpy.typing as npt
+
+
+def histogram(events: npt.NDArray, bins: int, no_of_channels: int = 1) -> npt.NDArray[np.uint32]:
+    '''Returns the micro time histograms of all photon events as an array
+    of shape (no_of_channels, bins). Marker events and events outside of
+    the channel or bin range are ignored.'''
+    photons = events[(events["marker"] == 0)
+                     & (events["channel"] < no_of_channels)
+                     & (events["micro_time"] < bins)]
+    index = photons["channel"].astype(np.intp) * bins + photons["micro_time"]
+    counts = np.bincount(index, minlength=no_of_channels * bins)
+    return counts.astype(np.uint32).reshape(no_of_channels, bins)
+
+
+class FlimBuilder:
+    '''Accumulates photon events into a FLIM cube of shape (lines,
+    pixels, bins) using the pixel, line and frame markers of the stream.
+
+    The position within the scan is kept between calls of add(), so a
+    stream can be fed chunk by chunk. Photons of all frames are summed
+    up, photons before the first pixel/line marker or outside of the
+    image are dropped.
+    '''
+
+    def __init__(self, lines: int, pixels: int, bins: int, channel: int | None = None):
+        self.lines = lines
+        self.pixels = pixels
+        self.bins = bins
+        self.channel = channel
+        self.cube = np.zeros((lines, pixels, bins), dtype=np.uint32)
+        self._pixel = 0
+        self._line = 0
+
+    def reset(self):
+        self.cube[...] = 0
+        self._pixel = 0
+        self._line = 0
+
+    @staticmethod
+    def _positions(counter, start, is_reset):
+        '''Position of each event within the current line/frame, -1
+        before the first tick after a reset.'''
+        count = np.cumsum(counter, dtype=np.int64) + start
+        at_reset = np.maximum.accumulate(np.where(is_reset, count - counter, 0))
+        return count - at_reset - 1, int(count[-1] - at_reset[-1])
+
+    def add(self, events: npt.NDArray) -> npt.NDArray[np.uint32]:
+        if events.size == 0:
+            return self.cube
+        marker = events["marker"]
+        is_pixel = (marker & 0x1) != 0
+        is_line = (marker & 0x2) != 0
+        is_frame = (marker & 0x4) != 0
+
+        pixel, self._pixel = self._positions(is_pixel, self._pixel, is_line)
+        line, self._line = self._positions(is_line, self._line, is_frame)
+
+        photon = ((marker == 0) & (pixel >= 0) & (pixel < self.pixels)
+                  & (line >= 0) & (line < self.lines) & (events["micro_time"] < self.bins))
+        if self.channel is not None:
+            photon &= events["channel"] == self.channel
+
+        index = ((line[photon] * self.pixels + pixel[photon]) * self.bins
+                 + events["micro_time"][photon])
+        counts = np.bincount(index, minlength=self.cube.size)
+        self.cube += counts.astype(np.uint32).reshape(self.cube.shape)
+        return self.cube
+
+
+def cross_correlation(times_a: npt.NDArray, times_b: npt.NDArray, bin_width: int,
+                      max_lag_bins: int) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    '''Normalized cross correlation G(tau) = <a(t)b(t+tau)> / (<a><b>) of
+    two macro time series binned with bin_width.
+
+    Returns the lags (in macro time units) from 0 to max_lag_bins bins
+    and the correlation values.'''
+    times_a = np.asarray(times_a, dtype=np.uint64)
+    times_b = np.asarray(times_b, dtype=np.uint64)
+    if times_a.size == 0 or times_b.size == 0:
+        raise ValueError("times_a and times_b must contain at least one event each")
+    start = min(times_a.min(), times_b.min())
+    stop = max(times_a.max(), times_b.max())
+    length = int((stop - start) // np.uint64(bin_width)) + 1
+    max_lag_bins = min(max_lag_bins, length - 1)
+
+    trace_a = np.bincount(((times_a - start) // np.uint64(bin_width)).astype(np.intp),
+                          minlength=length).astype(np.float64)
+    trace_b = np.bincount(((times_b - start) // np.uint64(bin_width)).astype(np.intp),
+                          minlength=length).astype(np.float64)
+
+    fft_len = 1 << int(np.ceil(np.log2(2 * length)))
+    product = np.conj(np.fft.rfft(trace_a, fft_len)) * np.fft.rfft(trace_b, fft_len)
+    raw = np.fft.irfft(product, fft_len)[:max_lag_bins + 1]
+
+    overlap = length - np.arange(max_lag_bins + 1)
+    norm = trace_a.mean() * trace_b.mean()
+    lags = np.arange(max_lag_bins + 1, dtype=np.int64) * bin_width
+    return lags, raw / overlap / norm
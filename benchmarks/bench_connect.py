@@ -0,0 +1,140 @@
+'''Command round trip and transfer benchmark of the SPCConnect client.
+
+Measures commands/s of BHConnect.command() against a minimal SPCConnect
+answerer on a local socket pair, with the per message crypto as it was
+before (new OAEP ciphers and session key per message), with the cached
+OAEP ciphers and with session key reuse. Like SPCM the answerer decrypts
+the session key of every command and sends every answer with a fresh
+session key, so only the client side crypto differs between the variants.
+The image and trace transfer throughput is measured against the
+SpcConnectEmulator:
+
+    python -m benchmarks.bench_connect --output connect.json
+'''
+import argparse
+import socket
+import tempfile
+import threading
+from time import perf_counter
+
+from Crypto.Cipher import AES, PKCS1_OAEP
+from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
+from Crypto.Util.Padding import pad, unpad
+
+from bhpy.bh_connect import BHConnect, ClientKeyManager, SessionCrypto
+from bhpy.bh_connect_emulator import SpcConnectEmulator
+from benchmarks.bench_utils import write_results
+
+
+class LegacyCrypto:
+    '''The per message crypto of BHConnect before the OAEP ciphers were
+    cached, kept as baseline.'''
+
+    def __init__(self, private_key, server_public_key):
+        self.private_key = private_key
+        self.server_public_key = server_public_key
+
+    def encrypt(self, plain_msg):
+        session_key = get_random_bytes(16)
+        enc_session_key = PKCS1_OAEP.new(self.server_public_key).encrypt(session_key)
+        cipher_aes = AES.new(session_key, AES.MODE_EAX)
+        enc_padded_msg, tag = cipher_aes.encrypt_and_digest(pad(plain_msg, 16))
+        return enc_session_key + cipher_aes.nonce + tag + enc_padded_msg
+
+    def decrypt(self, encrypted_msg):
+        n = self.private_key.size_in_bytes()
+        session_key = PKCS1_OAEP.new(self.private_key).decrypt(encrypted_msg[:n])
+        cipher_aes = AES.new(session_key, AES.MODE_EAX, encrypted_msg[n:n+16])
+        padded_data = cipher_aes.decrypt_and_verify(encrypted_msg[n+32:],
+                                                    encrypted_msg[n+16:n+32])
+        return unpad(padded_data, 16)
+
+    def decrypt_from(self, buffer):
+        # The previous receive decrypted whatever a single recv returned
+        return self.decrypt(bytes(buffer)), len(buffer)
+
+
+def answer(sock: socket.socket, crypto: LegacyCrypto):
+    while True:
+        data = sock.recv(4096)
+        if not data:
+            return
+        crypto.decrypt(data)
+        sock.sendall(crypto.encrypt(b"OK"))
+
+
+def bench_variant(variant: str, client_key, server_key, commands: int) -> dict:
+    client_sock, server_sock = socket.socketpair()
+    # Not SessionCrypto, its session key cache would spare the answerer the RSA decryption of
+    # reused session keys
+    server_crypto = LegacyCrypto(server_key, client_key.public_key())
+    server = threading.Thread(target=answer, args=(server_sock, server_crypto), daemon=True)
+    server.start()
+
+    connection = BHConnect()
+    connection.sock = client_sock
+    if variant == "legacy":
+        connection.crypto = LegacyCrypto(client_key, server_key.public_key())
+    else:
+        connection.crypto = SessionCrypto(client_key, server_key.public_key(),
+                                          reuse_session_key=variant == "reuse_session_key")
+    start = perf_counter()
+    for _ in range(commands):
+        connection.command("Version:number")
+    seconds = perf_counter() - start
+    client_sock.close()
+    server.join()
+    server_sock.close()
+    return {"variant": variant, "commands": commands, "seconds": seconds,
+            "commands_per_s": commands / seconds}
+
+
+def bench_transfers(key_size: int, image_size: int, windows: int, trace_length: int,
+                    repeat: int) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as key_dir, \
+            SpcConnectEmulator(key_size=key_size, image_shape=(image_size, image_size),
+                               windows=windows, trace_length=trace_length,
+                               answer_after_transfer=False) as emulator:
+        for persistent_receiver in (False, True):
+            connection = BHConnect(key_manager=ClientKeyManager(key_dir, key_size=key_size),
+                                   persistent_receiver=persistent_receiver)
+            connection.connect_spcm_instance(*emulator.address)
+            for transfer, func in (
+                    ("trace", connection.get_trace),
+                    ("images", lambda: connection.get_image(window=-1, in_memory=True))):
+                start = perf_counter()
+                no_of_bytes = sum(sum(a.nbytes for a in result) if isinstance(result, list)
+                                  else result.nbytes for result in (func() for _ in range(repeat)))
+                seconds = perf_counter() - start
+                results.append({"variant": f"{transfer}_transfer", "persistent_receiver":
+                                persistent_receiver, "transfers": repeat, "bytes": no_of_bytes,
+                                "seconds": seconds, "transfers_per_s": repeat / seconds,
+                                "bytes_per_s": no_of_bytes / seconds})
+            connection.disconnect_spcm_instance()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--commands", type=int, default=500, help="commands per variant")
+    parser.add_argument("--key-size", type=int, default=2048, help="RSA key size in bits")
+    parser.add_argument("--transfers", type=int, default=20, help="transfers per variant")
+    parser.add_argument("--image-size", type=int, default=512, help="image width and height")
+    parser.add_argument("--windows", type=int, default=4, help="windows per image transfer")
+    parser.add_argument("--trace-length", type=int, default=1 << 20, help="values per trace")
+    parser.add_argument("--output", default=None, help="JSON output file (default: stdout)")
+    args = parser.parse_args()
+
+    client_key = RSA.generate(args.key_size)
+    server_key = RSA.generate(args.key_size)
+    results = [bench_variant(variant, client_key, server_key, args.commands)
+               for variant in ("legacy", "cached_ciphers", "reuse_session_key")]
+    results += bench_transfers(args.key_size, args.image_size, args.windows, args.trace_length,
+                               args.transfers)
+    write_results("connect", results, args.output)
+
+
+if __name__ == '__main__':
+    main()
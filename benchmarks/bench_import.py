@@ -0,0 +1,60 @@
+'''Import time benchmark of bhpy.
+
+Measures the wall time of "import bhpy" and of resolving the top level
+names in fresh interpreters, together with the heavy third party
+packages each step pulls in:
+
+    python -m benchmarks.bench_import --output import.json
+'''
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from benchmarks.bench_utils import write_results
+
+HEAVY_PACKAGES = ["numpy", "zeroconf", "Crypto", "appdirs"]
+
+TARGETS = {
+    "import bhpy": "",
+    "bhpy.SpcQcX04": "bhpy.SpcQcX04",
+    "bhpy.SpcQcX04Conf": "bhpy.SpcQcX04Conf",
+    "bhpy.LVConnectBDU": "bhpy.LVConnectBDU",
+    "bhpy.BHConnect": "bhpy.BHConnect",
+}
+
+SCRIPT = '''
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import bhpy
+{touch}
+seconds = perf_counter() - start
+print(json.dumps({{"seconds": seconds,
+                  "heavy": [p for p in {heavy!r} if p in sys.modules]}}))
+'''
+
+
+def measure(touch: str, repeat: int) -> dict:
+    script = SCRIPT.format(touch=touch, heavy=HEAVY_PACKAGES)
+    runs = [json.loads(subprocess.check_output([sys.executable, "-c", script]))
+            for _ in range(repeat)]
+    seconds = [run["seconds"] for run in runs]
+    return {"min_s": min(seconds), "median_s": statistics.median(seconds),
+            "heavy_packages_loaded": runs[0]["heavy"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=10, help="interpreter starts per target")
+    parser.add_argument("--output", default=None, help="JSON output file (default: stdout)")
+    args = parser.parse_args()
+
+    results = [{"target": target, **measure(touch, args.repeat)}
+               for target, touch in TARGETS.items()]
+    write_results("import", results, args.output)
+
+
+if __name__ == '__main__':
+    main()
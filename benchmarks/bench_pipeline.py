@@ -0,0 +1,139 @@
+'''Throughput benchmark of the acquisition and analysis pipeline.
+
+Measures events/s and bytes/s of the bhpy record file writing/reading
+(spc_tdc_data), PTU export (spc_tdc_export) and SDT writing/reading of the
+FLIM cube (bh_sdt) on a synthetic event stream (benchmarks/synthetic_events.py)
+for a range of chunk sizes. Decoding the stream, histogramming, FLIM building
+and correlation are timed with the reference kernels of the benchmarks
+(benchmarks/analysis_kernels.py), which are not part of bhpy. Runs offline,
+no hardware or dll required:
+
+    python -m benchmarks.bench_pipeline --output pipeline.json
+'''
+import argparse
+import numpy as np
+import tempfile
+from pathlib import Path
+
+from bhpy import bh_sdt, spc_tdc_data, spc_tdc_export
+from benchmarks import analysis_kernels
+from benchmarks.bench_utils import best_of, write_results
+from benchmarks.synthetic_events import EventDecoder, EventLayout, encode_events
+
+LINES = 64
+PIXELS = 64
+
+
+def synthetic_stream(no_of_events: int, layout: EventLayout,
+                     seed: int = 0) -> np.ndarray:
+    '''Returns the raw words of a synthetic FLIM scan: photons on four
+    channels with an exponential decay, interleaved with pixel, line and
+    frame markers.'''
+    rng = np.random.default_rng(seed)
+    bins = layout.micro_time_bins
+    events = np.zeros(no_of_events, dtype=spc_tdc_export.EVENT_DTYPE)
+    events["macro_time"] = np.cumsum(rng.integers(1, 64, no_of_events, dtype=np.uint64))
+    events["micro_time"] = np.minimum(rng.exponential(bins / 8, no_of_events), bins - 1)
+    events["channel"] = rng.integers(0, 4, no_of_events)
+
+    pixel_period = max(no_of_events // (LINES * PIXELS * 4), 1)
+    markers = np.arange(0, no_of_events, pixel_period)
+    events["marker"][markers] = 0x1
+    events["marker"][markers[::PIXELS]] |= 0x2
+    events["marker"][markers[::PIXELS * LINES]] |= 0x4
+    return encode_events(events, layout)
+
+
+def run_stage(stage: str, chunk_events: int, chunks: list[np.ndarray], func, repeat: int
+              ) -> dict:
+    no_of_events = sum(chunk.size for chunk in chunks)
+    no_of_bytes = sum(chunk.nbytes for chunk in chunks)
+
+    def run():
+        for chunk in chunks:
+            func(chunk)
+    seconds = best_of(run, repeat)
+    return {"stage": stage, "chunk_events": chunk_events, "events": int(no_of_events),
+            "bytes": int(no_of_bytes), "seconds": seconds,
+            "events_per_s": no_of_events / seconds, "bytes_per_s": no_of_bytes / seconds}
+
+
+def bench_chunk_size(words: np.ndarray, chunk_events: int, layout: EventLayout,
+                     work_dir: Path, repeat: int) -> list[dict]:
+    raw_chunks = [words[i:i + chunk_events] for i in range(0, words.size, chunk_events)]
+    decoder = EventDecoder(layout)
+    decoded = [decoder.decode(chunk) for chunk in raw_chunks]
+    results = []
+
+    results.append(run_stage("decode", chunk_events, raw_chunks, decoder.decode, repeat))
+
+    def histogram(events):
+        analysis_kernels.histogram(events, layout.micro_time_bins, 4)
+    results.append(run_stage("histogram", chunk_events, decoded, histogram, repeat))
+
+    flim = analysis_kernels.FlimBuilder(LINES, PIXELS, 256)
+    results.append(run_stage("flim", chunk_events, decoded, flim.add, repeat))
+
+    def correlate(events):
+        photons = events[events["marker"] == 0]
+        analysis_kernels.cross_correlation(photons["macro_time"][photons["channel"] == 0],
+                                           photons["macro_time"][photons["channel"] == 1],
+                                           bin_width=256, max_lag_bins=128)
+    results.append(run_stage("correlation", chunk_events, decoded, correlate, repeat))
+
+    record_file = work_dir / f"bench_record_{chunk_events}.data"
+
+    def write_all(_):
+        record_file.unlink(missing_ok=True)
+        for chunk in raw_chunks:
+            spc_tdc_data.write_record_file(record_file, chunk, append=True)
+    results.append(run_stage("file_write", chunk_events, [words], write_all, repeat))
+
+    def read_all(_):
+        for _chunk in spc_tdc_data.iter_record_file(record_file, chunk_events):
+            pass
+    results.append(run_stage("file_read", chunk_events, [words], read_all, repeat))
+
+    ptu_file = work_dir / f"bench_export_{chunk_events}.ptu"
+
+    def export_ptu(_):
+        with spc_tdc_export.PtuWriter(ptu_file, 1e-12, 12.5e-9) as writer:
+            spc_tdc_export.export_stream(decoded, writer)
+    results.append(run_stage("export_ptu", chunk_events, [words], export_ptu, repeat))
+
+    sdt_file = work_dir / f"bench_flim_{chunk_events}.sdt"
+
+    def write_sdt(_):
+        with bh_sdt.SdtWriter(sdt_file) as writer:
+            writer.add_block(flim.cube)
+    results.append(run_stage("sdt_write", chunk_events, [flim.cube], write_sdt, repeat))
+
+    def read_sdt(_):
+        with bh_sdt.SdtFile(sdt_file) as sdt:
+            np.asarray(sdt[0]).sum()
+    results.append(run_stage("sdt_read", chunk_events, [flim.cube], read_sdt, repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--events", type=int, default=4_000_000,
+                        help="number of events of the synthetic stream")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000, 1_000_000],
+                        help="chunk sizes in events")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, best is reported")
+    parser.add_argument("--output", default=None, help="JSON output file (default: stdout)")
+    args = parser.parse_args()
+
+    layout = EventLayout()
+    words = synthetic_stream(args.events, layout)
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for chunk_events in args.chunk_sizes:
+            results += bench_chunk_size(words, chunk_events, layout, Path(work_dir), args.repeat)
+    write_results("pipeline", results, args.output)
+
+
+if __name__ == '__main__':
+    main()
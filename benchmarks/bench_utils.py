@@ -0,0 +1,42 @@
+import datetime
+import importlib.metadata
+import json
+import platform
+import sys
+from time import perf_counter
+
+
+def bhpy_version() -> str:
+    try:
+        return importlib.metadata.version("bhpy")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def best_of(func, repeat: int) -> float:
+    '''Runs func repeat times and returns the fastest run in seconds.'''
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def write_results(benchmark: str, results: list[dict], output: str | None = None) -> dict:
+    '''Writes the results together with a description of the environment
+    as JSON to output (or stdout if output is None).'''
+    report = {"benchmark": benchmark,
+              "bhpy_version": bhpy_version(),
+              "python": sys.version.split(" ")[0],
+              "platform": platform.platform(),
+              "machine": platform.machine(),
+              "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+              "results": results}
+    if output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(output, "w", encoding="utf8") as f:
+            json.dump(report, f, indent=2)
+    return report
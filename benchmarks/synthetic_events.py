@@ -0,0 +1,110 @@
+'''Synthetic 32 bit event streams for the pipeline benchmark.
+
+The word layout is made up for benchmarking the analysis kernels
+(benchmarks/analysis_kernels.py) and the export, it is not the record
+format of SPC-QC-X04, SPC-QC-X08 or PMS-800.
+'''
+import numpy as np
+import numpy.typing as npt
+
+from bhpy.spc_tdc_export import EVENT_DTYPE
+
+
+class EventLayout:
+    '''Bit layout of the 32 bit event words of the synthetic streams.
+
+    From the least significant bit upwards a word holds the micro time,
+    the channel and the macro time. Bit 30 flags a marker event (the
+    channel field then holds the marker bits in the order pixel, line,
+    frame, marker3) and bit 31 flags a macro time overflow word.
+    '''
+
+    MARKER_FLAG = 1 << 30
+    OVERFLOW_FLAG = 1 << 31
+
+    def __init__(self, micro_time_bits: int = 12, channel_bits: int = 4,
+                 macro_time_bits: int = 14):
+        if micro_time_bits + channel_bits + macro_time_bits > 30:
+            raise ValueError("micro_time_bits, channel_bits and macro_time_bits must not exceed "
+                             "30 bits in total")
+        self.micro_time_bits = micro_time_bits
+        self.channel_bits = channel_bits
+        self.macro_time_bits = macro_time_bits
+
+        self.channel_shift = micro_time_bits
+        self.macro_time_shift = micro_time_bits + channel_bits
+        self.micro_time_mask = (1 << micro_time_bits) - 1
+        self.channel_mask = (1 << channel_bits) - 1
+        self.macro_time_mask = (1 << macro_time_bits) - 1
+
+    @property
+    def micro_time_bins(self) -> int:
+        return 1 << self.micro_time_bits
+
+
+class EventDecoder:
+    '''Decodes raw 32 bit event words into EVENT_DTYPE records.
+
+    The decoder keeps the macro time overflow count between calls, so a
+    stream can be decoded chunk by chunk. Overflow words are consumed and
+    do not show up in the output.
+    '''
+
+    def __init__(self, layout: EventLayout | None = None):
+        self.layout = EventLayout() if layout is None else layout
+        self.overflows = 0
+
+    def reset(self):
+        self.overflows = 0
+
+    def decode(self, words: npt.NDArray[np.uint32]) -> npt.NDArray:
+        layout = self.layout
+        words = np.asarray(words, dtype=np.uint32)
+
+        overflow = (words & np.uint32(EventLayout.OVERFLOW_FLAG)) != 0
+        periods = np.cumsum(overflow, dtype=np.uint64)
+        periods += np.uint64(self.overflows)
+        if words.size:
+            self.overflows = int(periods[-1])
+
+        keep = ~overflow
+        words = words[keep]
+        periods = periods[keep]
+
+        events = np.empty(words.size, dtype=EVENT_DTYPE)
+        macro_time = ((words >> np.uint32(layout.macro_time_shift))
+                      & np.uint32(layout.macro_time_mask)).astype(np.uint64)
+        macro_time |= periods << np.uint64(layout.macro_time_bits)
+        events["macro_time"] = macro_time
+        events["micro_time"] = words & np.uint32(layout.micro_time_mask)
+
+        channel = (words >> np.uint32(layout.channel_shift)) & np.uint32(layout.channel_mask)
+        is_marker = (words & np.uint32(EventLayout.MARKER_FLAG)) != 0
+        events["channel"] = np.where(is_marker, 0, channel)
+        events["marker"] = np.where(is_marker, channel, 0)
+        return events
+
+
+def encode_events(events: npt.NDArray, layout: EventLayout | None = None
+                  ) -> npt.NDArray[np.uint32]:
+    '''Encodes EVENT_DTYPE records (sorted by macro time) into raw 32 bit
+    event words, inserting the overflow words the macro time requires.
+
+    This is the inverse of EventDecoder.decode().'''
+    if layout is None:
+        layout = EventLayout()
+    macro_time = events["macro_time"].astype(np.uint64)
+    periods = macro_time >> np.uint64(layout.macro_time_bits)
+    gaps = np.diff(periods, prepend=np.uint64(0)).astype(np.int64)
+
+    is_marker = events["marker"] != 0
+    field = np.where(is_marker, events["marker"], events["channel"]).astype(np.uint32)
+    words = ((events["micro_time"].astype(np.uint32) & np.uint32(layout.micro_time_mask))
+             | ((field & np.uint32(layout.channel_mask)) << np.uint32(layout.channel_shift))
+             | ((macro_time & np.uint64(layout.macro_time_mask)).astype(np.uint32)
+                << np.uint32(layout.macro_time_shift)))
+    words[is_marker] |= np.uint32(EventLayout.MARKER_FLAG)
+
+    stream = np.full(events.size + int(gaps.sum()), EventLayout.OVERFLOW_FLAG, dtype=np.uint32)
+    stream[np.arange(events.size) + np.cumsum(gaps)] = words
+    return stream
@@ -1,8 +1,72 @@
-from bhpy.bh_connect import BHConnect  # noqa
+import importlib
+import typing
 
-from bhpy.bh_device_scan_wrapper import BHDeviceScan  # noqa
+if typing.TYPE_CHECKING:
+    from bhpy.bh_connect import BHConnect, TraceSubscription  # noqa
+    from bhpy.bh_connect_async import AsyncBHConnect  # noqa
+    from bhpy.bh_connect_emulator import SpcConnectEmulator  # noqa
+    from bhpy.bh_discovery import SpcmDiscovery  # noqa
+    from bhpy.bh_fit_scheduler import FitJob, FitJobScheduler  # noqa
 
-from bhpy.bh_lv_wrapper import LVConnectQC008, LVConnectBDU  # noqa
+    from bhpy.bh_device_scan_wrapper import BHDeviceScan  # noqa
 
-from bhpy.spc_tdc_config import SpcQcX04Conf, SpcQcX08Conf, Pms800Conf  # noqa
-from bhpy.spc_tdc_wrapper import SpcQcX04, SpcQcX08, Pms800, ModuleInit, TdcLiterals, Markers  # noqa
+    from bhpy.bh_lv_wrapper import LVConnectQC008, LVConnectQC008Group, LVConnectBDU  # noqa
+
+    from bhpy.spc_tdc_config import SpcQcX04Conf, SpcQcX08Conf, Pms800Conf  # noqa
+    from bhpy.spc_tdc_wrapper import SpcQcX04, SpcQcX08, Pms800, ModuleInit, TdcLiterals, Markers  # noqa
+    from bhpy.spc_tdc_export import PtuWriter, PhotonHdf5Writer  # noqa
+    from bhpy.bh_sdt import SdtFile, SdtWriter  # noqa
+
+# The public names are resolved on first access, so importing bhpy only pulls in the modules (and
+# their dependencies like zeroconf, pycryptodome or numpy) that are actually used.
+_lazy_names = {
+    "BHConnect": "bhpy.bh_connect",
+    "TraceSubscription": "bhpy.bh_connect",
+    "AsyncBHConnect": "bhpy.bh_connect_async",
+    "SpcConnectEmulator": "bhpy.bh_connect_emulator",
+    "SpcmDiscovery": "bhpy.bh_discovery",
+    "FitJob": "bhpy.bh_fit_scheduler",
+    "FitJobScheduler": "bhpy.bh_fit_scheduler",
+
+    "BHDeviceScan": "bhpy.bh_device_scan_wrapper",
+
+    "LVConnectQC008": "bhpy.bh_lv_wrapper",
+    "LVConnectQC008Group": "bhpy.bh_lv_wrapper",
+    "LVConnectBDU": "bhpy.bh_lv_wrapper",
+
+    "SpcQcX04Conf": "bhpy.spc_tdc_config",
+    "SpcQcX08Conf": "bhpy.spc_tdc_config",
+    "Pms800Conf": "bhpy.spc_tdc_config",
+    "SpcQcX04": "bhpy.spc_tdc_wrapper",
+    "SpcQcX08": "bhpy.spc_tdc_wrapper",
+    "Pms800": "bhpy.spc_tdc_wrapper",
+    "ModuleInit": "bhpy.spc_tdc_wrapper",
+    "TdcLiterals": "bhpy.spc_tdc_wrapper",
+    "Markers": "bhpy.spc_tdc_wrapper",
+    "PtuWriter": "bhpy.spc_tdc_export",
+    "PhotonHdf5Writer": "bhpy.spc_tdc_export",
+    "SdtFile": "bhpy.bh_sdt",
+    "SdtWriter": "bhpy.bh_sdt",
+}
+
+_submodules = {"bh_connect", "bh_connect_async", "bh_connect_emulator", "bh_device_scan_wrapper",
+               "bh_discovery", "bh_dll", "bh_fit_scheduler", "bh_lv_wrapper", "bh_sdt",
+               "bh_telemetry", "bh_tiff", "spc_tdc_config", "spc_tdc_data", "spc_tdc_export",
+               "spc_tdc_wrapper"}
+
+__all__ = list(_lazy_names)
+
+
+def __getattr__(name):
+    if name in _lazy_names:
+        value = getattr(importlib.import_module(_lazy_names[name]), name)
+    elif name in _submodules:
+        value = importlib.import_module(f"bhpy.{name}")
+    else:
+        raise AttributeError(f"module 'bhpy' has no attribute '{name}'")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | _submodules)
@@ -3,17 +3,25 @@ log = logging.getLogger(__name__)
 
 try:
     import socket
-    from zeroconf import Zeroconf, ServiceStateChange
+    from bhpy.bh_discovery import SpcmDiscovery, default_discovery
     from Crypto.Random import get_random_bytes
     from Crypto.Cipher import AES, PKCS1_OAEP
+    from Crypto.Hash import CMAC
     from Crypto.Util.Padding import pad, unpad
     import threading
+    import time
     from Crypto.PublicKey import RSA
     import appdirs
     from pathlib import Path
     import socketserver
+    import numpy as np
     from queue import Queue
-    from typing import Literal
+    from collections import OrderedDict, deque
+    from concurrent.futures import Future, ThreadPoolExecutor
+    import concurrent.futures
+    from typing import Iterable, Iterator, Literal
+    from bhpy.bh_telemetry import CallStats, TransferStats
+    from bhpy.bh_tiff import decode_tiff
 except ModuleNotFoundError as err:
     # Error handling
     log.error(err)
@@ -24,12 +32,105 @@ class CustomTCPServer(socketserver.TCPServer):
     def __init__(self, server_address, request_handler_class,
                  request_handler_queue, done_queue=None,
                  bind_and_activate=True, all_windows=False,
-                 file_name=None):
+                 file_name=None, receive_buffer: bytearray = None):
         super().__init__(server_address, request_handler_class, bind_and_activate)
         self.file_name = file_name
         self.all_windows = all_windows
         self.request_handler_queue = request_handler_queue
         self.done_queue = done_queue
+        # Images are decoded in memory instead of written to the temp directory if set
+        self.receive_buffer = receive_buffer
+
+    def get_request(self):
+        # A stalled transfer fails after timeout instead of blocking the receive
+        request, client_address = super().get_request()
+        request.settimeout(self.timeout)
+        return request, client_address
+
+    def handle_timeout(self):
+        raise TimeoutError("SPCM did not send the requested data in time")
+
+
+def _recv_all_into(sock: socket.socket, buffer: bytearray) -> int:
+    '''Receives into buffer until the peer closes the connection, doubling
+    the buffer whenever it is full. Returns the number of bytes received.'''
+    received = 0
+    while True:
+        if received == len(buffer):
+            buffer.extend(bytes(max(len(buffer), 4096)))
+        with memoryview(buffer) as view:
+            try:
+                n = sock.recv_into(view[received:])
+            except ConnectionResetError:
+                break
+        if not n:
+            break
+        received += n
+    return received
+
+
+def _recv_exactly(sock: socket.socket, view: memoryview) -> int:
+    '''Fills view from sock with recv_into. Returns the number of bytes
+    received, which is only less than len(view) if the peer closed or
+    reset the connection early.'''
+    received = 0
+    while received < len(view):
+        try:
+            n = sock.recv_into(view[received:])
+        except ConnectionResetError:
+            break
+        if not n:
+            break
+        received += n
+    return received
+
+
+def _receive_image_name(sock: socket.socket) -> str:
+    '''Receives the name header of an image transfer (EOT ends a sequence).'''
+    length = bytearray(1)
+    if _recv_exactly(sock, memoryview(length)) < 1:
+        raise ConnectionError("Image transfer closed before its name was sent")
+    name = bytearray(length[0])
+    _recv_exactly(sock, memoryview(name))
+    return name.decode()
+
+
+def _receive_image(sock: socket.socket, filename: str, receive_buffer: bytearray = None):
+    '''Receives the TIFF data of an image transfer. Returns the decoded image
+    if a receive_buffer is given, otherwise the path of the file written to
+    the temp directory.'''
+    if receive_buffer is not None:
+        size = _recv_all_into(sock, receive_buffer)
+        with memoryview(receive_buffer) as view:
+            return decode_tiff(view[:size])
+    image_dir = (f"{appdirs.user_data_dir(appauthor='BH',appname='bhpy')}SPCConnect/temp/"
+                 f"{filename}")
+    Path(image_dir).parent.mkdir(parents=True, exist_ok=True)
+    with open(image_dir, 'wb') as f:
+        data = sock.recv(4096)
+        while data:
+            f.write(data)
+            try:
+                data = sock.recv(4096)
+            except ConnectionResetError:
+                break
+    return image_dir
+
+
+def _receive_trace(sock: socket.socket) -> np.ndarray:
+    '''Receives a trace transfer: the number of values followed by the
+    values as little endian uint32.'''
+    header = bytearray(4)
+    if _recv_exactly(sock, memoryview(header)) < len(header):
+        return np.empty(0, dtype='<u4')
+    values_to_receive = int.from_bytes(header, byteorder='little', signed=False)
+    trace = np.empty(values_to_receive, dtype='<u4')
+    received = _recv_exactly(sock, memoryview(trace).cast('B'))
+    if received < trace.nbytes:
+        log.warning(f"Trace transfer ended after {received // 4} of {values_to_receive} "
+                    "values")
+        trace = trace[:received // 4]
+    return trace
 
 
 class _ImageReceiveHandler(socketserver.BaseRequestHandler):
@@ -38,36 +139,25 @@ class _ImageReceiveHandler(socketserver.BaseRequestHandler):
         self.all_windows = server.all_windows
         self.request_handler_queue: Queue = server.request_handler_queue
         self.done_queue: Queue = server.done_queue
+        self.receive_buffer: bytearray = server.receive_buffer
         super().__init__(request, client_address, server)
 
     def finish(self) -> None:
         return super().finish()
 
     def handle(self):
-        data = self.request.recv(1)
-        if self.all_windows or self.file_name is None:
-            filename = self.request.recv(int.from_bytes(data)).decode()
+        # Failures are queued in place of the image, get_image raises them
+        try:
+            filename = _receive_image_name(self.request)
             if filename == 'EOT':
                 self.done_queue.put(True)
                 return
-        else:
-            filename = self.file_name
-            dummy_read = self.request.recv(int.from_bytes(data)).decode()
-            if dummy_read == 'EOT':
-                self.done_queue.put(True)
-                return
-        image_dir = (f"{appdirs.user_data_dir(appauthor='BH',appname='bhpy')}SPCConnect/temp/"
-                     f"{filename}")
-        self.request_handler_queue.put(image_dir)
-        Path(image_dir).parent.mkdir(parents=True, exist_ok=True)
-        with open(image_dir, 'wb') as f:
-            data = self.request.recv(4096)
-            while data:
-                f.write(data)
-                try:
-                    data = self.request.recv(4096)
-                except ConnectionResetError:
-                    break
+            if not (self.all_windows or self.file_name is None):
+                filename = self.file_name
+            self.request_handler_queue.put(_receive_image(self.request, filename,
+                                                          self.receive_buffer))
+        except Exception as e:
+            self.request_handler_queue.put(e)
 
 
 class _TraceReceiveHandler(socketserver.BaseRequestHandler):
@@ -79,23 +169,595 @@ class _TraceReceiveHandler(socketserver.BaseRequestHandler):
         return super().finish()
 
     def handle(self):
-        trace_vals = []
-        data = self.request.recv(4)
-        values_to_receive = int.from_bytes(data, byteorder='little', signed=False)
-        while values_to_receive > len(trace_vals):
+        try:
+            self.request_handler_queue.put(_receive_trace(self.request))
+        except Exception as e:
+            self.request_handler_queue.put(e)
+
+
+class _Transfer:
+    '''A data transfer a command is waiting for: the images until EOT or
+    a single trace.'''
+
+    def __init__(self, in_memory: bool = False):
+        self.in_memory = in_memory
+        self.results: list[Future] = []  # one per image, in the order SPCM announced them
+        self.future = Future()
+
+
+class _EndpointTCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, request_handler_class, endpoint: "_ReceiveEndpoint"):
+        super().__init__(('', 0), request_handler_class)
+        self.endpoint = endpoint
+
+
+class _EndpointImageServer(_EndpointTCPServer):
+    '''Image listener of a _ReceiveEndpoint. The name header of every image
+    is read in the accept thread, which keeps the transfers in SPCM's order,
+    the image data is then received by a worker thread so the windows of a
+    multi-window transfer are received in parallel.'''
+
+    def __init__(self, endpoint: "_ReceiveEndpoint"):
+        super().__init__(None, endpoint)
+
+    def process_request(self, request, client_address):
+        try:
+            keep_open = self.endpoint.accept_image(request)
+        except Exception:
+            self.handle_error(request, client_address)
+            keep_open = False
+        if not keep_open:
+            self.shutdown_request(request)
+
+
+class _EndpointTraceHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        transfer = self.server.endpoint.next_trace_transfer()
+        if transfer is None:
+            log.warning("Dropping unexpected trace transfer")
+            return
+        try:
+            trace = _receive_trace(self.request)
+        except Exception as e:
+            if not transfer.future.done():
+                transfer.future.set_exception(e)
+        else:
+            if not transfer.future.done():
+                transfer.future.set_result(trace)
+
+
+class _ReceiveEndpoint:
+    '''Long-lived image and trace listeners of a BHConnect.
+
+    Both listeners run on background threads for the lifetime of the
+    connection. SPCM does not tag its transfers, so they are routed to the
+    waiting calls in the order the calls were registered (expect_image /
+    expect_trace before sending the getData command), images and traces
+    independently of each other. The images of multi-window transfers are
+    received in parallel by up to max_parallel_images threads.
+    '''
+
+    NAME_TIMEOUT_S = 5.0
+
+    def __init__(self, max_parallel_images: int = 16):
+        self.__lock = threading.Lock()
+        self.__image_transfers: deque[_Transfer] = deque()
+        self.__trace_transfers: deque[_Transfer] = deque()
+        self.__image_receivers = ThreadPoolExecutor(max_parallel_images,
+                                                    thread_name_prefix="bhpy-image-receiver")
+        # Reused by in memory image transfers (one per receiver thread), grows to the largest
+        # image received
+        self.__receive_buffers = threading.local()
+
+        self.image_server = _EndpointImageServer(self)
+        self.trace_server = _EndpointTCPServer(_EndpointTraceHandler, self)
+        self.__threads = [threading.Thread(target=server.serve_forever, daemon=True,
+                                           name=f"bhpy-{name}-receiver")
+                          for name, server in (("image", self.image_server),
+                                               ("trace", self.trace_server))]
+        for thread in self.__threads:
+            thread.start()
+
+    @property
+    def image_port(self) -> int:
+        return self.image_server.server_address[1]
+
+    @property
+    def trace_port(self) -> int:
+        return self.trace_server.server_address[1]
+
+    def expect_image(self, in_memory: bool = False) -> _Transfer:
+        transfer = _Transfer(in_memory)
+        with self.__lock:
+            self.__image_transfers.append(transfer)
+        return transfer
+
+    def expect_trace(self) -> _Transfer:
+        transfer = _Transfer()
+        with self.__lock:
+            self.__trace_transfers.append(transfer)
+        return transfer
+
+    def cancel(self, transfer: _Transfer):
+        '''Withdraws a transfer whose getData command failed.'''
+        with self.__lock:
+            for transfers in (self.__image_transfers, self.__trace_transfers):
+                for i, queued in enumerate(transfers):
+                    if queued is transfer:
+                        del transfers[i]
+                        break
+        transfer.future.cancel()
+
+    def __receive_image(self, sock: socket.socket, filename: str, in_memory: bool):
+        try:
+            receive_buffer = None
+            if in_memory:
+                receive_buffer = getattr(self.__receive_buffers, "buffer", None)
+                if receive_buffer is None:
+                    receive_buffer = self.__receive_buffers.buffer = bytearray(1 << 20)
+            return _receive_image(sock, filename, receive_buffer)
+        finally:
+            self.image_server.shutdown_request(sock)
+
+    @staticmethod
+    def __finish_image_transfer(transfer: _Transfer):
+        '''Completes the transfer once all of its images are received.'''
+        remaining = [len(transfer.results)]
+        lock = threading.Lock()
+
+        def image_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if transfer.future.done():  # cancelled
+                return
             try:
-                data = self.request.recv(4096)
-            except ConnectionResetError:
-                break
-            for x in range(0, len(data), 4):
-                trace_vals.append(int.from_bytes(data[x:x+4], byteorder='little', signed=False))
-        self.request_handler_queue.put(trace_vals)
+                images = [image.result() for image in transfer.results]
+            except Exception as e:
+                transfer.future.set_exception(e)
+            else:
+                transfer.future.set_result(images)
+
+        if not transfer.results and not transfer.future.done():
+            transfer.future.set_result([])
+        for image in transfer.results:
+            image.add_done_callback(image_done)
+
+    def accept_image(self, sock: socket.socket) -> bool:
+        '''Reads the name header of an incoming image connection and hands
+        the connection to a receiver thread. Returns whether the connection
+        is kept open for that.'''
+        # A sender stalling before its name would otherwise block all transfers
+        sock.settimeout(self.NAME_TIMEOUT_S)
+        try:
+            filename = _receive_image_name(sock)
+        except Exception as e:
+            # Fails the transfer the image belongs to once its EOT arrives
+            with self.__lock:
+                transfer = self.__image_transfers[0] if self.__image_transfers else None
+            if transfer is None:
+                raise
+            failed = Future()
+            failed.set_exception(e)
+            transfer.results.append(failed)
+            return False
+        with self.__lock:
+            transfer = self.__image_transfers[0] if self.__image_transfers else None
+            if transfer is not None and filename == 'EOT':
+                self.__image_transfers.popleft()
+        if transfer is None:
+            log.warning(f"Dropping unexpected image transfer '{filename}'")
+            return False
+        if filename == 'EOT':
+            self.__finish_image_transfer(transfer)
+            return False
+        sock.settimeout(None)
+        transfer.results.append(self.__image_receivers.submit(self.__receive_image, sock,
+                                                              filename, transfer.in_memory))
+        return True
+
+    def next_trace_transfer(self) -> _Transfer | None:
+        with self.__lock:
+            return self.__trace_transfers.popleft() if self.__trace_transfers else None
+
+    def close(self):
+        for server in (self.image_server, self.trace_server):
+            server.shutdown()
+            server.server_close()
+        self.__image_receivers.shutdown(wait=False)
+        with self.__lock:
+            pending = list(self.__image_transfers) + list(self.__trace_transfers)
+            self.__image_transfers.clear()
+            self.__trace_transfers.clear()
+        for transfer in pending:
+            if not transfer.future.done():
+                transfer.future.set_exception(ConnectionError("Receive endpoint closed"))
+
+
+class ClientKeyManager:
+    '''Provides the client RSA key pair used for the SPCConnect handshake.
+
+    The key pair is persisted as cli_private.pem in key_dir and reused
+    across sessions, so connecting does not have to generate a new 2048
+    bit key every time. With max_age_s set the key is rotated once it is
+    older than that, and its successor is generated on a background thread
+    ahead of time (once less than prefetch_fraction of the lifetime is
+    left), so rotating does not block the connect either.
+    '''
+
+    def __init__(self, key_dir: Path | str = None, key_size: int = 2048,
+                 max_age_s: float = None, prefetch_fraction: float = 0.1):
+        if key_dir is None:
+            key_dir = f"{appdirs.user_data_dir(appauthor='BH',appname='bhpy')}SPCConnect"
+        self.key_dir = Path(key_dir)
+        self.key_size = key_size
+        self.max_age_s = max_age_s
+        self.prefetch_fraction = prefetch_fraction
+
+        self.__lock = threading.Lock()  # guards the next key
+        self.__state_lock = threading.RLock()  # guards the current key
+        self.__key = None
+        self.__created = None
+        self.__next_key = None
+        self.__next_key_thread: threading.Thread = None
+
+    @property
+    def private_key_file(self) -> Path:
+        return self.key_dir / "cli_private.pem"
+
+    def __generate_next_key(self):
+        key = RSA.generate(self.key_size)
+        with self.__lock:
+            self.__next_key = key
+
+    def prefetch(self):
+        '''Starts generating the next key pair on a background thread, unless
+        one is already generated or being generated.'''
+        with self.__lock:
+            if self.__next_key is not None or (self.__next_key_thread is not None
+                                               and self.__next_key_thread.is_alive()):
+                return
+            self.__next_key_thread = threading.Thread(target=self.__generate_next_key,
+                                                      name="bhpy-key-generation", daemon=True)
+            self.__next_key_thread.start()
+
+    def __take_next_key(self):
+        self.prefetch()
+        self.__next_key_thread.join()
+        with self.__lock:
+            key, self.__next_key = self.__next_key, None
+        return key
+
+    def __load(self):
+        try:
+            key = RSA.import_key(self.private_key_file.read_bytes())
+        except (OSError, ValueError, IndexError, TypeError) as e:
+            log.info(f"No usable cached client key ({e}), generating a new one")
+            return
+        if key.has_private() and key.size_in_bits() == self.key_size:
+            self.__key = key
+            self.__created = self.private_key_file.stat().st_mtime
+
+    def __store(self, key):
+        self.key_dir.mkdir(parents=True, exist_ok=True)
+        self.private_key_file.write_bytes(key.export_key())
+        (self.key_dir / "send_cli_public.pem").write_bytes(key.public_key().export_key())
+        self.__key = key
+        self.__created = self.private_key_file.stat().st_mtime
+
+    def __age(self) -> float:
+        return time.time() - self.__created
+
+    def rotate(self):
+        '''Replaces the current key pair by a new one.'''
+        with self.__state_lock:
+            self.__store(self.__take_next_key())
+
+    def get_key(self) -> RSA.RsaKey:
+        '''Returns the current private key, loading, generating or rotating
+        it as necessary.'''
+        with self.__state_lock:
+            if self.__key is None:
+                self.__load()
+            if self.__key is None or (self.max_age_s is not None
+                                      and self.__age() >= self.max_age_s):
+                self.rotate()
+            elif (self.max_age_s is not None
+                  and self.__age() >= self.max_age_s * (1 - self.prefetch_fraction)):
+                self.prefetch()
+            return self.__key
+
+
+_default_key_manager = None
+_default_key_manager_lock = threading.Lock()
+
+
+def default_key_manager() -> ClientKeyManager:
+    '''Returns the key manager shared by all BHConnect instances that are
+    not given their own.'''
+    global _default_key_manager
+    with _default_key_manager_lock:
+        if _default_key_manager is None:
+            _default_key_manager = ClientKeyManager()
+        return _default_key_manager
+
+
+def _cmac_subkey(cipher_ecb) -> bytes:
+    '''Returns the CMAC subkey K1 for complete last blocks.'''
+    value = int.from_bytes(cipher_ecb.encrypt(bytes(16)), "big") << 1
+    if value >> 128:
+        value = (value & ((1 << 128) - 1)) ^ 0x87
+    return value.to_bytes(16, "big")
+
+
+class _EaxScan:
+    '''Finds the length of the EAX (empty header) cipher text at the start
+    of a growing buffer that matches tag.
+
+    The EAX tag is OMAC0(nonce) ^ OMAC1(header) ^ OMAC2(cipher text). The
+    CBC-MAC states of OMAC2 for every boundary come out of a single CBC
+    encryption of the data, the final CMAC block of every candidate out of
+    a single ECB encryption, so all boundaries are checked in two passes.
+    The CBC state is kept between feed() calls, so every byte is scanned
+    once however often the buffer grows.'''
+
+    def __init__(self, session_key: bytes, nonce: bytes, tag: bytes):
+        self.session_key = session_key
+        self.__cipher_ecb = AES.new(session_key, AES.MODE_ECB)
+        self.__k1 = np.frombuffer(_cmac_subkey(self.__cipher_ecb), dtype=np.uint8)
+        omac = bytes(x ^ y for x, y in zip(
+            CMAC.new(session_key, bytes(16) + nonce, ciphermod=AES).digest(),
+            CMAC.new(session_key, bytes(15) + b"\x01", ciphermod=AES).digest()))
+        self.__expected = np.frombuffer(bytes(x ^ y for x, y in zip(omac, tag)),
+                                        dtype=np.uint8)
+        # CBC-MAC state after the OMAC2 prefix block
+        self.__state = AES.new(session_key, AES.MODE_CBC, iv=bytes(16)).encrypt(
+            bytes(15) + b"\x02")
+        self.scanned = 0
+
+    def feed(self, data) -> int | None:
+        '''Returns the cipher text length, or None if no 16 byte boundary of
+        data matches yet. data must start with the data of earlier calls.'''
+        blocks = len(data) // 16
+        if blocks * 16 <= self.scanned:
+            return None
+        new_data = bytes(data[self.scanned:blocks * 16])
+        states = np.frombuffer(self.__state + AES.new(
+            self.session_key, AES.MODE_CBC, iv=self.__state).encrypt(new_data),
+            dtype=np.uint8).reshape(-1, 16)
+        message = np.frombuffer(new_data, dtype=np.uint8).reshape(-1, 16)
+        last_blocks = states[:-1] ^ message ^ self.__k1
+        tags = np.frombuffer(self.__cipher_ecb.encrypt(last_blocks.tobytes()),
+                             dtype=np.uint8).reshape(-1, 16)
+        matches = np.flatnonzero((tags == self.__expected).all(axis=1))
+        if matches.size:
+            return self.scanned + (int(matches[0]) + 1) * 16
+        self.__state = states[-1].tobytes()
+        self.scanned = blocks * 16
+        return None
+
+
+def _eax_message_length(session_key: bytes, nonce: bytes, tag: bytes, data) -> int | None:
+    '''Returns the length of the EAX (empty header) cipher text at the start
+    of data that matches tag, or None if no 16 byte boundary matches.'''
+    return _EaxScan(session_key, nonce, tag).feed(data)
+
+
+class SessionCrypto:
+    '''Message encryption of one SPCConnect connection.
+
+    Every SPCConnect v2 message is the RSA (OAEP) encrypted AES session key
+    followed by the EAX nonce, tag and the padded cipher text. The OAEP
+    cipher objects are created once per connection instead of per message
+    and decrypted session keys of received messages are cached, so a key
+    repeated by the peer costs no RSA decryption.
+
+    With reuse_session_key the client sends every message with the same
+    session key (and therefore the same RSA encrypted key block) and a
+    fresh random nonce, which saves the RSA encryption per command. The
+    peer decrypts every message independently, so this stays within the
+    protocol.
+    '''
+
+    SESSION_KEY_CACHE_SIZE = 64
+
+    def __init__(self, private_key: RSA.RsaKey, server_public_key: RSA.RsaKey = None,
+                 reuse_session_key: bool = False):
+        self.private_key = private_key
+        self.private_key_size = private_key.size_in_bytes()
+        self.reuse_session_key = reuse_session_key
+        self.__rsa_decryptor = PKCS1_OAEP.new(private_key)
+        self.__rsa_encryptor = None
+        self.__session = None
+        self.__session_keys = OrderedDict()
+        self.__scan = None
+        if server_public_key is not None:
+            self.set_server_public_key(server_public_key)
+
+    def set_server_public_key(self, server_public_key: RSA.RsaKey):
+        self.__rsa_encryptor = PKCS1_OAEP.new(server_public_key)
+        self.__session = None
+
+    def __outgoing_session(self) -> tuple[bytes, bytes]:
+        if self.__session is None or not self.reuse_session_key:
+            session_key = get_random_bytes(16)
+            self.__session = (session_key, self.__rsa_encryptor.encrypt(session_key))
+        return self.__session
+
+    def session_key(self, enc_session_key: bytes) -> bytes:
+        '''Returns the decrypted session key of a received message.'''
+        session_key = self.__session_keys.get(enc_session_key)
+        if session_key is None:
+            session_key = self.__rsa_decryptor.decrypt(enc_session_key)
+            self.__session_keys[enc_session_key] = session_key
+            if len(self.__session_keys) > self.SESSION_KEY_CACHE_SIZE:
+                self.__session_keys.popitem(last=False)
+        else:
+            self.__session_keys.move_to_end(enc_session_key)
+        return session_key
+
+    def encrypt(self, plain_msg: bytes) -> bytes:
+        session_key, enc_session_key = self.__outgoing_session()
+        cipher_aes = AES.new(session_key, AES.MODE_EAX)  # fresh random nonce per message
+        enc_padded_msg, tag = cipher_aes.encrypt_and_digest(pad(plain_msg, 16))
+        return enc_session_key + cipher_aes.nonce + tag + enc_padded_msg
+
+    def decrypt_from(self, buffer: bytes | bytearray | memoryview) -> tuple[bytes, int] | None:
+        '''Decrypts the first message of buffer, which may hold several
+        messages back to back. Messages carry no length, so the end of the
+        cipher text is found by checking the EAX tag at every 16 byte
+        boundary. The scan of an incomplete message is kept until the next
+        call, which only scans the bytes received since. Returns the plain
+        message and the number of bytes it took, or None if buffer does not
+        hold a complete message yet.'''
+        n = self.private_key_size
+        header = n + 32
+        if len(buffer) < header + 16:
+            return None
+        message_header = bytes(buffer[:header])
+        if self.__scan is None or self.__scan[0] != message_header:
+            session_key = self.session_key(message_header[:n])
+            self.__scan = (message_header, _EaxScan(session_key, message_header[n:n+16],
+                                                    message_header[n+16:]))
+        scan = self.__scan[1]
+        length = scan.feed(buffer[header:])
+        if length is None:
+            return None
+        self.__scan = None
+        end = header + length
+        padded_data = AES.new(scan.session_key, AES.MODE_EAX, message_header[n:n+16]
+                              ).decrypt_and_verify(buffer[header:end], message_header[n+16:])
+        return unpad(padded_data, 16), end
+
+    def decrypt(self, encrypted_msg: bytes) -> bytes:
+        n = self.private_key_size
+        encrypted_msg = bytes(encrypted_msg)
+        session_key = self.session_key(encrypted_msg[:n])
+        nonce = encrypted_msg[n:n+16]
+        tag = encrypted_msg[n+16:n+32]
+        cipher_aes = AES.new(session_key, AES.MODE_EAX, nonce)
+        padded_data = cipher_aes.decrypt_and_verify(encrypted_msg[n+32:], tag)
+        return unpad(padded_data, 16)
+
+
+def parse_answer(answer: str):
+    '''Converts an SPCConnect answer into the result of a command: True
+    for "OK", the value (as float if numeric) for "OK:<value>". Raises
+    ValueError for anything else.'''
+    if answer.startswith("OK"):
+        if answer.startswith("OK:"):
+            answer = answer.split(':', 1)[1]
+            try:
+                value = float(answer.strip("\x00"))
+                return value
+            except ValueError:
+                return answer
+            except Exception as e:
+                print(f"Adjust this to catch the specific exception: {e}")
+                return answer
+        return True
+    else:
+        raise ValueError(f'SPCM responded with:"{answer}"')
+
+
+def check_protocol_version(protocol_version_str: str):
+    protocol_version = [int(x) for x in protocol_version_str.split(' ')[1].split('.')]
+    if protocol_version[0] != 2:
+        raise RuntimeError('Wrong SPCConnect protocol version ('
+                           f'{protocol_version_str}). BHConnect is suited '
+                           'for SPCConnect protocol V 2.0.0 up until, but '
+                           'not including V 3.0.0')
+
+
+def image_command(port: int, window=1, cycle=1, image_type="1stMoment",
+                  fit_config: tuple[str, int] = None, tau_channel: str = None) -> str:
+    '''Returns the getData command requesting images to be sent to port.'''
+    if fit_config is None:
+        fit_config_cmd = ''
+    else:
+        fit_config_cmd = f',config,{fit_config[0]},{fit_config[1]}'
+    if window == -1:
+        window_selection = ''
+    else:
+        window_selection = f',{window},{cycle}'
+    if image_type == "Fit":
+        return f"getData:fitimage,{port},tiff{window_selection}{fit_config_cmd}"
+    elif image_type == "Fitted":
+        return f"getData:fittedimage,{port},tiff{window_selection}"
+    elif image_type == 'TauChannel':
+        return f'getData:tauchannel,{port},tiff,{window},{tau_channel}'
+    elif image_type == 'TauChannels':
+        return f'getData:tauchannel,{port},tiff,{window}'
+    else:
+        return f"getData:image,{port},tiff{window_selection}"
+
+
+def _result_size(result) -> int:
+    '''Size in bytes of a received image or trace, either an array or the
+    path of the file it was written to.'''
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    return Path(result).stat().st_size
+
+
+class _ParameterCache:
+    '''The setparameter values SPCM acknowledged with OK, so repeating them
+    can be skipped.
+
+    Commands that load or change the setup (load* commands and load / setup
+    menu entries) change parameters on the SPCM side and clear the cache.
+    pressmenu is always sent, it triggers actions in SPCM (e.g. get_trace
+    relies on the system parameter menu being pressed again), but only
+    clears the cache for those menu entries.'''
+
+    SETUP_COMMAND_PREFIXES = ("load",)
+    SETUP_MENU_ENTRIES = ("load", "setup")
+
+    def __init__(self):
+        self.values: dict[str, str] = {}
+
+    @staticmethod
+    def entry(command: str) -> tuple[str, str] | None:
+        name, _, arguments = command.partition(":")
+        if name == "setparameter":
+            parameter, _, value = arguments.partition(",")
+            return parameter.strip(), value.strip()
+        return None
+
+    @classmethod
+    def invalidates(cls, command: str) -> bool:
+        '''Whether command loads or changes the setup.'''
+        name, _, arguments = command.partition(":")
+        if name == "pressmenu":
+            return any(entry in arguments.lower() for entry in cls.SETUP_MENU_ENTRIES)
+        return name.lower().startswith(cls.SETUP_COMMAND_PREFIXES)
+
+    def hit(self, command: str) -> bool:
+        entry = self.entry(command)
+        return entry is not None and entry[0] in self.values and \
+            self.values[entry[0]] == entry[1]
+
+    def update(self, command: str, acknowledged: bool):
+        entry = self.entry(command)
+        if entry is None:
+            if self.invalidates(command):
+                self.values.clear()
+        elif acknowledged:
+            self.values[entry[0]] = entry[1]
+        else:
+            # SPCM rejected the value, the current one is unknown
+            self.values.pop(entry[0], None)
 
 
 class BHConnect():
     IMAGE_TYPES = Literal["1stMoment", "Fit", "Fitted", "TauChannel"]
 
-    def __init__(self, host=None, port=None):
+    def __init__(self, host=None, port=None, key_manager: ClientKeyManager = None,
+                 reuse_session_key: bool = False, discovery: SpcmDiscovery = None,
+                 persistent_receiver: bool = False, cache_parameters: bool = False):
         self.host = host
         self.port = port
         self.sock: socket.socket = None
@@ -104,55 +766,75 @@ class BHConnect():
 
         self.private_key = None
         self.private_key_size = None
+        self.key_manager = default_key_manager() if key_manager is None else key_manager
+        self.reuse_session_key = reuse_session_key
+        self.crypto: SessionCrypto = None
+        # Received but not yet decrypted data, reused for all answers
+        self.__receive_buffer = bytearray(1 << 16)
+        self.__received = 0
 
         self.service_info = None
+        self.discovery = discovery
 
-    def __on_service_state_change(self, zeroconf: Zeroconf, service_type, name, state_change):
-        if state_change is ServiceStateChange.Added:
-            a = zeroconf.get_service_info(service_type, name)
-            if a.name == f"SPCMRemoteControl:{self.mdns_service_id}._bhipc._tcp.local.":
-                self.service_info = a
-                self.wait.set()
-
-    def __encrypt_msg(self, plain_msg):
-        # generate session key
-        session_key = get_random_bytes(16)
+        # Reused by in memory image transfers, grows to the largest image received
+        self.__image_buffer = bytearray(1 << 20)
 
-        # encrypt session key with public server rsa key
-        cipher_rsa = PKCS1_OAEP.new(self.server_public_key)
-        enc_session_key = cipher_rsa.encrypt(session_key)
-
-        # encrypt public server key with session key
-        cipher_aes = AES.new(session_key, AES.MODE_EAX)
-        padded_msg = pad(plain_msg, 16)
-        enc_padded_msg, tag = cipher_aes.encrypt_and_digest(padded_msg)
-        return (enc_session_key + cipher_aes.nonce + tag + enc_padded_msg)
-
-    def __decrypt_msg(self, encrypted_msg):
-        n = self.private_key_size
-        enc_session_key = encrypted_msg[:n]
-        nonce = encrypted_msg[n:n+16]
-        tag = encrypted_msg[n+16:n+32]
-        cipher_text = encrypted_msg[n+32:]
+        # With persistent_receiver images and traces are received by listeners that live as long
+        # as the connection instead of a new server per transfer
+        self.persistent_receiver = persistent_receiver
+        # Seconds get_image and get_trace wait for the data (None waits forever)
+        self.transfer_timeout: float = 120.0
+        self.__endpoint: _ReceiveEndpoint = None
+        self.__command_lock = threading.RLock()
 
-        cipher_rsa = PKCS1_OAEP.new(self.private_key)
-        session_key = cipher_rsa.decrypt(enc_session_key)
+        self._stats: dict[str, CallStats] = {}
+        self._instrumented = False
 
-        cipher_aes = AES.new(session_key, AES.MODE_EAX, nonce)
-        padded_data = cipher_aes.decrypt_and_verify(cipher_text, tag)
+        # With cache_parameters setparameter commands repeating the acknowledged value are
+        # answered from the cache
+        self.cache_parameters = cache_parameters
+        self.__parameter_cache = _ParameterCache()
 
-        return (unpad(padded_data, 16))
+    def __encrypt_msg(self, plain_msg):
+        return self.crypto.encrypt(plain_msg)
 
     def __send(self, data):
         msg = self.__encrypt_msg(data)
         # print(f"Sending: {data}\nTo: {self.sock}")
         self.sock.sendall(msg)
 
-    def __receive(self):
-        data = self.sock.recv(4096)
-        answer = self.__decrypt_msg(data)
-        # print(f"Receiving: {answer}\nFrom: {self.sock}")
-        return answer
+    def __receive(self, phases: list[float] = None):
+        '''Receives the next answer. Answers sent back to back or split over
+        several segments are framed by SessionCrypto.decrypt_from.
+
+        If given, the time spent waiting for data and decrypting is added to
+        phases[0] and phases[1].'''
+        while True:
+            if self.__received:
+                if phases is not None:
+                    start = time.perf_counter()
+                with memoryview(self.__receive_buffer) as view:
+                    message = self.crypto.decrypt_from(view[:self.__received])
+                if phases is not None:
+                    phases[1] += time.perf_counter() - start
+                if message is not None:
+                    answer, size = message
+                    remaining = self.__received - size
+                    self.__receive_buffer[:remaining] = self.__receive_buffer[size:self.__received]
+                    self.__received = remaining
+                    # print(f"Receiving: {answer}\nFrom: {self.sock}")
+                    return answer
+            if self.__received == len(self.__receive_buffer):
+                self.__receive_buffer.extend(bytes(len(self.__receive_buffer)))
+            if phases is not None:
+                start = time.perf_counter()
+            with memoryview(self.__receive_buffer) as view:
+                n = self.sock.recv_into(view[self.__received:])
+            if phases is not None:
+                phases[0] += time.perf_counter() - start
+            if not n:
+                raise ConnectionError("SPCM closed the connection")
+            self.__received += n
 
     def __wait_host_port(self, host, port, duration=1):
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -169,27 +851,24 @@ class BHConnect():
             s.close()
 
     def find_spcm_instance(self, service_id: int = 1):
+        '''Looks up the SPCM instance with service_id through the shared
+        discovery service (or the one given to the constructor). Known
+        instances are returned without waiting for a new announcement.'''
         instance_found = False
         if service_id is None:
             service_id = 1
-        self.service_info = []
-        self.mdns_service_id = service_id
-        self.mdns_id_counter = 0
+        discovery = default_discovery() if self.discovery is None else self.discovery
         retries = 0
         while retries < 3:
-            zeroconf = Zeroconf()
-            zeroconf.add_service_listener("_bhipc._tcp.local.",
-                                          listener=(self.__on_service_state_change,))
-            self.wait = threading.Event()
-            self.wait.wait(3)
-            zeroconf.remove_all_service_listeners()
+            self.service_info = discovery.lookup(service_id, timeout=3)
             if self.service_info:
-                host = self.service_info.server.split('.', 1)[0]
+                host = self.service_info.host
                 if self.__wait_host_port(host, self.service_info.port):
                     instance_found = True
                     self.host = host
                     self.port = self.service_info.port
                     break
+                discovery.forget(service_id)
             retries += 1
 
         if not instance_found:
@@ -217,61 +896,241 @@ class BHConnect():
             host = self.host
             port = self.port
 
+        self.invalidate_parameter_cache()
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.connect((host, port))
 
-        self.private_key = RSA.generate(2048)
+        self.private_key = self.key_manager.get_key()
         self.private_key_size = self.private_key.size_in_bytes()
         self.public_key = self.private_key.public_key()
+        self.crypto = SessionCrypto(self.private_key, reuse_session_key=self.reuse_session_key)
 
-        app_data_dir = f"{appdirs.user_data_dir(appauthor='BH',appname='bhpy')}SPCConnect"
-        Path(app_data_dir).mkdir(parents=True, exist_ok=True)
-        with open(f"{app_data_dir}/cli_private.pem", "wb") as f:
-            f.write(self.private_key.export_key())
-        with open(f"{app_data_dir}/send_cli_public.pem", "wb") as f:
-            f.write(self.public_key.export_key())
+        app_data_dir = self.key_manager.key_dir
         self.sock.sendall(self.public_key.export_key())
-        enc_data = self.sock.recv(4096)
-        data = self.__decrypt_msg(enc_data)
+        self.__received = 0
+        data = self.__receive()
         with open(f"{app_data_dir}/svr_public.pem", "wb") as f:
             f.write(data)
         self.server_public_key = RSA.import_key(data)
-        protocol_version_str = self.command("Version:number")
-        protocol_version = [int(x) for x in protocol_version_str.split(' ')[1].split('.')]
-        if protocol_version[0] != 2:
-            raise RuntimeError('Wrong SPCConnect protocol version ('
-                               f'{protocol_version_str}). BHConnect is suited '
-                               'for SPCConnect protocol V 2.0.0 up until, but '
-                               'not including V 3.0.0')
+        self.crypto.set_server_public_key(self.server_public_key)
+        check_protocol_version(self.command("Version:number"))
         return self.command("Version:number")
 
     def disconnect_spcm_instance(self):
+        self.invalidate_parameter_cache()
+        if self.__endpoint is not None:
+            self.__endpoint.close()
+            self.__endpoint = None
         self.sock.close()
 
     def shutdown_spcm_instance(self):
+        self.invalidate_parameter_cache()
         self.__send(bytearray([0xFE]))
 
-    def command(self, command) -> str:
-        self.__send((f"${command}$").encode("ascii"))
-        answer = self.__receive().decode()
+    def invalidate_parameter_cache(self):
+        '''Forgets all cached parameter values, e.g. after the parameters
+        were changed in SPCM directly.'''
+        with self.__command_lock:
+            self.__parameter_cache.values.clear()
 
-        if answer.startswith("OK"):
-            if answer.startswith("OK:"):
-                answer = answer.split(':', 1)[1]
+    def cached_parameters(self) -> dict[str, str]:
+        '''Returns the cached setparameter values by parameter name.'''
+        with self.__command_lock:
+            return dict(self.__parameter_cache.values)
+
+    def command(self, command) -> str:
+        if self.cache_parameters:
+            with self.__command_lock:
+                if self.__parameter_cache.hit(command):
+                    return True
                 try:
-                    value = float(answer.strip("\x00"))
-                    return value
+                    result = self.__command(command)
                 except ValueError:
-                    return answer
-                except Exception as e:
-                    print(f"Adjust this to catch the specific exception: {e}")
-                    return answer
-            return True
-        else:
-            raise ValueError(f'SPCM responded with:"{answer}"')
+                    self.__parameter_cache.update(command, False)
+                    raise
+                self.__parameter_cache.update(command, True)
+                return result
+        return self.__command(command)
+
+    def __command(self, command) -> str:
+        if self._instrumented:
+            return self.__instrumented_command(command)
+        with self.__command_lock:
+            self.__send((f"${command}$").encode("ascii"))
+            answer = self.__receive().decode()
+        return parse_answer(answer)
+
+    def __stats(self, name: str, stats_type=CallStats) -> CallStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats.setdefault(name, stats_type())
+        return stats
+
+    def __instrumented_command(self, command) -> str:
+        wait_decrypt = [0.0, 0.0]
+        with self.__command_lock:
+            start = time.perf_counter()
+            msg = self.__encrypt_msg((f"${command}$").encode("ascii"))
+            encrypted = time.perf_counter()
+            self.sock.sendall(msg)
+            sent = time.perf_counter()
+            answer = self.__receive(wait_decrypt).decode()
+            end = time.perf_counter()
+        self.__stats("command").record(end - start)
+        self.__stats("command.encrypt").record(encrypted - start)
+        self.__stats("command.send").record(sent - encrypted)
+        self.__stats("command.wait").record(wait_decrypt[0])
+        self.__stats("command.decrypt").record(wait_decrypt[1])
+        return parse_answer(answer)
+
+    def __timed_transfer(self, name: str, transfer):
+        if not self._instrumented:
+            return transfer()
+        start = time.perf_counter()
+        result = transfer()
+        seconds = time.perf_counter() - start
+        no_of_bytes = sum(_result_size(r) for r in result) if isinstance(result, list) else \
+            _result_size(result)
+        self.__stats(name, TransferStats).record(seconds, no_of_bytes)
+        return result
+
+    @property
+    def instrumented(self) -> bool:
+        return self._instrumented
+
+    def enable_instrumentation(self):
+        '''Starts recording latency histograms of command() split into the
+        encrypt, send, wait (for SPCM's answer) and decrypt phases, and of
+        get_image() and get_trace() including the bytes received.'''
+        self._instrumented = True
+
+    def disable_instrumentation(self):
+        '''Stops recording statistics. Already recorded statistics are kept
+        until reset_stats() is called.'''
+        self._instrumented = False
+
+    def reset_stats(self):
+        for stats in self._stats.values():
+            stats.reset()
+
+    def stats(self) -> dict[str, dict]:
+        '''Returns the recorded statistics by name: command and its phases
+        command.encrypt, command.send, command.wait and command.decrypt,
+        get_image and get_trace. Each entry holds calls, total_s, mean_s,
+        max_s and histogram, the transfers additionally bytes, bytes_per_s
+        and size_histogram (lists of [upper bound, count] pairs of all
+        non-empty buckets).'''
+        return {name: stats.as_dict() for name, stats in sorted(self._stats.items())
+                if stats.calls}
+
+    def command_batch(self, commands: list[str], max_in_flight: int = None) -> list:
+        '''Sends the commands back to back without waiting for the answers in
+        between and returns their results in order. The result of a command
+        SPCM answered with an error is the ValueError command() would have
+        raised, the remaining commands are still executed.
+
+        With cache_parameters, commands repeating a cached value are not
+        sent (result True).
+
+        max_in_flight limits how many commands are sent ahead of their
+        answers (default: all of them).'''
+        with self.__command_lock:
+            if not self.cache_parameters:
+                return self.__command_batch(commands, max_in_flight)
+            # Only skip commands whose cache entry no earlier command of the batch touches
+            skip = []
+            touched = set()
+            for command in commands:
+                entry = _ParameterCache.entry(command)
+                if entry is None:
+                    if _ParameterCache.invalidates(command):
+                        touched = None
+                    skip.append(False)
+                    continue
+                skip.append(touched is not None and entry[0] not in touched and
+                            self.__parameter_cache.hit(command))
+                if touched is not None:
+                    touched.add(entry[0])
+            sent = [command for command, cached in zip(commands, skip) if not cached]
+            answers = iter(self.__command_batch(sent, max_in_flight))
+            results = []
+            for command, cached in zip(commands, skip):
+                result = True if cached else next(answers)
+                if not cached:
+                    self.__parameter_cache.update(command, not isinstance(result, ValueError))
+                results.append(result)
+            return results
+
+    def __command_batch(self, commands: list[str], max_in_flight: int = None) -> list:
+        if max_in_flight is None:
+            max_in_flight = len(commands)
+        results = []
+        sent = 0
+        while len(results) < len(commands):
+            while sent < len(commands) and sent - len(results) < max_in_flight:
+                self.__send((f"${commands[sent]}$").encode("ascii"))
+                sent += 1
+            answer = self.__receive().decode()
+            try:
+                results.append(parse_answer(answer))
+            except ValueError as e:
+                results.append(e)
+        return results
+
+    def __receive_endpoint(self) -> _ReceiveEndpoint:
+        with self.__command_lock:
+            if self.__endpoint is None:
+                self.__endpoint = _ReceiveEndpoint()
+            return self.__endpoint
+
+    def __request_transfer(self, register, command) -> _Transfer:
+        '''Registers a transfer with the receive endpoint and sends the getData
+        command (built for the endpoint) for it. Both happen under the command
+        lock, so the transfers arrive in the order they were registered.'''
+        endpoint = self.__receive_endpoint()
+        with self.__command_lock:
+            transfer = register(endpoint)
+            try:
+                self.command(command(endpoint))
+            except BaseException:
+                endpoint.cancel(transfer)
+                raise
+        return transfer
+
+    def __transfer_result(self, transfer: _Transfer):
+        '''Waits for a transfer of the receive endpoint. A timed out transfer
+        is withdrawn, the following transfers would be routed to it
+        otherwise.'''
+        try:
+            return transfer.future.result(self.transfer_timeout)
+        # Only the builtin TimeoutError from Python 3.11 on
+        except concurrent.futures.TimeoutError:
+            self.__receive_endpoint().cancel(transfer)
+            raise TimeoutError("SPCM did not send the requested data in time") from None
 
     def get_image(self, window=1, cycle=1, image_type: IMAGE_TYPES = "1stMoment",
-                  fit_config: tuple[str, int] = None, tau_channel: str = None):
+                  fit_config: tuple[str, int] = None, tau_channel: str = None,
+                  in_memory: bool = False):
+        '''Requests images from SPCM. Returns the paths of the received TIFF
+        files in the temp directory, or with in_memory the decoded images as
+        numpy arrays (received without touching the disk) in the order they
+        were sent.'''
+        return self.__timed_transfer("get_image", lambda: self.__get_image(
+            window, cycle, image_type, fit_config, tau_channel, in_memory))
+
+    def __request_images(self, window, cycle, image_type, fit_config, tau_channel,
+                         in_memory) -> _Transfer:
+        return self.__request_transfer(
+            lambda endpoint: endpoint.expect_image(in_memory),
+            lambda endpoint: image_command(endpoint.image_port, window, cycle, image_type,
+                                           fit_config, tau_channel))
+
+    def __get_image(self, window, cycle, image_type, fit_config, tau_channel, in_memory):
+        if self.persistent_receiver:
+            transfer = self.__request_images(window, cycle, image_type, fit_config, tau_channel,
+                                             in_memory)
+            return self.__transfer_result(transfer)
+
         file_name = None
         all_windows = window == -1
         request_handler_queue = Queue()
@@ -281,58 +1140,213 @@ class BHConnect():
                                               file_name=file_name,
                                               all_windows=all_windows,
                                               request_handler_queue=request_handler_queue,
-                                              done_queue=done_queue)
-        # server_thread = threading.Thread(target=file_receive_server.serve_forever)
-        # server_thread.start()
-
-        port = file_receive_server.server_address[1]
-        if fit_config is None:
-            fit_config_cmd = ''
-        else:
-            fit_config_cmd = f',config,{fit_config[0]},{fit_config[1]}'
-        if all_windows:
-            window_selection = ''
-        else:
-            window_selection = f',{window},{cycle}'
-        if image_type == "Fit":
-            self.command(f"getData:fitimage,{port},tiff{window_selection}{fit_config_cmd}")
-        elif image_type == "Fitted":
-            self.command(f"getData:fittedimage,{port},tiff{window_selection}")
-        elif image_type == 'TauChannel':
-            self.command(f'getData:tauchannel,{port},tiff,{window},{tau_channel}')
-        elif image_type == 'TauChannels':
-            all_windows = True
-            response = self.command(f'getData:tauchannel,{port},tiff,{window}')
-        else:
-            self.command(f"getData:image,{port},tiff{window_selection}")
-        while done_queue.empty():
-            file_receive_server.handle_request()
+                                              done_queue=done_queue,
+                                              receive_buffer=(self.__image_buffer if in_memory
+                                                              else None))
+        try:
+            port = file_receive_server.server_address[1]
+            self.command(image_command(port, window, cycle, image_type, fit_config, tau_channel))
+            deadline = (None if self.transfer_timeout is None
+                        else time.monotonic() + self.transfer_timeout)
+            while done_queue.empty():
+                if deadline is not None:
+                    file_receive_server.timeout = max(deadline - time.monotonic(), 0.0)
+                file_receive_server.handle_request()
+        finally:
+            file_receive_server.server_close()
 
         response = []
         while not request_handler_queue.empty():
             response.append(request_handler_queue.get())
+        for image in response:
+            if isinstance(image, Exception):
+                raise image
         return response
-        # file_receive_server.shutdown() # string_command is waiting for the response which itself
-        # is
-        # send after the image transfer is done therefore the server can be shut down
-        # print(filename, end='', flush=True)
 
-    def get_trace(self, trace_type=11, trace_number=1):
+    def iter_images(self, cycles: Iterable[int] = (1,), windows: Iterable[int] = (1,),
+                    image_type: IMAGE_TYPES = "1stMoment", fit_config: tuple[str, int] = None,
+                    tau_channel: str = None, in_memory: bool = True,
+                    prefetch: int = 2) -> Iterator[tuple[int, int, list]]:
+        '''Streams the images of all windows for all cycles (cycle by cycle)
+        and yields (window, cycle, images) with images as get_image returns
+        them:
+
+            for window, cycle, (image,) in spcm.iter_images(range(1, 101)):
+                ...
+
+        Up to prefetch further getData requests are sent while a transfer is
+        still being received and decoded, so the series is pulled at network
+        rather than round trip speed. Requires the persistent receiver, the
+        images are requested one by one otherwise. Requests already sent are
+        still received (and discarded) if the generator is closed early.'''
+        requests = ((window, cycle) for cycle in cycles for window in windows)
+        if not self.persistent_receiver:
+            for window, cycle in requests:
+                yield window, cycle, self.get_image(window, cycle, image_type, fit_config,
+                                                    tau_channel, in_memory)
+            return
+
+        pending: deque[tuple[int, int, _Transfer]] = deque()
+        try:
+            for window, cycle in requests:
+                pending.append((window, cycle, self.__request_images(
+                    window, cycle, image_type, fit_config, tau_channel, in_memory)))
+                if len(pending) > prefetch:
+                    window, cycle, transfer = pending.popleft()
+                    yield window, cycle, self.__transfer_result(transfer)
+            while pending:
+                window, cycle, transfer = pending.popleft()
+                yield window, cycle, self.__transfer_result(transfer)
+        finally:
+            # SPCM sends the requested images regardless, receive them so they are not routed
+            # to the next transfer
+            for _, _, transfer in pending:
+                try:
+                    self.__transfer_result(transfer)
+                except Exception as e:
+                    log.warning(f"Discarding prefetched images failed: {e}")
+
+    def get_trace(self, trace_type=11, trace_number=1) -> np.ndarray:
+        '''Requests a decay trace from SPCM and returns it as uint32 array.'''
+        return self.__timed_transfer("get_trace", lambda: self.__get_trace(trace_number))
+
+    def __get_trace(self, trace_number):
+        if self.persistent_receiver:
+            transfer = self.__request_transfer(
+                lambda endpoint: endpoint.expect_trace(),
+                lambda endpoint: (f"getData:trace,{endpoint.trace_port},imagedecay,"
+                                  f"{trace_number-1}"))
+            return self.__transfer_result(transfer)
+
         request_handler_queue = Queue()
         file_receive_server = CustomTCPServer(('', 0), _TraceReceiveHandler,
                                               bind_and_activate=True,
                                               request_handler_queue=request_handler_queue)
-        # server_thread = threading.Thread(target=file_receive_server.serve_forever)
-        # server_thread.start()
-
-        # IPAddr = socket.gethostbyname(socket.gethostname())
-
-        port = file_receive_server.server_address[1]
-        self.command(f"getData:trace,{port},imagedecay,{trace_number-1}")
-        file_receive_server.handle_request()
-        return request_handler_queue.get()
+        file_receive_server.timeout = self.transfer_timeout
+        try:
+            port = file_receive_server.server_address[1]
+            self.command(f"getData:trace,{port},imagedecay,{trace_number-1}")
+            file_receive_server.handle_request()
+        finally:
+            file_receive_server.server_close()
+        trace = request_handler_queue.get()
+        if isinstance(trace, Exception):
+            raise trace
+        return trace
 
     def set_image_size(self, width, height):
         self.command("pressmenu:systemparameter")
         self.command(f"setparameter:pixelx,{width}")
         self.command(f"setparameter:pixely,{height}")
+
+
+class TraceSubscription:
+    '''Polls decay traces from SPCM at a fixed rate on a background thread
+    into a preallocated ring buffer of the last capacity traces:
+
+        with TraceSubscription(spcm, rate_hz=20, capacity=200) as traces:
+            ...
+            timestamps, latest = traces.latest(10)
+
+    latest() returns copies and never waits for the next poll. The buffer is
+    allocated for trace_length values, or on the first trace if None, and
+    reallocated (dropping the stored traces) if the trace length changes.
+    Use a BHConnect with persistent_receiver=True, so every poll costs a
+    single command.
+    '''
+
+    def __init__(self, connection: BHConnect, rate_hz: float = 10.0, capacity: int = 100,
+                 trace_number: int = 1, trace_length: int = None):
+        self.connection = connection
+        self.interval_s = 1 / rate_hz
+        self.capacity = capacity
+        self.trace_number = trace_number
+        self.errors = 0
+        self.last_error: Exception = None
+
+        self.__lock = threading.Condition()
+        self.__traces: np.ndarray = None
+        self.__timestamps = np.zeros(capacity, dtype=np.float64)
+        self.__count = 0
+        # Traces in the buffer since it was (re)allocated
+        self.__stored = 0
+        if trace_length is not None:
+            self.__traces = np.zeros((capacity, trace_length), dtype='<u4')
+        self.__stop = threading.Event()
+        self.__thread: threading.Thread = None
+
+    @property
+    def count(self) -> int:
+        '''Number of traces received since the subscription started.'''
+        return self.__count
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        if not self.running:
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__poll, daemon=True,
+                                             name="bhpy-trace-subscription")
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __store(self, timestamp: float, trace: np.ndarray):
+        with self.__lock:
+            if self.__traces is None or self.__traces.shape[1] != trace.size:
+                if self.__traces is not None:
+                    log.warning(f"Trace length changed from {self.__traces.shape[1]} to "
+                                f"{trace.size}, dropping the stored traces")
+                self.__traces = np.zeros((self.capacity, trace.size), dtype='<u4')
+                self.__stored = 0
+            slot = self.__count % self.capacity
+            self.__traces[slot] = trace
+            self.__timestamps[slot] = timestamp
+            self.__count += 1
+            self.__stored += 1
+            self.__lock.notify_all()
+
+    def __poll(self):
+        next_poll = time.monotonic()
+        while not self.__stop.is_set():
+            try:
+                trace = self.connection.get_trace(trace_number=self.trace_number)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                log.warning(f"Trace subscription poll failed: {e}")
+            else:
+                self.__store(time.time(), trace)
+            next_poll = max(next_poll + self.interval_s, time.monotonic())
+            self.__stop.wait(next_poll - time.monotonic())
+
+    def latest(self, n: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        '''Returns the timestamps (s since the epoch) and the traces (one per
+        row) of the last n received traces, oldest first. Fewer are returned
+        if fewer were received.'''
+        with self.__lock:
+            n = min(n, self.__stored, self.capacity)
+            if n == 0:
+                length = 0 if self.__traces is None else self.__traces.shape[1]
+                return np.empty(0), np.empty((0, length), dtype='<u4')
+            slots = np.arange(self.__count - n, self.__count) % self.capacity
+            return self.__timestamps[slots], self.__traces[slots]
+
+    def wait(self, count: int = 1, timeout: float = None) -> bool:
+        '''Waits until count traces were received in total, returns False on
+        timeout.'''
+        with self.__lock:
+            return self.__lock.wait_for(lambda: self.__count >= count, timeout)
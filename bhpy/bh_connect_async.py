@@ -0,0 +1,242 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import asyncio
+    from pathlib import Path
+    import numpy as np
+    from Crypto.PublicKey import RSA
+    import appdirs
+    from bhpy.bh_connect import (BHConnect, ClientKeyManager, SessionCrypto,
+                                 check_protocol_version, default_key_manager, image_command,
+                                 parse_answer)
+    from bhpy.bh_tiff import decode_tiff
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+class AsyncBHConnect():
+    '''asyncio counterpart of BHConnect.
+
+    Commands, the handshake and the data transfers run on asyncio streams,
+    the image and trace receivers are asyncio servers, so one event loop
+    can drive many SPCM instances in parallel:
+
+        async def main():
+            spcms = [AsyncBHConnect(host, port) for host, port in instances]
+            await asyncio.gather(*(spcm.connect_spcm_instance() for spcm in spcms))
+            images = await asyncio.gather(*(spcm.get_image(in_memory=True)
+                                            for spcm in spcms))
+
+    Commands to one instance are serialized, the crypto (SessionCrypto)
+    and key handling (ClientKeyManager) are shared with BHConnect.
+    '''
+    IMAGE_TYPES = BHConnect.IMAGE_TYPES
+
+    def __init__(self, host=None, port=None, key_manager: ClientKeyManager = None,
+                 reuse_session_key: bool = False):
+        self.host = host
+        self.port = port
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+
+        self.server_public_key = None
+        self.private_key = None
+        self.key_manager = default_key_manager() if key_manager is None else key_manager
+        self.reuse_session_key = reuse_session_key
+        self.crypto: SessionCrypto = None
+        # Seconds get_image and get_trace wait for the data (None waits forever)
+        self.transfer_timeout: float = 120.0
+
+        self.__receive_buffer = bytearray()
+        self.__command_lock = asyncio.Lock()
+
+    # The RSA (OAEP) session key encryption and decryption run in a worker thread, they would
+    # otherwise stall every other instance driven by the event loop
+    async def __send(self, data: bytes):
+        self.writer.write(await asyncio.to_thread(self.crypto.encrypt, data))
+        await self.writer.drain()
+
+    async def __receive(self) -> bytes:
+        while True:
+            if self.__receive_buffer:
+                message = await asyncio.to_thread(self.crypto.decrypt_from,
+                                                  self.__receive_buffer)
+                if message is not None:
+                    answer, size = message
+                    del self.__receive_buffer[:size]
+                    return answer
+            data = await self.reader.read(1 << 16)
+            if not data:
+                raise ConnectionError("SPCM closed the connection")
+            self.__receive_buffer += data
+
+    async def connect_spcm_instance(self, host: str = None, port: int = None,
+                                    service_id: int = None):
+        if (host is None and port is not None) or (host is not None and port is None):
+            raise ValueError("Arguments host and port must be provided or both must be None.")
+
+        if host is None:
+            if self.host is None:
+                finder = BHConnect(key_manager=self.key_manager)
+                if not await asyncio.to_thread(finder.find_spcm_instance, service_id):
+                    raise ValueError(f"Instance with ID {1 if service_id is None else service_id}"
+                                     " not found. A discoverable ID, host and port, or self.host"
+                                     " and self.port must be provided.")
+                self.host, self.port = finder.host, finder.port
+            host = self.host
+            port = self.port
+
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.__receive_buffer.clear()
+
+        # Loading or generating the key pair may block, keep it off the event loop
+        self.private_key = await asyncio.to_thread(self.key_manager.get_key)
+        self.crypto = SessionCrypto(self.private_key, reuse_session_key=self.reuse_session_key)
+        self.writer.write(self.private_key.public_key().export_key())
+        await self.writer.drain()
+        data = await self.__receive()
+        self.server_public_key = RSA.import_key(data)
+        self.crypto.set_server_public_key(self.server_public_key)
+
+        version = await self.command("Version:number")
+        check_protocol_version(version)
+        return version
+
+    async def disconnect_spcm_instance(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    async def shutdown_spcm_instance(self):
+        await self.__send(bytearray([0xFE]))
+
+    async def command(self, command):
+        async with self.__command_lock:
+            await self.__send((f"${command}$").encode("ascii"))
+            answer = (await self.__receive()).decode()
+        return parse_answer(answer)
+
+    async def command_batch(self, commands: list[str]) -> list:
+        '''Sends the commands back to back and returns their results in
+        order, see BHConnect.command_batch.'''
+        results = []
+        async with self.__command_lock:
+            messages = await asyncio.to_thread(
+                lambda: [self.crypto.encrypt((f"${command}$").encode("ascii"))
+                         for command in commands])
+            for message in messages:
+                self.writer.write(message)
+            await self.writer.drain()
+            for _ in commands:
+                answer = (await self.__receive()).decode()
+                try:
+                    results.append(parse_answer(answer))
+                except ValueError as e:
+                    results.append(e)
+        return results
+
+    async def __wait_transfer(self, awaitable):
+        # asyncio.TimeoutError is only the builtin TimeoutError from Python 3.11 on
+        try:
+            return await asyncio.wait_for(awaitable, self.transfer_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("SPCM did not send the requested data in time") from None
+
+    def __local_address(self) -> str:
+        '''The address of the command connection on this host, the receivers
+        only listen on the interface SPCM is reached through.'''
+        return self.writer.get_extra_info('sockname')[0]
+
+    async def get_image(self, window=1, cycle=1, image_type: IMAGE_TYPES = "1stMoment",
+                        fit_config: tuple[str, int] = None, tau_channel: str = None,
+                        in_memory: bool = False):
+        '''Requests images from SPCM, see BHConnect.get_image. The images are
+        received by an asyncio server and returned in the order SPCM
+        connected to send them.'''
+        loop = asyncio.get_running_loop()
+        transfers: list[asyncio.Future] = []
+        done = loop.create_future()
+
+        async def receive_image(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            transfer = loop.create_future()
+            transfers.append(transfer)
+            try:
+                name_length = (await reader.readexactly(1))[0]
+                file_name = (await reader.readexactly(name_length)).decode()
+                if file_name == 'EOT':
+                    transfers.remove(transfer)
+                    if not done.done():
+                        done.set_result(True)
+                    return
+                data = await reader.read()
+                if in_memory:
+                    transfer.set_result(await asyncio.to_thread(decode_tiff, data))
+                else:
+                    image_dir = (f"{appdirs.user_data_dir(appauthor='BH',appname='bhpy')}"
+                                 f"SPCConnect/temp/{file_name}")
+                    await asyncio.to_thread(self.__write_file, image_dir, data)
+                    transfer.set_result(image_dir)
+            except Exception as e:
+                if not transfer.done():
+                    transfer.set_exception(e)
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(receive_image, self.__local_address(), 0)
+        try:
+            port = server.sockets[0].getsockname()[1]
+            await self.command(image_command(port, window, cycle, image_type, fit_config,
+                                             tau_channel))
+
+            async def images():
+                await done
+                return list(await asyncio.gather(*transfers))
+
+            return await self.__wait_transfer(images())
+        finally:
+            server.close()
+
+    @staticmethod
+    def __write_file(path: str, data: bytes):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    async def get_trace(self, trace_type=11, trace_number=1) -> np.ndarray:
+        '''Requests a decay trace from SPCM and returns it as uint32 array.'''
+        loop = asyncio.get_running_loop()
+        trace_future = loop.create_future()
+
+        async def receive_trace(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                values = int.from_bytes(await reader.readexactly(4), byteorder='little',
+                                        signed=False)
+                trace = np.empty(values, dtype='<u4')
+                view = memoryview(trace).cast('B')
+                received = 0
+                while received < len(view):
+                    data = await reader.read(min(len(view) - received, 1 << 20))
+                    if not data:
+                        log.warning(f"Trace transfer ended after {received // 4} of {values} "
+                                    "values")
+                        trace = trace[:received // 4]
+                        break
+                    view[received:received + len(data)] = data
+                    received += len(data)
+                if not trace_future.done():
+                    trace_future.set_result(trace)
+            except Exception as e:
+                if not trace_future.done():
+                    trace_future.set_exception(e)
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(receive_trace, self.__local_address(), 0)
+        try:
+            port = server.sockets[0].getsockname()[1]
+            await self.command(f"getData:trace,{port},imagedecay,{trace_number-1}")
+            return await self.__wait_transfer(trace_future)
+        finally:
+            server.close()
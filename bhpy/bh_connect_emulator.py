@@ -0,0 +1,198 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import socket
+    import socketserver
+    import threading
+    import numpy as np
+    from Crypto.PublicKey import RSA
+    from bhpy.bh_connect import SessionCrypto
+    from bhpy.bh_tiff import encode_tiff
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+class _EmulatorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, emulator: "SpcConnectEmulator"):
+        super().__init__(server_address, _EmulatorHandler)
+        self.emulator = emulator
+
+
+class _EmulatorHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        emulator: SpcConnectEmulator = self.server.emulator
+        data = bytearray()
+        while b"-----END PUBLIC KEY-----" not in data:
+            chunk = self.request.recv(4096)
+            if not chunk or data.startswith(b"ping") or len(data) > 1 << 14:
+                return  # reachability check of BHConnect.find_spcm_instance or garbage
+            data += chunk
+        crypto = SessionCrypto(emulator.private_key, RSA.import_key(bytes(data)))
+        self.request.sendall(crypto.encrypt(emulator.private_key.public_key().export_key()))
+
+        buffer = bytearray()
+        while True:
+            while (message := crypto.decrypt_from(buffer)) is not None:
+                command, size = message
+                del buffer[:size]
+                if command == b"\xfe":
+                    emulator.shutdown_requested.set()
+                    return
+                emulator.handle_command(command.decode().strip("$"), crypto, self.request)
+            try:
+                chunk = self.request.recv(1 << 16)
+            except ConnectionResetError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+
+
+class SpcConnectEmulator:
+    '''Local stand-in for SPCM's SPCConnect v2 server, for tests and
+    benchmarks without SPCM.
+
+    Speaks the handshake (RSA key exchange) and the AES-EAX message
+    framing, answers Version:number, setparameter, getparameter and
+    pressmenu, and pushes synthetic TIFF images (getData:image, fitimage,
+    fittedimage, tauchannel) and traces (getData:trace) to the data port
+    given in the command:
+
+        with SpcConnectEmulator() as emulator:
+            spcm = BHConnect()
+            spcm.connect_spcm_instance(*emulator.address)
+            images = spcm.get_image(window=-1, in_memory=True)
+
+    The images have the size set by setparameter:pixelx/pixely (default
+    image_shape), window=-1 sends windows images. Every received command
+    is recorded in commands.
+
+    Like SPCM the emulator answers a getData command after the data was
+    pushed. With answer_after_transfer=False the answer is sent first,
+    which the per transfer receivers of BHConnect need for transfers
+    exceeding the socket buffers (they only accept once the command is
+    answered).
+    '''
+
+    VERSION = "SPCConnect 2.0.0"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, key_size: int = 2048,
+                 image_shape: tuple[int, int] = (256, 256), windows: int = 4,
+                 trace_length: int = 4096, image_dtype=np.uint16, seed: int = 0,
+                 answer_after_transfer: bool = True):
+        self.private_key = RSA.generate(key_size)
+        self.answer_after_transfer = answer_after_transfer
+        self.image_shape = image_shape
+        self.windows = windows
+        self.trace_length = trace_length
+        self.image_dtype = np.dtype(image_dtype)
+        self.parameters: dict[str, str] = {}
+        self.menu: str = None
+        self.commands: list[str] = []
+        self.shutdown_requested = threading.Event()
+        self.__lock = threading.Lock()
+        self.__rng = np.random.default_rng(seed)
+
+        self.server = _EmulatorServer((host, port), self)
+        self.__thread: threading.Thread = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True,
+                                         name="bhpy-spcconnect-emulator")
+        self.__thread.start()
+        return self
+
+    def close(self):
+        if self.__thread is not None:
+            self.server.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def image(self, window: int = 0) -> np.ndarray:
+        '''Returns a synthetic image for window (Poisson noise on a ramp).'''
+        height = int(self.parameters.get("pixely", self.image_shape[0]))
+        width = int(self.parameters.get("pixelx", self.image_shape[1]))
+        with self.__lock:
+            noise = self.__rng.poisson(10, (height, width))
+        ramp = np.add.outer(np.arange(height), np.arange(width)) % 256
+        return (ramp + noise + window * 100).astype(self.image_dtype)
+
+    def trace(self) -> np.ndarray:
+        '''Returns a synthetic decay trace.'''
+        decay = 1000 * np.exp(-np.arange(self.trace_length) / (self.trace_length / 8))
+        with self.__lock:
+            return self.__rng.poisson(decay).astype('<u4')
+
+    @staticmethod
+    def __push(host: str, port: int, data: bytes):
+        with socket.create_connection((host, port)) as s:
+            s.sendall(data)
+
+    def __push_images(self, host: str, port: int, windows: list[int], name: str):
+        for window in windows:
+            file_name = f"{name}_w{window + 1}.tif".encode()
+            self.__push(host, port, bytes([len(file_name)]) + file_name
+                        + encode_tiff(self.image(window)))
+        self.__push(host, port, b"\x03EOT")
+
+    def answer(self, command: str) -> str:
+        '''Returns the answer to a non data command.'''
+        name, _, arguments = command.partition(":")
+        if command == "Version:number":
+            return f"OK:{self.VERSION}"
+        if name == "setparameter":
+            parameter, _, value = arguments.partition(",")
+            with self.__lock:
+                self.parameters[parameter] = value
+            return "OK"
+        if name == "getparameter":
+            with self.__lock:
+                value = self.parameters.get(arguments)
+            return "ERROR: unknown parameter" if value is None else f"OK:{value}"
+        if name == "pressmenu":
+            with self.__lock:
+                self.menu = arguments
+            return "OK"
+        return f"ERROR: unknown command {command}"
+
+    def handle_command(self, command: str, crypto: SessionCrypto, sock: socket.socket):
+        with self.__lock:
+            self.commands.append(command)
+        if not command.startswith("getData:"):
+            sock.sendall(crypto.encrypt(self.answer(command).encode()))
+            return
+
+        data_type, port, *arguments = command.split(":", 1)[1].split(",")
+        host = sock.getpeername()[0]
+        if not self.answer_after_transfer:
+            sock.sendall(crypto.encrypt(b"OK"))
+        if data_type == "trace":
+            trace = self.trace()
+            self.__push(host, int(port), len(trace).to_bytes(4, "little") + trace.tobytes())
+        elif data_type in ("image", "fitimage", "fittedimage", "tauchannel"):
+            if data_type == "tauchannel" or len(arguments) > 1:
+                windows = [max(int(arguments[1]) - 1, 0)]
+            else:
+                windows = list(range(self.windows))
+            self.__push_images(host, int(port), windows, data_type)
+        else:
+            log.warning(f"Emulator ignores unknown data request {command}")
+        if self.answer_after_transfer:
+            sock.sendall(crypto.encrypt(b"OK"))
@@ -2,11 +2,12 @@ import logging
 log = logging.getLogger(__name__)
 
 try:
-    from ctypes import (c_int16, create_string_buffer, Structure, CDLL, c_char_p, c_uint8,
-                        c_void_p, c_char)
+    from ctypes import (c_int16, create_string_buffer, Structure, c_char_p, c_uint8, c_void_p,
+                        c_char)
     from pathlib import Path
     import re
     import sys
+    from bhpy.bh_dll import load_library
 except ModuleNotFoundError as err:
     # Error handling
     log.error(err)
@@ -30,7 +31,7 @@ class BHDeviceScan:
             dll_path = Path(dll_path)
 
         try:
-            self.__dll = CDLL(str(dll_path.absolute()))
+            self.__dll = load_library(dll_path)
         except FileNotFoundError as e:
             log.error(e)
             raise
@@ -0,0 +1,154 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import atexit
+    import re
+    import threading
+    import time
+    from zeroconf import Zeroconf, ServiceBrowser, ServiceStateChange
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+SERVICE_TYPE = "_bhipc._tcp.local."
+_SERVICE_NAME = re.compile(r"SPCMRemoteControl:(\d+)\." + re.escape(SERVICE_TYPE) + "$")
+
+
+class SpcmInstance:
+    '''A discovered SPCM instance (SPCConnect service).'''
+
+    def __init__(self, service_id: int, name: str, host: str, port: int,
+                 addresses: list[str]):
+        self.service_id = service_id
+        self.name = name
+        self.host = host
+        self.port = port
+        self.addresses = addresses
+        self.last_seen = time.monotonic()
+
+    def __repr__(self):
+        return (f"SpcmInstance(service_id={self.service_id}, host='{self.host}', "
+                f"port={self.port})")
+
+
+class SpcmDiscovery:
+    '''Long-lived discovery of SPCM instances.
+
+    Keeps one Zeroconf service browser for _bhipc._tcp.local. running and
+    caches every announced instance by its service ID, so lookups of known
+    instances return immediately. Instances not seen for ttl_s are
+    revalidated with a direct service info query before being returned.
+
+        with SpcmDiscovery() as discovery:
+            instance = discovery.lookup(2)
+    '''
+
+    def __init__(self, zeroconf: Zeroconf = None, ttl_s: float = 60.0,
+                 query_timeout_s: float = 1.0):
+        self.ttl_s = ttl_s
+        self.query_timeout_s = query_timeout_s
+        self.__owns_zeroconf = zeroconf is None
+        self.zeroconf = Zeroconf() if zeroconf is None else zeroconf
+        self.__instances: dict[int, SpcmInstance] = {}
+        self.__changed = threading.Condition()
+        self.__browser = ServiceBrowser(self.zeroconf, SERVICE_TYPE,
+                                        handlers=[self.__on_service_state_change])
+
+    @staticmethod
+    def service_id(name: str) -> int | None:
+        match = _SERVICE_NAME.match(name)
+        return None if match is None else int(match.group(1))
+
+    def __resolve(self, name: str) -> SpcmInstance | None:
+        service_id = self.service_id(name)
+        if service_id is None:
+            return None
+        info = self.zeroconf.get_service_info(SERVICE_TYPE, name,
+                                              timeout=int(self.query_timeout_s * 1000))
+        if info is None or info.server is None:
+            return None
+        return SpcmInstance(service_id, name, info.server.split('.', 1)[0], info.port,
+                            info.parsed_addresses())
+
+    def __on_service_state_change(self, zeroconf: Zeroconf, service_type, name, state_change):
+        if state_change is ServiceStateChange.Removed:
+            service_id = self.service_id(name)
+            with self.__changed:
+                instance = self.__instances.get(service_id)
+                if instance is not None and instance.name == name:
+                    del self.__instances[service_id]
+            return
+        instance = self.__resolve(name)
+        if instance is not None:
+            with self.__changed:
+                self.__instances[instance.service_id] = instance
+                self.__changed.notify_all()
+
+    def __fresh(self, service_id: int) -> SpcmInstance | None:
+        with self.__changed:
+            instance = self.__instances.get(service_id)
+        if instance is None or time.monotonic() - instance.last_seen < self.ttl_s:
+            return instance
+        refreshed = self.__resolve(instance.name)
+        with self.__changed:
+            if refreshed is None:
+                if self.__instances.get(service_id) is instance:
+                    del self.__instances[service_id]
+            else:
+                self.__instances[service_id] = refreshed
+        return refreshed
+
+    def lookup(self, service_id: int = 1, timeout: float = 3.0) -> SpcmInstance | None:
+        '''Returns the instance with service_id, waiting up to timeout
+        seconds for it to be announced if it is not known yet.'''
+        instance = self.__fresh(service_id)
+        if instance is not None:
+            return instance
+        deadline = time.monotonic() + timeout
+        with self.__changed:
+            while service_id not in self.__instances:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.__changed.wait(remaining)
+            return self.__instances[service_id]
+
+    def instances(self) -> dict[int, SpcmInstance]:
+        '''Returns all currently known instances by service ID.'''
+        with self.__changed:
+            return dict(self.__instances)
+
+    def forget(self, service_id: int):
+        '''Drops an instance from the cache, e.g. after connecting to it
+        failed, so the next lookup waits for a new announcement.'''
+        with self.__changed:
+            self.__instances.pop(service_id, None)
+
+    def close(self):
+        self.__browser.cancel()
+        if self.__owns_zeroconf:
+            self.zeroconf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_discovery = None
+_default_discovery_lock = threading.Lock()
+
+
+def default_discovery() -> SpcmDiscovery:
+    '''Returns the discovery service shared by all BHConnect instances. It
+    is started on first use and closed at interpreter exit.'''
+    global _default_discovery
+    with _default_discovery_lock:
+        if _default_discovery is None:
+            _default_discovery = SpcmDiscovery()
+            atexit.register(_default_discovery.close)
+        return _default_discovery
@@ -0,0 +1,98 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    from ctypes import CDLL, c_int
+    from pathlib import Path
+    import threading
+    from bhpy.bh_telemetry import CallStats, TimedCall
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+_libraries: dict[str, CDLL] = {}
+_libraries_lock = threading.Lock()
+
+
+def load_library(dll_path: Path | str) -> CDLL:
+    '''Returns the loaded library for dll_path. Every library is loaded
+    only once per process and shared by all wrapper instances using it.'''
+    key = str(Path(dll_path).absolute())
+    with _libraries_lock:
+        library = _libraries.get(key)
+        if library is None:
+            library = CDLL(key)
+            _libraries[key] = library
+        return library
+
+
+class DllFunction:
+    '''Declarative binding of a dll function.
+
+    Used as class attribute of a wrapper the function pointer is resolved
+    from the wrapper's library (instance attribute _dll) on first access
+    and then cached on the instance, so later calls go straight to the
+    ctypes function pointer. Every instance gets its own function pointer
+    object, argtypes and restype are never shared between libraries.
+
+    When the wrapper has instrumentation enabled (instance attribute
+    _instrumented) the function pointer is wrapped by a TimedCall
+    collecting into the instance's _dll_stats.
+    '''
+
+    def __init__(self, symbol: str, argtypes: list | None = None, restype=c_int,
+                 debug_only: bool = False):
+        self.symbol = symbol
+        self.argtypes = argtypes
+        self.restype = restype
+        self.debug_only = debug_only
+        self.attr_name = None
+
+    def __set_name__(self, owner, name):
+        self.attr_name = name
+
+    def bind(self, library: CDLL):
+        function = library[self.symbol]
+        if self.argtypes is not None:
+            function.argtypes = self.argtypes
+        function.restype = self.restype
+        return function
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        function = self.bind(instance._dll)
+        if getattr(instance, "_instrumented", False):
+            function = TimedCall(function, instance._dll_stats.setdefault(self.symbol,
+                                                                          CallStats()))
+        instance.__dict__[self.attr_name] = function
+        return function
+
+
+def dll_functions(cls) -> dict[str, DllFunction]:
+    '''Returns the signature table of a wrapper class: all DllFunction
+    bindings of the class and its bases by dll symbol name.'''
+    table = {}
+    for klass in reversed(cls.__mro__):
+        for value in vars(klass).values():
+            if isinstance(value, DllFunction):
+                table[value.symbol] = value
+    return table
+
+
+def missing_symbols(cls, dll_path: Path | str, include_debug: bool = True) -> list[str]:
+    '''Returns the symbols of the signature table of cls that are not
+    exported by the library at dll_path, e.g. to check the bindings
+    against a stand-in shared library.'''
+    library = load_library(dll_path)
+    missing = []
+    for symbol, function in dll_functions(cls).items():
+        if function.debug_only and not include_debug:
+            continue
+        try:
+            function.bind(library)
+        except AttributeError:
+            missing.append(symbol)
+    return missing
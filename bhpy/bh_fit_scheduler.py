@@ -0,0 +1,292 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import threading
+    import time
+    from collections import deque
+    from concurrent.futures import Future
+    from typing import Iterable
+    from bhpy.bh_connect import BHConnect, ClientKeyManager
+    from bhpy.bh_discovery import SpcmDiscovery, default_discovery
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+class FitJob:
+    '''One fit: the commands preparing it (e.g. loading a data set) and the
+    getData:fitimage request, see BHConnect.get_image.'''
+
+    def __init__(self, window=1, cycle=1, fit_config: tuple[str, int] = None,
+                 commands: Iterable[str] = (), in_memory: bool = True):
+        self.window = window
+        self.cycle = cycle
+        self.fit_config = fit_config
+        self.commands = list(commands)
+        self.in_memory = in_memory
+
+    def run(self, connection: BHConnect) -> list:
+        for command in self.commands:
+            connection.command(command)
+        return connection.get_image(self.window, self.cycle, image_type="Fit",
+                                    fit_config=self.fit_config, in_memory=self.in_memory)
+
+    def __repr__(self):
+        return f"FitJob(window={self.window}, cycle={self.cycle}, fit_config={self.fit_config})"
+
+
+class _QueuedJob:
+    def __init__(self, job: FitJob):
+        self.job = job
+        self.future = Future()
+        self.failed_on: set[str] = set()
+        self.errors: list[Exception] = []
+
+
+class _Worker:
+    def __init__(self, name: str, host: str, port: int):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.connection: BHConnect = None
+        self.thread: threading.Thread = None
+        self.alive = True
+        self.completed = 0
+        self.failed = 0
+        self.busy_s = 0.0
+
+
+class FitJobScheduler:
+    '''Spreads fit jobs over several SPCM/SPCImage instances.
+
+    Every instance gets a worker thread with its own BHConnect, all of them
+    take jobs from one work queue. A job failing on an instance is retried
+    on another one (up to max_attempts), workers skip the jobs they already
+    failed unless no other instance is left to run them. An instance whose
+    connection fails leaves the pool, a timed out transfer only fails the
+    job:
+
+        with FitJobScheduler() as scheduler:  # all discovered instances
+            futures = scheduler.map(FitJob(cycle=c, fit_config=("fit", 1))
+                                    for c in range(1, 101))
+            images = [future.result() for future in futures]
+            print(scheduler.stats()["jobs_per_s"])
+
+    instances are service IDs looked up through discovery (default: the
+    shared discovery service) or (host, port) tuples. Without instances all
+    instances discovered within discovery_timeout are used.
+    '''
+
+    def __init__(self, instances: Iterable[int | tuple[str, int]] = None,
+                 discovery: SpcmDiscovery = None, key_manager: ClientKeyManager = None,
+                 max_attempts: int = 3, discovery_timeout: float = 3.0):
+        self.max_attempts = max_attempts
+        self.key_manager = key_manager
+        # Jobs not taken by a worker yet, guarded by (and waited for with) __lock
+        self.__queue: deque[_QueuedJob] = deque()
+        self.__lock = threading.Condition()
+        self.__closed = False
+        self.__stopping = False
+        self.__started = None
+        self.__finished = None
+        self.__submitted = 0
+        self.__completed = 0
+        self.__failed = 0
+        self.__retries = 0
+
+        self.__workers = [_Worker(name, host, port) for name, host, port in
+                          self.__resolve(instances, discovery, discovery_timeout)]
+        if not self.__workers:
+            raise ValueError("No SPCM instance found to run fit jobs on.")
+        for worker in self.__workers:
+            worker.thread = threading.Thread(target=self.__work, args=(worker,), daemon=True,
+                                             name=f"bhpy-fit-worker-{worker.name}")
+            worker.thread.start()
+
+    @staticmethod
+    def __resolve(instances, discovery: SpcmDiscovery, timeout: float):
+        if instances is not None:
+            instances = list(instances)
+            if all(isinstance(i, tuple) for i in instances):
+                return [(f"{host}:{port}", host, port) for host, port in instances]
+        discovery = default_discovery() if discovery is None else discovery
+        if instances is None:
+            deadline = time.monotonic() + timeout
+            while not discovery.instances() and time.monotonic() < deadline:
+                time.sleep(0.1)
+            found = discovery.instances().values()
+        else:
+            found = []
+            for instance in instances:
+                if isinstance(instance, tuple):
+                    found.append(instance)
+                    continue
+                info = discovery.lookup(instance, timeout)
+                if info is None:
+                    log.warning(f"SPCM instance with ID {instance} not found")
+                else:
+                    found.append(info)
+        return [(f"{i[0]}:{i[1]}", i[0], i[1]) if isinstance(i, tuple)
+                else (str(i.service_id), i.host, i.port) for i in found]
+
+    def submit(self, job: FitJob) -> Future:
+        '''Queues job, the future resolves to the get_image result.'''
+        queued = _QueuedJob(job)
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError("FitJobScheduler is closed")
+            if not any(worker.alive for worker in self.__workers):
+                queued.future.set_exception(ConnectionError("No SPCM instance left"))
+                return queued.future
+            if self.__started is None:
+                self.__started = time.perf_counter()
+            self.__submitted += 1
+            self.__queue.append(queued)
+            self.__lock.notify_all()
+        return queued.future
+
+    def map(self, jobs: Iterable[FitJob]) -> list[Future]:
+        return [self.submit(job) for job in jobs]
+
+    def __alive(self) -> list[_Worker]:
+        with self.__lock:
+            return [worker for worker in self.__workers if worker.alive]
+
+    def __finish(self, queued: _QueuedJob, result=None, error: Exception = None):
+        with self.__lock:
+            if error is None:
+                self.__completed += 1
+            else:
+                self.__failed += 1
+            self.__finished = time.perf_counter()
+            self.__lock.notify_all()
+        if error is None:
+            queued.future.set_result(result)
+        else:
+            queued.future.set_exception(error)
+
+    def __next_job(self, worker: _Worker) -> _QueuedJob | None:
+        '''Takes the oldest queued job worker may run, waiting for one. Returns
+        None once the scheduler stops.'''
+        with self.__lock:
+            while not self.__stopping:
+                for i, queued in enumerate(self.__queue):
+                    # Leave a retry to an instance it has not failed on yet
+                    if worker.name not in queued.failed_on or \
+                            all(w.name in queued.failed_on for w in self.__workers if w.alive):
+                        del self.__queue[i]
+                        return queued
+                self.__lock.wait()
+            return None
+
+    def __work(self, worker: _Worker):
+        while (queued := self.__next_job(worker)) is not None:
+            start = time.perf_counter()
+            try:
+                if worker.connection is None:
+                    connection = BHConnect(key_manager=self.key_manager)
+                    connection.connect_spcm_instance(worker.host, worker.port)
+                    worker.connection = connection
+                result = queued.job.run(worker.connection)
+            except Exception as e:
+                worker.busy_s += time.perf_counter() - start
+                worker.failed += 1
+                queued.errors.append(e)
+                queued.failed_on.add(worker.name)
+                log.warning(f"{queued.job} failed on instance {worker.name}: {e}")
+                # A timed out transfer (TimeoutError is an OSError) only fails the job
+                if isinstance(e, OSError) and not isinstance(e, TimeoutError):
+                    self.__retire(worker)
+                if len(queued.errors) < self.max_attempts and self.__alive():
+                    with self.__lock:
+                        self.__retries += 1
+                        self.__queue.append(queued)
+                        self.__lock.notify_all()
+                else:
+                    self.__finish(queued, error=e)
+                if not worker.alive:
+                    break
+            else:
+                worker.busy_s += time.perf_counter() - start
+                worker.completed += 1
+                self.__finish(queued, result)
+        if not self.__alive():
+            self.__fail_pending()
+        self.__disconnect(worker)
+
+    def __retire(self, worker: _Worker):
+        '''Removes an instance whose connection failed from the pool.'''
+        with self.__lock:
+            worker.alive = False
+            # Jobs skipped by the other workers may be theirs now
+            self.__lock.notify_all()
+        self.__disconnect(worker)
+
+    @staticmethod
+    def __disconnect(worker: _Worker):
+        if worker.connection is not None:
+            try:
+                worker.connection.disconnect_spcm_instance()
+            except Exception:
+                pass
+            worker.connection = None
+
+    def __fail_pending(self, error: Exception = None):
+        with self.__lock:
+            pending = list(self.__queue)
+            self.__queue.clear()
+        for queued in pending:
+            if error is not None:
+                self.__finish(queued, error=error)
+            else:
+                self.__finish(queued, error=queued.errors[-1] if queued.errors else
+                              ConnectionError("No SPCM instance left"))
+
+    def stats(self) -> dict:
+        '''Returns the aggregate throughput (jobs_per_s over the time from the
+        first submission to the last finished job) and the completed and
+        failed jobs and busy time per instance.'''
+        with self.__lock:
+            elapsed = (self.__finished - self.__started
+                       if self.__started is not None and self.__finished is not None else 0.0)
+            return {"submitted": self.__submitted,
+                    "completed": self.__completed,
+                    "failed": self.__failed,
+                    "retries": self.__retries,
+                    "elapsed_s": elapsed,
+                    "jobs_per_s": self.__completed / elapsed if elapsed else 0.0,
+                    "instances": {worker.name: {"alive": worker.alive,
+                                                "completed": worker.completed,
+                                                "failed": worker.failed,
+                                                "busy_s": worker.busy_s}
+                                  for worker in self.__workers}}
+
+    def close(self, timeout: float = None):
+        '''Finishes the queued jobs (including their retries), then
+        disconnects from all instances.
+
+        With timeout, the jobs not started within timeout seconds fail with
+        TimeoutError. Jobs still running then are left to their worker
+        threads, which disconnect once they are done.'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            finished = self.__lock.wait_for(
+                lambda: self.__completed + self.__failed == self.__submitted, timeout)
+        if not finished:
+            self.__fail_pending(TimeoutError("FitJobScheduler closed before the job ran"))
+        with self.__lock:
+            self.__stopping = True
+            self.__lock.notify_all()
+        for worker in self.__workers:
+            worker.thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
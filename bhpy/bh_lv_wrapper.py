@@ -2,17 +2,69 @@ import logging
 log = logging.getLogger(__name__)
 
 try:
-    from ctypes import create_string_buffer, CDLL, POINTER, c_char_p, c_float, c_int32, c_uint32
+    from ctypes import create_string_buffer, POINTER, c_char_p, c_float, c_int32, c_uint32
+    from concurrent.futures import Future, ThreadPoolExecutor, wait
+    from contextlib import nullcontext
     from pathlib import Path
-    from typing import Literal
-    from time import sleep
+    from typing import Callable, Iterable, Literal
+    from time import monotonic, sleep
     import sys
+    import threading
+    from bhpy.bh_dll import load_library
 except ModuleNotFoundError as err:
     # Error handling
     log.error(err)
     raise
 
 
+class _ResultBuffers(threading.local):
+    '''The ctypes buffers the LabView dlls write their results to, one set
+    per thread so concurrent commands cannot overwrite each other's results.'''
+
+    def __init__(self, error_string_buffer_len: int, result_string_buffer_len: int,
+                 no_of_rates: int = 0):
+        self.error_str = create_string_buffer(error_string_buffer_len)
+        self.result_str = create_string_buffer(result_string_buffer_len)
+        self.rates = (c_float * no_of_rates)()
+
+
+_machine_locks: dict[bytes, threading.Lock] = {}
+_machine_locks_lock = threading.Lock()
+
+
+def _machine_lock(machine_name: bytes) -> threading.Lock:
+    '''Returns the lock serializing the LabView calls to machine_name, shared
+    by all wrapper instances.'''
+    with _machine_locks_lock:
+        lock = _machine_locks.get(machine_name)
+        if lock is None:
+            lock = _machine_locks[machine_name] = threading.Lock()
+        return lock
+
+
+class _Backoff:
+    '''Exponentially growing waits (initial_s doubling up to max_s) until an
+    overall deadline of timeout_s (None: no deadline).'''
+
+    def __init__(self, timeout_s: float | None, initial_s: float = 0.05, max_s: float = 1.0):
+        self.timeout_s = timeout_s
+        self.deadline = None if timeout_s is None else monotonic() + timeout_s
+        self.delay = initial_s
+        self.max_s = max_s
+
+    def sleep(self, reason: str):
+        '''Waits before the next attempt. Raises a ChildProcessError if the
+        deadline has passed.'''
+        delay = self.delay
+        if self.deadline is not None:
+            remaining = self.deadline - monotonic()
+            if remaining <= 0:
+                raise ChildProcessError(f'{reason} after {self.timeout_s} s')
+            delay = min(delay, remaining)
+        sleep(delay)
+        self.delay = min(self.delay * 2, self.max_s)
+
+
 class LVConnectQC008:
     INSTRUCTIONS = Literal["AutoAdjust", "HideAnalysis", "HideCardSettings", "HideCorrelation",
                            "HideDebugInfo", "HideDeltaT", "HideMCS", "LoadAutoSavedSettings",
@@ -26,7 +78,12 @@ class LVConnectQC008:
                  machine_name: str | None = None,
                  default_timeout_s: int = 3,
                  error_string_buffer_len: int = 512,
-                 result_string_buffer_len: int = 512):
+                 result_string_buffer_len: int = 512,
+                 lock_machine: bool = True):
+        '''Commands can be sent from several threads, each thread has its own
+        result buffers. With lock_machine the commands to one machine are
+        serialized (by all instances), commands to different machines run
+        concurrently.'''
         if dll_path is None:
             dll_path = Path(sys.modules["bhpy"].__file__).parent / Path("dll/ControlQC008.dll")
         else:
@@ -34,7 +91,7 @@ class LVConnectQC008:
 
         self._file_saving_path = Path("./")
 
-        self.__dll = CDLL(str(dll_path.absolute()))
+        self.__dll = load_library(dll_path)
         self.__Dll_ControlQC008 = self.__dll.Dll_ControlQC008
 
         self.__Dll_ControlQC008.argtypes = [c_char_p, c_char_p, c_uint32, c_char_p, c_char_p,
@@ -47,9 +104,8 @@ class LVConnectQC008:
             self._machine_name = machine_name.encode('utf-8')
 
         self._cmd_timeout_s = default_timeout_s
-        self._error_str = create_string_buffer(error_string_buffer_len)
-        self._result_str = create_string_buffer(result_string_buffer_len)
-        self._rates = (c_float * 8)()
+        self._buffers = _ResultBuffers(error_string_buffer_len, result_string_buffer_len, 8)
+        self._lock_machine = lock_machine
 
     def _command(self, command: INSTRUCTIONS | str, command_arg: str = None,
                  machine_name: str | None = None) -> tuple[str, list[int]]:
@@ -63,14 +119,16 @@ class LVConnectQC008:
         else:
             cmd = f"{command} {command_arg}"
 
-        res = self.__Dll_ControlQC008(cmd.encode('utf-8'), machine_name, self._cmd_timeout_s,
-                                      self._error_str, self._result_str, self._rates,
-                                      len(self._error_str), len(self._result_str),
-                                      len(self._rates))
+        buffers = self._buffers
+        with _machine_lock(machine_name) if self._lock_machine else nullcontext():
+            res = self.__Dll_ControlQC008(cmd.encode('utf-8'), machine_name, self._cmd_timeout_s,
+                                          buffers.error_str, buffers.result_str, buffers.rates,
+                                          len(buffers.error_str), len(buffers.result_str),
+                                          len(buffers.rates))
         if 0 == res:
-            return self._result_str.value.decode().split(" ")[0], list(self._rates)
+            return buffers.result_str.value.decode().split(" ")[0], list(buffers.rates)
         else:
-            raise ChildProcessError(f"{self._error_str.value.decode()} ({res})")
+            raise ChildProcessError(f"{buffers.error_str.value.decode()} ({res})")
 
     def command(self, command: INSTRUCTIONS):
         self._command(command=command)
@@ -207,6 +265,104 @@ class LVConnectQC008:
         self._command("TimeRange", f"{range_s:.9E}")
 
 
+class LVConnectQC008Group:
+    '''Controls the QC008 applications of several machines at once.
+
+    Every machine gets its own LVConnectQC008, the commands are sent to all
+    of them concurrently by a thread pool, so a command to the whole group
+    takes as long as on the slowest machine:
+
+        with LVConnectQC008Group(["lab-pc1", "lab-pc2"]) as group:
+            group.start_measurement()
+            rates = group.rates(timeout=5)
+
+    The results are returned per machine name. A machine whose command
+    failed, or did not finish before the shared deadline (timeout seconds
+    after sending, default: default_timeout_s plus TIMEOUT_MARGIN_S), has
+    the exception as result instead. A call to the dll cannot be aborted,
+    a machine still busy with a timed out command gets a TimeoutError
+    right away instead of a new command until that call returns.
+    '''
+
+    TIMEOUT_MARGIN_S = 2.0
+
+    def __init__(self, machine_names: Iterable[str], dll_path: Path | str | None = None,
+                 default_timeout_s: int = 3, max_workers: int = None, **kwargs):
+        self.machines = {machine_name: LVConnectQC008(dll_path, machine_name, default_timeout_s,
+                                                      **kwargs)
+                         for machine_name in machine_names}
+        self.default_timeout_s = default_timeout_s
+        self.__executor = ThreadPoolExecutor(max_workers or max(len(self.machines), 1),
+                                             thread_name_prefix="bhpy-qc008-group")
+        # The last call per machine, it keeps its pool thread until the dll returns
+        self.__in_flight: dict[str, Future] = {}
+        self.__lock = threading.Lock()
+
+    def run(self, function: Callable[[LVConnectQC008], object],
+            timeout: float = None) -> dict[str, object]:
+        '''Calls function with the LVConnectQC008 of every machine
+        concurrently and returns the results by machine name.'''
+        if timeout is None:
+            timeout = self.default_timeout_s + self.TIMEOUT_MARGIN_S
+        results = {}
+        futures = {}
+        with self.__lock:
+            for machine_name, qc008 in self.machines.items():
+                previous = self.__in_flight.get(machine_name)
+                if previous is not None and not previous.done():
+                    results[machine_name] = TimeoutError(f"{machine_name} is still busy with a "
+                                                         "previous command")
+                    continue
+                futures[machine_name] = self.__in_flight[machine_name] = \
+                    self.__executor.submit(function, qc008)
+        wait(futures.values(), timeout)
+        for machine_name, future in futures.items():
+            if not future.done():
+                results[machine_name] = TimeoutError(f"{machine_name} did not answer within "
+                                                     f"{timeout} s")
+            elif future.exception() is not None:
+                results[machine_name] = future.exception()
+            else:
+                results[machine_name] = future.result()
+        return {machine_name: results[machine_name] for machine_name in self.machines}
+
+    @staticmethod
+    def errors(results: dict[str, object]) -> dict[str, Exception]:
+        '''Returns the failed machines of results with their exception.'''
+        return {machine_name: result for machine_name, result in results.items()
+                if isinstance(result, Exception)}
+
+    def command(self, command: LVConnectQC008.INSTRUCTIONS,
+                timeout: float = None) -> dict[str, object]:
+        return self.run(lambda qc008: qc008.command(command), timeout)
+
+    def start_measurement(self, timeout: float = None) -> dict[str, object]:
+        return self.command("StartMeasurement", timeout)
+
+    def stop_measurement(self, timeout: float = None) -> dict[str, object]:
+        return self.command("StopMeasurement", timeout)
+
+    def rates(self, timeout: float = None) -> dict[str, list[int] | Exception]:
+        return self.run(lambda qc008: qc008.rates, timeout)
+
+    def measurement_status(self, timeout: float = None) -> dict[str, str | Exception]:
+        return self.run(lambda qc008: qc008.measurement_status, timeout)
+
+    def save_raw(self, file_name, timeout: float = None) -> dict[str, object]:
+        '''Saves the raw data on every machine, to file_name in the
+        file_saving_path of its LVConnectQC008.'''
+        return self.run(lambda qc008: qc008.save_raw(file_name), timeout)
+
+    def close(self):
+        self.__executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 class LVConnectBDU:
     '''Wrapper class for interfacing with a BDU laser via the BDU application.
 
@@ -229,6 +385,14 @@ class LVConnectBDU:
 
     Note that reading or writing any property as well as sending any command
     without an instance of the BDU application will raise a ChildProcessError.
+
+    The static properties serial_number, wavelength, frequencies and
+    firmware_version are cached. The cache is dropped when connected finds a
+    different (or no) laser connected, on close() and by invalidate_cache().
+
+    While the BDU application is loading, commands are retried with
+    exponential backoff until ready_timeout_s (default 60 s, None: no
+    deadline) has passed, then a ChildProcessError is raised.
     '''
 
     INSTRUCTIONS = Literal['Armed', 'GetArmed', 'Power', 'GetPower', 'Frequ',
@@ -240,7 +404,10 @@ class LVConnectBDU:
                  machine_name: str | None = None,
                  default_timeout_s: int = 3,
                  error_string_buffer_len: int = 512,
-                 result_string_buffer_len: int = 512):
+                 result_string_buffer_len: int = 512,
+                 lock_machine: bool = True,
+                 ready_timeout_s: float | None = 60.0):
+        '''Commands can be sent from several threads, see LVConnectQC008.'''
         if dll_path is None:
             dll_path = Path(sys.modules['bhpy'].__file__).parent / Path('dll/ControlBDU.dll')
         else:
@@ -248,7 +415,7 @@ class LVConnectBDU:
 
         self._file_saving_path = Path('./')
 
-        self.__dll = CDLL(str(dll_path.absolute()))
+        self.__dll = load_library(dll_path)
         self.__Dll_ControlBDU = self.__dll.dll_ControlBDU
 
         self.__Dll_ControlBDU.argtypes = [c_char_p, c_char_p, c_uint32, c_char_p,
@@ -261,33 +428,54 @@ class LVConnectBDU:
             self._machine_name = machine_name.encode('utf-8')
 
         self._cmd_timeout_s = default_timeout_s
-        self._error_str = create_string_buffer(error_string_buffer_len)
-        self._result_str = create_string_buffer(result_string_buffer_len)
+        self._buffers = _ResultBuffers(error_string_buffer_len, result_string_buffer_len)
+        self._lock_machine = lock_machine
+        self._ready_timeout_s = ready_timeout_s
         self._app_version = None
+        self._static_cache: dict[str, object] = {}
+
+    def invalidate_cache(self):
+        '''Drops the cached static properties.'''
+        self._static_cache.clear()
+
+    def _static(self, name: str, query: Callable[[], object]):
+        '''Returns the cached value of the static property name, queries it
+        if not cached. None (no laser connected) is not cached.'''
+        value = self._static_cache.get(name)
+        if value is None:
+            value = query()
+            if value is not None:
+                self._static_cache[name] = value
+        return value
+
+    def __call_dll(self, cmd: bytes, machine_name: bytes) -> tuple[int, _ResultBuffers]:
+        buffers = self._buffers
+        with _machine_lock(machine_name) if self._lock_machine else nullcontext():
+            res = self.__Dll_ControlBDU(cmd, machine_name, self._cmd_timeout_s,
+                                        buffers.error_str, buffers.result_str,
+                                        len(buffers.error_str), len(buffers.result_str))
+        return res, buffers
 
     def _get_app_version(self, machine_name: str | None = None):
+        backoff = _Backoff(self._ready_timeout_s)
         while True:
-            res = self.__Dll_ControlBDU('GetAppVersion'.encode('utf-8'),
-                                        machine_name, self._cmd_timeout_s,
-                                        self._error_str, self._result_str,
-                                        len(self._error_str),
-                                        len(self._result_str))
+            res, buffers = self.__call_dll('GetAppVersion'.encode('utf-8'), machine_name)
             if res == 0 or res == 1:
-                response_str = self._result_str.value.decode()
+                response_str = buffers.result_str.value.decode()
                 if 'Unknown Job-command' in response_str:
                     raise RuntimeError('Unsupported BDU application version. '
                                        'LVConnectBDU requires version 1.0.0.92'
                                        'or higher.')
                 if 'Still loading' not in response_str:
                     break
-                sleep(0.5)
+                backoff.sleep('BDU application still loading')
             elif res == 56:  # lv connect port not open yet
-                sleep(0.1)
+                backoff.sleep('BDU application port not open')
             else:
-                error_str = self._error_str.value.decode()
+                error_str = buffers.error_str.value.decode()
                 if 'Still loading' not in error_str:
                     raise ChildProcessError(f'{error_str.lstrip()} ({res})')
-                sleep(0.5)
+                backoff.sleep('BDU application still loading')
 
         version = [int(x) for x in response_str.split('.')]
         if version[0] == 1 and version[1] == 0 and version[2] == 0 and version[3] >= 92:
@@ -312,24 +500,23 @@ class LVConnectBDU:
         else:
             cmd = f'{command} {command_arg}'
 
+        backoff = _Backoff(self._ready_timeout_s)
         while True:
-            res = self.__Dll_ControlBDU(cmd.encode('utf-8'), machine_name, self._cmd_timeout_s,
-                                        self._error_str, self._result_str, len(self._error_str),
-                                        len(self._result_str))
+            res, buffers = self.__call_dll(cmd.encode('utf-8'), machine_name)
             if cmd == 'Stop':  # call might not even return since program kills itself
                 return True
             if res == 0 or res == 1:
-                response_str = self._result_str.value.decode()
+                response_str = buffers.result_str.value.decode()
                 if 'Still loading' not in response_str:
                     return response_str.split(' ')[0]
-                sleep(0.5)
+                backoff.sleep('BDU application still loading')
             elif res == 56:  # lv connect port not open yet
-                sleep(0.1)
+                backoff.sleep('BDU application port not open')
             else:
-                error_str = self._error_str.value.decode()
+                error_str = buffers.error_str.value.decode()
                 if 'Still loading' not in error_str:
                     raise ChildProcessError(f'{error_str.lstrip()} ({res})')
-                sleep(0.5)
+                backoff.sleep('BDU application still loading')
 
     def command(self, command: INSTRUCTIONS | str, command_arg: str = None) -> str:
         '''Sends a command and optional arguments to the connected BDU
@@ -345,10 +532,12 @@ class LVConnectBDU:
     @property
     def firmware_version(self) -> str:
         '''Returns the firmware version string of the connected BDU'''
-        response = self._command(command='GetFwVersion')
-        if response == '':
-            return None
-        return response
+        def query():
+            response = self._command(command='GetFwVersion')
+            if response == '':
+                return None
+            return response
+        return self._static('firmware_version', query)
 
     @property
     def emission(self) -> bool:
@@ -406,6 +595,9 @@ class LVConnectBDU:
     @property
     def serial_number(self) -> str | None:
         '''Returns the serial number string of the connected BDU.'''
+        return self._static('serial_number', self._query_serial_number)
+
+    def _query_serial_number(self) -> str | None:
         response = self._command(command='GetSN')
         if response == 'NC' or response == '':
             return None
@@ -414,22 +606,30 @@ class LVConnectBDU:
     @property
     def wavelength(self) -> float | None:
         '''Returns the wavelength of the connected BDU in nm.'''
-        response = self._command(command='GetWL')
-        try:
-            return float(response.replace(',', '.'))
-        except ValueError:
-            if response == '':
-                return None
-            raise
+        def query():
+            response = self._command(command='GetWL')
+            try:
+                return float(response.replace(',', '.'))
+            except ValueError:
+                if response == '':
+                    return None
+                raise
+        return self._static('wavelength', query)
 
     @property
-    def frequencies(self) -> list[str]:
+    def frequencies(self) -> list[str] | None:
         '''Returns the pulse frequency names (if present including CW) of
         the connected BDU laser as a list of strings.
 
         These names are the possible names that can be used to set the
         frequency property.'''
-        return self._command(command='GetFreqStrings').split(';')
+        def query():
+            response = self._command(command='GetFreqStrings')
+            if response == '':
+                return None
+            return response.split(';')
+        frequencies = self._static('frequencies', query)
+        return None if frequencies is None else list(frequencies)
 
     @property
     def frequency(self) -> str:
@@ -442,20 +642,28 @@ class LVConnectBDU:
 
     @frequency.setter
     def frequency(self, frequency_name: str):
-        if frequency_name not in self.frequencies:
-            raise ValueError(f'Frequency must be one of {self.frequencies}')
+        frequencies = self.frequencies
+        if frequencies is None or frequency_name not in frequencies:
+            raise ValueError(f'Frequency must be one of {frequencies}')
         self._command('Frequ', frequency_name)
 
     @property
     def connected(self) -> bool:
         '''Returns the connection state of a BDU laser and the BDU
-        application.'''
-        if self.serial_number is None:
-            return False
-        return True
+        application.
+
+        Always queries the serial number, the cached static properties are
+        dropped if it changed.'''
+        serial_number = self._query_serial_number()
+        if serial_number != self._static_cache.get('serial_number'):
+            self.invalidate_cache()
+            if serial_number is not None:
+                self._static_cache['serial_number'] = serial_number
+        return serial_number is not None
 
     def close(self) -> bool:
         '''Closes the BDU application.
 
         Returns True on success.'''
+        self.invalidate_cache()
         return self._command('Stop')
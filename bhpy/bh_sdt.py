@@ -0,0 +1,333 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import datetime
+    import io
+    from pathlib import Path
+    import zipfile
+    import numpy as np
+    import numpy.typing as npt
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+FILE_HEADER = np.dtype([("revision", "<i2"), ("info_offs", "<i4"), ("info_length", "<i2"),
+                        ("setup_offs", "<i4"), ("setup_length", "<i2"),
+                        ("data_block_offs", "<i4"), ("no_of_data_blocks", "<i2"),
+                        ("data_block_length", "<u4"), ("meas_desc_block_offs", "<i4"),
+                        ("no_of_meas_desc_blocks", "<i2"), ("meas_desc_block_length", "<i2"),
+                        ("header_valid", "<u2"), ("reserved1", "<u4"), ("reserved2", "<u2"),
+                        ("chksum", "<u2")])
+
+BLOCK_HEADER = np.dtype([("block_no", "<i2"), ("data_offs", "<i4"), ("next_block_offs", "<i4"),
+                         ("block_type", "<u2"), ("meas_desc_block_no", "<i2"),
+                         ("lblock_no", "<u4"), ("block_length", "<u4")])
+
+# Leading part of the measurement description block (MeasureInfo), enough to shape the data
+MEASURE_INFO = np.dtype([("time", "S9"), ("date", "S11"), ("mod_ser_no", "S16"),
+                         ("meas_mode", "<i2"), ("cfd_ll", "<f4"), ("cfd_lh", "<f4"),
+                         ("cfd_zc", "<f4"), ("cfd_hf", "<f4"), ("syn_zc", "<f4"),
+                         ("syn_fd", "<i2"), ("syn_fq", "<f4"), ("syn_hf", "<f4"),
+                         ("tac_r", "<f4"), ("tac_g", "<i2"), ("tac_of", "<f4"),
+                         ("tac_ll", "<f4"), ("tac_lh", "<f4"), ("adc_re", "<i2"),
+                         ("eal_de", "<i2"), ("ncx", "<i2"), ("ncy", "<i2"), ("page", "<i2"),
+                         ("col_t", "<f4"), ("rep_t", "<f4"), ("stopt", "<i2"), ("overfl", "S1"),
+                         ("use_motor", "<i2"), ("steps", "<u2"), ("offset", "<f4"),
+                         ("dither", "<i2"), ("incr", "<i2"), ("mem_bank", "<i2"),
+                         ("mod_type", "S16"), ("syn_th", "<f4"), ("dead_time_comp", "<i2"),
+                         ("polarity_l", "<i2"), ("polarity_f", "<i2"), ("polarity_p", "<i2"),
+                         ("linediv", "<i2"), ("accumulate", "<i2"), ("flbck_y", "<i4"),
+                         ("flbck_x", "<i4"), ("bord_u", "<i4"), ("bord_l", "<i4"),
+                         ("pix_time", "<f4"), ("pix_clk", "<i2"), ("trigger", "<i2"),
+                         ("scan_x", "<i4"), ("scan_y", "<i4"), ("scan_rx", "<i4"),
+                         ("scan_ry", "<i4"), ("fifo_typ", "<i2"), ("epx_div", "<i4"),
+                         ("mod_type_code", "<u2"), ("mod_fpga_ver", "<u2"),
+                         ("overflow_corr_factor", "<f4"), ("adc_zoom", "<i4"), ("cycles", "<i4")])
+
+HEADER_VALID = 0x5555
+HEADER_CHKSUM = 0x55AA
+
+BLOCK_CREATION = {0: "NOT_USED", 1: "MEAS_DATA", 2: "FLOW_DATA", 3: "MEAS_DATA_FROM_FILE",
+                  4: "CALC_DATA", 5: "SIM_DATA", 8: "FIFO_DATA", 9: "FIFO_DATA_FROM_FILE",
+                  10: "MOM_DATA", 11: "MOM_DATA_FROM_FILE"}
+BLOCK_CONTENT = {0x00: "DECAY_BLOCK", 0x10: "PAGE_BLOCK", 0x20: "FCS_BLOCK", 0x30: "FIDA_BLOCK",
+                 0x40: "FILDA_BLOCK", 0x50: "MCS_BLOCK", 0x60: "IMG_BLOCK",
+                 0x70: "MCSTA_BLOCK", 0x80: "IMG_MCS_BLOCK", 0x90: "MOM_BLOCK"}
+BLOCK_DTYPE = {0x000: np.dtype("<u2"), 0x100: np.dtype("<u4"), 0x200: np.dtype("<f8")}
+BLOCK_COMPRESSED = 0x1000
+
+
+def header_checksum(header: npt.NDArray) -> int:
+    words = np.frombuffer(header.tobytes(), dtype="<u2")[:-1]
+    return (HEADER_CHKSUM - int(words.sum())) & 0xFFFF
+
+
+class SdtBlock:
+    '''One measurement data block of an SDT file.
+
+    The data is memory mapped from the file on first access of data, so
+    slicing single decays out of large blocks reads only those parts of
+    the file. Compressed blocks are decompressed into memory instead.
+    '''
+
+    def __init__(self, path: Path, header: npt.NDArray, measure_info: dict | None):
+        self.path = path
+        self.header = {name: header[name].item() for name in BLOCK_HEADER.names}
+        self.measure_info = measure_info
+        self._data = None
+
+        block_type = self.header["block_type"]
+        self.creation = BLOCK_CREATION.get(block_type & 0xF, "UNKNOWN")
+        self.content = BLOCK_CONTENT.get(block_type & 0xF0, "UNKNOWN")
+        self.compressed = bool(block_type & BLOCK_COMPRESSED)
+        self.dtype = BLOCK_DTYPE.get(block_type & 0xF00, np.dtype("<u2"))
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        '''(scan_y, scan_x, adc_re) for images, (n, adc_re) for multiple
+        decays and (adc_re,) for a single decay. Flat if the measurement
+        description does not fit the block length.'''
+        if self.compressed:
+            return self.data.shape
+        return self._shape(self.header["block_length"] // self.dtype.itemsize)
+
+    def _shape(self, size: int) -> tuple[int, ...]:
+        if self.measure_info is None or self.measure_info.get("adc_re", 0) <= 0:
+            return (size,)
+        adc_re = self.measure_info["adc_re"]
+        scan_x = self.measure_info.get("scan_x", 0)
+        scan_y = self.measure_info.get("scan_y", 0)
+        if scan_x > 0 and scan_y > 0 and scan_x * scan_y * adc_re == size:
+            return (scan_y, scan_x, adc_re)
+        if size == adc_re:
+            return (adc_re,)
+        if size % adc_re == 0:
+            return (size // adc_re, adc_re)
+        return (size,)
+
+    @property
+    def data(self) -> npt.NDArray:
+        if self._data is None:
+            if self.compressed:
+                with open(self.path, "rb") as f:
+                    f.seek(self.header["data_offs"])
+                    compressed = f.read(self.header["block_length"])
+                with zipfile.ZipFile(io.BytesIO(compressed)) as archive:
+                    raw = archive.read(archive.namelist()[0])
+                data = np.frombuffer(raw, dtype=self.dtype)
+                self._data = data.reshape(self._shape(data.size))
+            else:
+                self._data = np.memmap(self.path, dtype=self.dtype, mode="r",
+                                       offset=self.header["data_offs"],
+                                       shape=self._shape(self.header["block_length"]
+                                                         // self.dtype.itemsize))
+        return self._data
+
+    def close(self):
+        self._data = None
+
+
+class SdtFile:
+    '''Reader for Becker & Hickl SDT files as written by SPCM,
+    LVConnectQC008.save_sdt() or SdtWriter.
+
+    Only the file header, the info/setup text and the block table are read
+    on construction, the measurement data blocks are mapped lazily:
+
+        with SdtFile("measurement.sdt") as sdt:
+            decay = sdt[0][12, 34]  # one pixel of the first image block
+    '''
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = np.frombuffer(f.read(FILE_HEADER.itemsize), dtype=FILE_HEADER)[0]
+            self.header = {name: header[name].item() for name in FILE_HEADER.names}
+            if self.header["header_valid"] != HEADER_VALID:
+                log.warning(f"{self.path}: file header is not marked valid")
+
+            f.seek(self.header["info_offs"])
+            self.info = f.read(self.header["info_length"]).decode("latin-1")
+            f.seek(self.header["setup_offs"])
+            self.setup = f.read(self.header["setup_length"]).split(b"\0", 1)[0].decode("latin-1")
+
+            self.measure_info = []
+            length = self.header["meas_desc_block_length"]
+            for i in range(self.header["no_of_meas_desc_blocks"]):
+                f.seek(self.header["meas_desc_block_offs"] + i * length)
+                raw = f.read(length)
+                self.measure_info.append(self._parse_measure_info(raw))
+
+            self.blocks = []
+            offset = self.header["data_block_offs"]
+            for _ in range(self.header["no_of_data_blocks"]):
+                f.seek(offset)
+                block_header = np.frombuffer(f.read(BLOCK_HEADER.itemsize), dtype=BLOCK_HEADER)[0]
+                desc_no = int(block_header["meas_desc_block_no"])
+                measure_info = (self.measure_info[desc_no]
+                                if 0 <= desc_no < len(self.measure_info) else None)
+                self.blocks.append(SdtBlock(self.path, block_header, measure_info))
+                offset = int(block_header["next_block_offs"])
+
+    @staticmethod
+    def _parse_measure_info(raw: bytes) -> dict:
+        fields = {}
+        offset = 0
+        for name in MEASURE_INFO.names:
+            field_dtype = MEASURE_INFO.fields[name][0]
+            if offset + field_dtype.itemsize > len(raw):
+                break
+            value = np.frombuffer(raw, dtype=field_dtype, count=1, offset=offset)[0].item()
+            if isinstance(value, bytes):
+                value = value.split(b"\0", 1)[0].decode("latin-1")
+            fields[name] = value
+            offset += field_dtype.itemsize
+        return fields
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def __getitem__(self, index: int) -> npt.NDArray:
+        return self.blocks[index].data
+
+    def __iter__(self):
+        return (block.data for block in self.blocks)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SdtWriter:
+    '''Streaming writer for SDT files.
+
+    Every add_block() call appends one data block (a decay histogram, a
+    set of histograms or a FLIM cube of shape (y, x, bins)) directly to
+    the file. The measurement descriptions and the file header are written
+    when the writer is closed.
+    '''
+
+    INFO = ("*IDENTIFICATION\r\nID        : SPC Setup & Data File\r\n"
+            "Title     : {title}\r\nVersion   : 1  781 M\r\nRevision  : 12 bits ADC\r\n"
+            "Date      : {date}\r\nTime      : {time}\r\nAuthor    : bhpy\r\n"
+            "Company   : \r\nContents  : {contents}\r\n*END\r\n\r\n")
+    SETUP = "*SETUP\r\n*END\r\n\r\n"
+
+    def __init__(self, path: Path | str, title: str = "", contents: str = "",
+                 measure_info: dict | None = None):
+        self.path = Path(path)
+        self._measure_info = {} if measure_info is None else dict(measure_info)
+        self._now = datetime.datetime.now()
+        self._descriptions: list[tuple[int, int, int]] = []
+        self._blocks = 0
+        self._max_block_length = 0
+        self._file = open(self.path, "wb")
+
+        self._header = np.zeros((), dtype=FILE_HEADER)
+        self._file.write(self._header.tobytes())
+        info = self.INFO.format(title=title, contents=contents,
+                                date=self._now.strftime("%m-%d-%Y"),
+                                time=self._now.strftime("%H:%M:%S")).encode("latin-1")
+        self._header["info_offs"] = self._file.tell()
+        self._header["info_length"] = len(info)
+        self._file.write(info)
+        setup = self.SETUP.encode("latin-1")
+        self._header["setup_offs"] = self._file.tell()
+        self._header["setup_length"] = len(setup)
+        self._file.write(setup)
+        self._header["data_block_offs"] = self._file.tell()
+
+    def add_block(self, data: npt.NDArray, image: bool | None = None,
+                  compress: bool = False) -> int:
+        '''Appends data as measurement block and returns the block number.
+
+        The last axis is the time (micro time bin) axis. 3D data is stored
+        as image block, anything else as decay block unless image says
+        otherwise. Data is stored as u2, u4 or f8 (other integer types as
+        u4, other float types as f8), zip compressed if compress is set.'''
+        data = np.asarray(data)
+        if data.dtype == np.uint16 or data.dtype == np.uint32 or data.dtype == np.float64:
+            data = data.astype(data.dtype.newbyteorder("<"), copy=False)
+        elif np.issubdtype(data.dtype, np.floating):
+            data = data.astype("<f8")
+        else:
+            data = data.astype("<u4")
+        data_type = {2: 0x000, 4: 0x100, 8: 0x200}[data.dtype.itemsize]
+        if image is None:
+            image = data.ndim == 3
+        data = np.atleast_1d(data)
+        scan_y, scan_x = data.shape[:2] if data.ndim == 3 else (0, 0)
+        description = (data.shape[-1], scan_x, scan_y)
+        if description not in self._descriptions:
+            self._descriptions.append(description)
+
+        if compress:
+            raw = io.BytesIO()
+            with zipfile.ZipFile(raw, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("data_block", np.ascontiguousarray(data).tobytes())
+            payload = raw.getvalue()
+            data_type |= BLOCK_COMPRESSED
+        else:
+            payload = None
+        block_length = data.nbytes if payload is None else len(payload)
+
+        block_header = np.zeros((), dtype=BLOCK_HEADER)
+        data_offs = self._file.tell() + BLOCK_HEADER.itemsize
+        block_header["block_no"] = self._blocks if self._blocks <= 0x7ffe else -1
+        block_header["data_offs"] = data_offs
+        block_header["next_block_offs"] = data_offs + block_length
+        block_header["block_type"] = 0x1 | (0x60 if image else 0x00) | data_type
+        block_header["meas_desc_block_no"] = self._descriptions.index(description)
+        block_header["lblock_no"] = self._blocks
+        block_header["block_length"] = block_length
+        self._file.write(block_header.tobytes())
+        if payload is None:
+            np.ascontiguousarray(data).tofile(self._file)
+        else:
+            self._file.write(payload)
+
+        self._max_block_length = max(self._max_block_length, block_length)
+        self._blocks += 1
+        return self._blocks - 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._header["meas_desc_block_offs"] = self._file.tell()
+        for adc_re, scan_x, scan_y in self._descriptions:
+            measure_info = np.zeros((), dtype=MEASURE_INFO)
+            measure_info["time"] = self._now.strftime("%H:%M:%S").encode()
+            measure_info["date"] = self._now.strftime("%m-%d-%Y").encode()
+            for name, value in self._measure_info.items():
+                measure_info[name] = value
+            measure_info["adc_re"] = adc_re
+            measure_info["scan_x"] = scan_x
+            measure_info["scan_y"] = scan_y
+            self._file.write(measure_info.tobytes())
+
+        self._header["revision"] = 0
+        self._header["no_of_data_blocks"] = min(self._blocks, 0x7fff)
+        self._header["data_block_length"] = self._max_block_length
+        self._header["no_of_meas_desc_blocks"] = len(self._descriptions)
+        self._header["meas_desc_block_length"] = MEASURE_INFO.itemsize
+        self._header["header_valid"] = HEADER_VALID
+        self._header["reserved1"] = self._blocks
+        self._header["chksum"] = header_checksum(self._header)
+        self._file.seek(0)
+        self._file.write(self._header.tobytes())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,132 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    from bisect import bisect_left
+    import threading
+    from time import perf_counter
+    from typing import Iterable
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+class CallStats:
+    '''Call count, cumulative time and latency histogram of one call site.
+
+    The histogram buckets are powers of two from 1 µs up to ~1 s, every
+    bucket counts the calls taking at most its upper bound (and more than
+    the bound of the previous bucket). Calls above the last bound are
+    counted in an additional overflow bucket.
+    '''
+
+    BUCKET_BOUNDS_S = tuple(1e-6 * 2 ** i for i in range(21))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.total_s = 0.0
+            self.max_s = 0.0
+            self.buckets = [0] * (len(self.BUCKET_BOUNDS_S) + 1)
+
+    def record(self, seconds: float):
+        bucket = bisect_left(self.BUCKET_BOUNDS_S, seconds)
+        with self._lock:
+            self.calls += 1
+            self.total_s += seconds
+            if seconds > self.max_s:
+                self.max_s = seconds
+            self.buckets[bucket] += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls,
+                    "total_s": self.total_s,
+                    "mean_s": self.total_s / self.calls if self.calls else 0.0,
+                    "max_s": self.max_s,
+                    "histogram": [[bound, count] for bound, count in
+                                  zip(self.BUCKET_BOUNDS_S + (float("inf"),), self.buckets)
+                                  if count]}
+
+
+class TransferStats(CallStats):
+    '''CallStats of a data transfer, additionally counting the bytes
+    transferred and their size histogram.
+
+    The size buckets are powers of two from 1 KiB up to 1 GiB, counted like
+    the latency buckets.'''
+
+    SIZE_BOUNDS = tuple(1024 * 2 ** i for i in range(21))
+
+    def reset(self):
+        with self._lock:
+            self.bytes = 0
+            self.size_buckets = [0] * (len(self.SIZE_BOUNDS) + 1)
+        super().reset()
+
+    def record(self, seconds: float, no_of_bytes: int = 0):
+        bucket = bisect_left(self.SIZE_BOUNDS, no_of_bytes)
+        with self._lock:
+            self.bytes += no_of_bytes
+            self.size_buckets[bucket] += 1
+        super().record(seconds)
+
+    def as_dict(self) -> dict:
+        result = super().as_dict()
+        with self._lock:
+            result["bytes"] = self.bytes
+            result["bytes_per_s"] = self.bytes / self.total_s if self.total_s else 0.0
+            result["size_histogram"] = [[bound, count] for bound, count in
+                                        zip(self.SIZE_BOUNDS + (float("inf"),),
+                                            self.size_buckets)
+                                        if count]
+        return result
+
+
+class TimedCall:
+    '''Callable proxy that records the latency of every call of function
+    in stats.'''
+
+    __slots__ = ("function", "stats")
+
+    def __init__(self, function, stats: CallStats):
+        self.function = function
+        self.stats = stats
+
+    def __call__(self, *args):
+        start = perf_counter()
+        try:
+            return self.function(*args)
+        finally:
+            self.stats.record(perf_counter() - start)
+
+
+def instrument_dll_functions(obj, functions: Iterable, stats: dict[str, CallStats]):
+    '''Replaces the function pointers of the DllFunction bindings in
+    functions (see bh_dll.dll_functions) already bound on obj by TimedCall
+    proxies, collecting the stats by dll symbol name. Functions bound later
+    are wrapped by DllFunction itself while obj._instrumented is set.
+
+    Since the proxies are only installed while instrumentation is enabled
+    there is no overhead at all otherwise.'''
+    bound = vars(obj)
+    for function in functions:
+        value = bound.get(function.attr_name)
+        if value is not None and not isinstance(value, TimedCall):
+            setattr(obj, function.attr_name,
+                    TimedCall(value, stats.setdefault(function.symbol, CallStats())))
+
+
+def uninstrument_dll_functions(obj, functions: Iterable):
+    '''Restores the function pointers replaced by
+    instrument_dll_functions().'''
+    bound = vars(obj)
+    for function in functions:
+        value = bound.get(function.attr_name)
+        if isinstance(value, TimedCall):
+            setattr(obj, function.attr_name, value.function)
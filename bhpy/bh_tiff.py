@@ -0,0 +1,151 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import struct
+    import numpy as np
+    import numpy.typing as npt
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+# Baseline TIFF tags used by SPCM's image transfers
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+STRIP_BYTE_COUNTS = 279
+PLANAR_CONFIGURATION = 284
+SAMPLE_FORMAT = 339
+
+# TIFF field type: (struct format, size)
+_FIELD_TYPES = {1: ("B", 1), 3: ("H", 2), 4: ("I", 4), 16: ("Q", 8)}
+
+# SampleFormat: numpy kind
+_SAMPLE_KINDS = {1: "u", 2: "i", 3: "f"}
+
+
+def _read_ifd(buffer: memoryview, offset: int, byte_order: str) -> dict[int, tuple]:
+    count, = struct.unpack_from(f"{byte_order}H", buffer, offset)
+    tags = {}
+    for i in range(count):
+        tag, field_type, values = struct.unpack_from(f"{byte_order}HHI", buffer,
+                                                     offset + 2 + i * 12)
+        if field_type not in _FIELD_TYPES:
+            continue
+        fmt, size = _FIELD_TYPES[field_type]
+        value_offset = offset + 10 + i * 12
+        if size * values > 4:
+            value_offset, = struct.unpack_from(f"{byte_order}I", buffer, value_offset)
+        tags[tag] = struct.unpack_from(f"{byte_order}{values}{fmt}", buffer, value_offset)
+    return tags
+
+
+def decode_tiff(buffer: bytes | bytearray | memoryview) -> npt.NDArray:
+    '''Decodes the first image of an uncompressed, striped baseline TIFF
+    (as sent by SPCM) into a new array of shape (height, width) or
+    (height, width, samples).
+
+    Supports 8, 16, 32 and 64 bit unsigned, signed and floating point
+    samples in either byte order. Raises ValueError for anything else.'''
+    buffer = memoryview(buffer).cast("B")
+    if bytes(buffer[:4]) == b"II*\0":
+        byte_order = "<"
+    elif bytes(buffer[:4]) == b"MM\0*":
+        byte_order = ">"
+    else:
+        raise ValueError("Not a TIFF (or BigTIFF is not supported)")
+    ifd_offset, = struct.unpack_from(f"{byte_order}I", buffer, 4)
+    tags = _read_ifd(buffer, ifd_offset, byte_order)
+
+    if tags.get(COMPRESSION, (1,))[0] != 1:
+        raise ValueError(f"Unsupported TIFF compression {tags[COMPRESSION][0]}")
+    if tags.get(PLANAR_CONFIGURATION, (1,))[0] != 1:
+        raise ValueError("Only chunky (PlanarConfiguration 1) TIFFs are supported")
+    if STRIP_OFFSETS not in tags:
+        raise ValueError("Only striped TIFFs are supported")
+
+    width = tags[IMAGE_WIDTH][0]
+    height = tags[IMAGE_LENGTH][0]
+    samples = tags.get(SAMPLES_PER_PIXEL, (1,))[0]
+    bits = tags.get(BITS_PER_SAMPLE, (1,))[0]
+    kind = _SAMPLE_KINDS.get(tags.get(SAMPLE_FORMAT, (1,))[0])
+    if bits not in (8, 16, 32, 64) or kind is None or (kind == "f" and bits < 32):
+        raise ValueError(f"Unsupported TIFF sample type ({bits} bit, "
+                         f"SampleFormat {tags.get(SAMPLE_FORMAT, (1,))[0]})")
+    dtype = np.dtype(f"{byte_order}{kind}{bits // 8}")
+
+    image = np.empty(height * width * samples, dtype=dtype.newbyteorder("="))
+    position = 0
+    for offset, byte_count in zip(tags[STRIP_OFFSETS], tags[STRIP_BYTE_COUNTS]):
+        strip = np.frombuffer(buffer, dtype=dtype, count=byte_count // dtype.itemsize,
+                              offset=offset)
+        strip = strip[:image.size - position]
+        image[position:position + strip.size] = strip
+        position += strip.size
+    if position != image.size:
+        raise ValueError(f"Truncated TIFF ({position} of {image.size} samples)")
+    return image.reshape((height, width, samples) if samples > 1 else (height, width))
+
+
+def encode_tiff(image: npt.NDArray, rows_per_strip: int | None = None) -> bytes:
+    '''Encodes a 2D (height, width) or 3D (height, width, samples) array as
+    uncompressed little endian baseline TIFF, the inverse of decode_tiff.'''
+    image = np.asarray(image)
+    if image.ndim not in (2, 3):
+        raise ValueError(f"Expected a 2D or 3D image, got shape {image.shape}")
+    if image.dtype.kind not in _SAMPLE_KINDS.values() or image.dtype.itemsize not in (1, 2, 4, 8):
+        raise ValueError(f"Unsupported image dtype {image.dtype}")
+    image = image.astype(image.dtype.newbyteorder("<"), copy=False)
+    height, width = image.shape[:2]
+    samples = image.shape[2] if image.ndim == 3 else 1
+    row_bytes = width * samples * image.dtype.itemsize
+    if rows_per_strip is None:
+        rows_per_strip = max(1, min(height, (1 << 16) // max(row_bytes, 1)))
+    strips = [np.ascontiguousarray(image[row:row + rows_per_strip]).tobytes()
+              for row in range(0, height, rows_per_strip)]
+
+    sample_format = {"u": 1, "i": 2, "f": 3}[image.dtype.kind]
+    tag_count = 10
+    ifd_offset = 8
+    data_offset = ifd_offset + 2 + tag_count * 12 + 4
+    offsets_offset = data_offset
+    counts_offset = offsets_offset + 4 * len(strips)
+    # Single strips store offset and byte count directly in the entries
+    strip_offset = counts_offset + 4 * len(strips) if len(strips) > 1 else data_offset
+    strip_offsets = []
+    for strip in strips:
+        strip_offsets.append(strip_offset)
+        strip_offset += len(strip)
+
+    def entry(tag, field_type, count, value):
+        return struct.pack("<HHII", tag, field_type, count, value)
+
+    def array_entry(tag, values, offset):
+        if len(values) == 1:
+            return entry(tag, 4, 1, values[0])
+        return entry(tag, 4, len(values), offset)
+
+    ifd = struct.pack("<H", tag_count) + b"".join([
+        entry(IMAGE_WIDTH, 4, 1, width),
+        entry(IMAGE_LENGTH, 4, 1, height),
+        struct.pack("<HHIHH", BITS_PER_SAMPLE, 3, 1, image.dtype.itemsize * 8, 0),
+        struct.pack("<HHIHH", COMPRESSION, 3, 1, 1, 0),
+        struct.pack("<HHIHH", PHOTOMETRIC, 3, 1, 1, 0),
+        array_entry(STRIP_OFFSETS, strip_offsets, offsets_offset),
+        struct.pack("<HHIHH", SAMPLES_PER_PIXEL, 3, 1, samples, 0),
+        entry(ROWS_PER_STRIP, 4, 1, rows_per_strip),
+        array_entry(STRIP_BYTE_COUNTS, [len(strip) for strip in strips], counts_offset),
+        struct.pack("<HHIHH", SAMPLE_FORMAT, 3, 1, sample_format, 0),
+    ]) + struct.pack("<I", 0)
+    arrays = b""
+    if len(strips) > 1:
+        arrays = (struct.pack(f"<{len(strips)}I", *strip_offsets)
+                  + struct.pack(f"<{len(strips)}I", *[len(strip) for strip in strips]))
+    return b"II*\0" + struct.pack("<I", ifd_offset) + ifd + arrays + b"".join(strips)
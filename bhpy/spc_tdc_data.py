@@ -0,0 +1,41 @@
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    from pathlib import Path
+    from typing import Iterator
+    import numpy as np
+    import numpy.typing as npt
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+def write_record_file(path: Path | str, words: npt.NDArray, append: bool = False) -> int:
+    '''Writes raw event words to a record file and returns the number of
+    bytes written. The words are written as they are, np.uint32 for the
+    event files of SPC-QC-X04 and PMS-800, np.uint64 for the event triplet
+    files of SPC-QC-X08.'''
+    words = np.ascontiguousarray(words)
+    with open(path, "ab" if append else "wb") as f:
+        words.tofile(f)
+    return words.nbytes
+
+
+def read_record_file(path: Path | str, dtype: npt.DTypeLike = np.uint32) -> npt.NDArray:
+    '''Returns the raw event words of a record file as read only memory
+    map, see write_record_file for the dtype. The words are not decoded.'''
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def iter_record_file(path: Path | str, chunk_events: int = 1 << 20,
+                     dtype: npt.DTypeLike = np.uint32) -> Iterator[npt.NDArray]:
+    '''Yields the raw event words of a record file in chunks of at most
+    chunk_events words, see write_record_file for the dtype.'''
+    with open(path, "rb") as f:
+        while True:
+            chunk = np.fromfile(f, dtype=dtype, count=chunk_events)
+            if chunk.size == 0:
+                return
+            yield chunk
@@ -0,0 +1,230 @@
+'''Export of decoded TDC events to PTU and Photon-HDF5 files.
+
+The writers take chunks of EVENT_DTYPE records: macro time, micro time,
+channel and marker bits per event. bhpy does not produce them itself:
+get_events_from_buffer() of the SpcQcX04/SpcQcX08/Pms800 wrappers and the
+record files (spc_tdc_data) hold the raw event words of the device, whose
+format is defined by the device documentation. Decode those words into
+EVENT_DTYPE with your own decoder (or take the events from another
+source) before passing them to the writers or export_stream().
+'''
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import datetime
+    from pathlib import Path
+    import struct
+    from typing import Iterable
+    import numpy as np
+    import numpy.typing as npt
+except ModuleNotFoundError as err:
+    # Error handling
+    log.error(err)
+    raise
+
+
+# Decoded events. The marker field holds the marker bits of marker events in the order pixel,
+# line, frame, marker3 and is 0 for photons.
+EVENT_DTYPE = np.dtype([("macro_time", np.uint64), ("micro_time", np.uint16),
+                        ("channel", np.uint8), ("marker", np.uint8)])
+
+
+class PtuWriter:
+    '''Streaming writer for PicoQuant PTU files (HydraHarp V2 T3 records).
+
+    The macro time of the events is written as sync count, the micro time
+    as dtime and markers as special records. Events are packed chunk by
+    chunk, only the current chunk is held in memory. The number of records
+    in the header is patched when the writer is closed.
+    '''
+
+    REC_TYPE_HYDRAHARP2_T3 = 0x01010304
+
+    TY_INT8 = 0x10000008
+    TY_FLOAT8 = 0x20000008
+    TY_TDATETIME = 0x21000008
+    TY_ANSI_STRING = 0x4001FFFF
+    TY_EMPTY8 = 0xFFFF0008
+
+    NSYNC_BITS = 10
+    MAX_OVERFLOWS = (1 << NSYNC_BITS) - 1
+
+    def __init__(self, path: Path | str, resolution_s: float, sync_period_s: float,
+                 no_of_channels: int = 8, comment: str = ""):
+        self.path = Path(path)
+        self.records = 0
+        self._period = 0
+        self._file = open(self.path, "wb")
+        try:
+            self._write_header(resolution_s, sync_period_s, no_of_channels, comment)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _write_header(self, resolution_s: float, sync_period_s: float, no_of_channels: int,
+                      comment: str):
+        self._file.write(b"PQTTTR\0\0" + b"1.0.00\0\0")
+
+        days = (datetime.datetime.now() - datetime.datetime(1899, 12, 30)).total_seconds() / 86400
+        self._tag_str("CreatorSW_Name", "bhpy")
+        self._tag_str("File_Comment", comment)
+        self._tag("File_CreatingTime", self.TY_TDATETIME, struct.pack("<d", days))
+        self._tag_str("HW_Type", "HydraHarp")
+        self._tag_int("HW_InpChannels", no_of_channels + 1)
+        self._tag_int("Measurement_Mode", 3)
+        self._tag_int("Measurement_SubMode", 0)
+        self._tag_int("MeasDesc_RecordingMode", 3)
+        self._tag_int("MeasDesc_BinningFactor", 1)
+        self._tag("MeasDesc_Resolution", self.TY_FLOAT8, struct.pack("<d", resolution_s))
+        self._tag("MeasDesc_GlobalResolution", self.TY_FLOAT8, struct.pack("<d", sync_period_s))
+        self._tag_int("TTResult_SyncRate", int(round(1 / sync_period_s)))
+        self._tag_int("TTResultFormat_TTTRRecType", self.REC_TYPE_HYDRAHARP2_T3)
+        self._tag_int("TTResultFormat_BitsPerRecord", 32)
+        self._records_offset = self._tag_int("TTResult_NumberOfRecords", 0)
+        self._tag("Header_End", self.TY_EMPTY8, bytes(8))
+
+    def _tag(self, ident: str, tag_type: int, value: bytes, data: bytes = b"") -> int:
+        '''Writes a tag and returns the file offset of its 8 byte value.'''
+        self._file.write(struct.pack("<32siI", ident.encode(), -1, tag_type))
+        offset = self._file.tell()
+        self._file.write(value + data)
+        return offset
+
+    def _tag_int(self, ident: str, value: int) -> int:
+        return self._tag(ident, self.TY_INT8, struct.pack("<q", value))
+
+    def _tag_str(self, ident: str, value: str):
+        data = value.encode() + b"\0"
+        data += bytes(-len(data) % 8)
+        self._tag(ident, self.TY_ANSI_STRING, struct.pack("<q", len(data)), data)
+
+    def pack(self, events: npt.NDArray) -> npt.NDArray[np.uint32]:
+        '''Packs EVENT_DTYPE records into T3 records including the overflow
+        records the sync count requires.'''
+        nsync = events["macro_time"].astype(np.uint64)
+        periods = (nsync >> np.uint64(self.NSYNC_BITS)).astype(np.int64)
+        gaps = np.diff(periods, prepend=self._period)
+        if events.size:
+            self._period = int(periods[-1])
+        overflows = -(-gaps // self.MAX_OVERFLOWS)  # overflow records needed before each event
+
+        marker = events["marker"].astype(np.uint32)
+        is_marker = marker != 0
+        words = ((np.where(is_marker, marker, events["channel"]).astype(np.uint32) & 0x3F) << 25
+                 | (events["micro_time"].astype(np.uint32) & 0x7FFF) << 10
+                 | (nsync & np.uint64(self.MAX_OVERFLOWS)).astype(np.uint32))
+        words[is_marker] |= np.uint32(1 << 31)
+
+        overflow_record = np.uint32((1 << 31) | (0x3F << 25))
+        records = np.full(events.size + int(overflows.sum()),
+                          overflow_record | np.uint32(self.MAX_OVERFLOWS), dtype=np.uint32)
+        positions = np.arange(events.size) + np.cumsum(overflows)
+        records[positions] = words
+        last = overflows > 0  # the last overflow record before an event holds the remainder
+        records[positions[last] - 1] = overflow_record | (
+            gaps[last] - (overflows[last] - 1) * self.MAX_OVERFLOWS).astype(np.uint32)
+        return records
+
+    def write(self, events: npt.NDArray) -> int:
+        '''Writes a chunk of EVENT_DTYPE records and returns the number of
+        records written.'''
+        records = self.pack(events)
+        records.tofile(self._file)
+        self.records += records.size
+        return records.size
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(self._records_offset)
+        self._file.write(struct.pack("<q", self.records))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PhotonHdf5Writer:
+    '''Streaming writer for Photon-HDF5 style files (requires h5py).
+
+    Photons are appended chunk by chunk to the resizable datasets
+    photon_data/timestamps, detectors and nanotimes; marker events are
+    skipped.
+    '''
+
+    def __init__(self, path: Path | str, timestamps_unit_s: float, tcspc_unit_s: float,
+                 tcspc_num_bins: int, description: str = "", chunk_events: int = 1 << 16):
+        try:
+            import h5py
+        except ModuleNotFoundError as err:
+            log.error(err)
+            raise ModuleNotFoundError("PhotonHdf5Writer requires h5py (pip install h5py)"
+                                      ) from err
+        self.path = Path(path)
+        self.photons = 0
+        self._file = h5py.File(self.path, "w")
+        try:
+            self._write_header(description, timestamps_unit_s, tcspc_unit_s, tcspc_num_bins,
+                               chunk_events)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _write_header(self, description: str, timestamps_unit_s: float, tcspc_unit_s: float,
+                      tcspc_num_bins: int, chunk_events: int):
+        self._file.attrs["format_name"] = "Photon-HDF5"
+        self._file.attrs["format_version"] = "0.4"
+        self._file["description"] = description
+        self._file["setup/num_pixels"] = 1
+        self._file["setup/num_spots"] = 1
+        self._file["setup/lifetime"] = True
+        self._file["provenance/software"] = "bhpy"
+
+        photon_data = self._file.create_group("photon_data")
+        self._datasets = {
+            name: photon_data.create_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype,
+                                             chunks=(chunk_events,))
+            for name, dtype in (("timestamps", np.int64), ("detectors", np.uint8),
+                                ("nanotimes", np.uint16))}
+        photon_data["timestamps_specs/timestamps_unit"] = timestamps_unit_s
+        photon_data["nanotimes_specs/tcspc_unit"] = tcspc_unit_s
+        photon_data["nanotimes_specs/tcspc_num_bins"] = tcspc_num_bins
+        photon_data["nanotimes_specs/tcspc_range"] = tcspc_unit_s * tcspc_num_bins
+        photon_data["measurement_specs/measurement_type"] = "generic"
+
+    def write(self, events: npt.NDArray) -> int:
+        '''Appends the photons of a chunk of EVENT_DTYPE records and returns
+        their number.'''
+        photons = events[events["marker"] == 0]
+        start, stop = self.photons, self.photons + photons.size
+        for name, field in (("timestamps", "macro_time"), ("detectors", "channel"),
+                            ("nanotimes", "micro_time")):
+            dataset = self._datasets[name]
+            dataset.resize((stop,))
+            dataset[start:stop] = photons[field]
+        self.photons = stop
+        return photons.size
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_stream(chunks: Iterable[npt.NDArray], writer: PtuWriter | PhotonHdf5Writer) -> int:
+    '''Writes all chunks of decoded EVENT_DTYPE records (see the module
+    docstring) to writer and returns the number of events read.'''
+    events = 0
+    for chunk in chunks:
+        writer.write(chunk)
+        events += chunk.size
+    return events
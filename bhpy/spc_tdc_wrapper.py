@@ -3,7 +3,7 @@ log = logging.getLogger(__name__)
 
 try:
     from ctypes import (byref, cast, c_int16, create_string_buffer, Structure,
-                        CDLL, POINTER, c_char_p, c_uint8, c_uint16, c_uint32,
+                        POINTER, c_char_p, c_uint8, c_uint16, c_uint32,
                         c_bool, c_double, c_int8, c_float, c_uint64, c_int64,
                         c_char, c_int32)
     from pathlib import Path
@@ -13,6 +13,8 @@ try:
     import sys
     from typing import Literal
     import typing
+    from bhpy.bh_dll import DllFunction, dll_functions, load_library
+    from bhpy.bh_telemetry import CallStats, instrument_dll_functions, uninstrument_dll_functions
 except ModuleNotFoundError as err:
     # Error handling
     log.error(err)
@@ -48,10 +50,48 @@ class __TdcDllWrapper:
     version_str = ""
     version_str_buf = create_string_buffer(128)
 
+    __get_dll_version = DllFunction("get_dll_version", [c_char_p, c_uint8], c_int16)
+    __get_dll_debug = DllFunction("get_dll_debug", restype=c_uint8)
+    __abort_data_collection = DllFunction("abort_data_collection")
+    __deinit_data_collection = DllFunction("deinit_data_collection")
+    __deinit_data_collections = DllFunction("deinit_data_collections")
+    __deinit = DllFunction("deinit", restype=c_uint8)
+    __get_card_focus = DllFunction("get_card_focus", restype=c_uint8)
+    __get_channel_enable = DllFunction("get_channel_enable", [c_uint8], c_int8)
+    __get_channel_enables = DllFunction("get_channel_enables", restype=c_uint8)
+    __get_external_trigger_enable = DllFunction("get_external_trigger_enable", restype=c_uint8)
+    __get_firmware_version = DllFunction("get_firmware_version", restype=c_uint16)
+    __get_hardware_countdown_enable = DllFunction("get_hardware_countdown_enable", restype=c_uint8)
+    __get_hardware_countdown_time = DllFunction("get_hardware_countdown_time", restype=c_double)
+    __get_rate = DllFunction("get_rate", [c_uint8], c_int32)
+    __get_rates = DllFunction("get_rates", [POINTER(c_int32)])
+    __init = DllFunction("init", [POINTER(ModuleInit), c_uint8, c_char_p], c_int16)
+    __initialize_data_collection = DllFunction("initialize_data_collection",
+                                               [POINTER(c_uint64)], c_int16)
+    __initialize_data_collections = DllFunction("initialize_data_collections",
+                                                [POINTER(c_uint64)], c_int16)
+    __reset_registers = DllFunction("reset_registers")
+    __run_data_collection = DllFunction("run_data_collection", [c_uint32, c_uint32], c_int16)
+    __set_card_focus = DllFunction("set_card_focus", [c_uint8], c_uint8)
+    __set_channel_enable = DllFunction("set_channel_enable", [c_uint8, c_bool], c_int16)
+    __set_channel_enables = DllFunction("set_channel_enables", [c_uint8], c_int16)
+    __set_external_trigger_enable = DllFunction("set_external_trigger_enable", [c_bool], c_int16)
+    __set_hardware_countdown_enable = DllFunction("set_hardware_countdown_enable",
+                                                  [c_bool], c_int16)
+    __set_hardware_countdown_time = DllFunction("set_hardware_countdown_time",
+                                                [c_double], c_double)
+    __stop_measurement = DllFunction("stop_measurement", restype=c_int16)
+
+    # only available in the debug version of the dll
+    __read_setting = DllFunction("read_setting", [c_uint16], c_uint32, debug_only=True)
+    __write_setting = DllFunction("write_setting", [c_uint16, c_uint32], c_uint32, debug_only=True)
+
     def __init__(self, default_dll_name: TdcLiterals.DEFAULT_NAMES, no_of_channels: int,
                  no_of_inputmodes: int | None = None, no_of_rates: int | None = None,
                  dll_path: Path | str | None = None):
         self.no_of_channels = no_of_channels
+        self._dll_stats: dict[str, CallStats] = {}
+        self._instrumented = False
 
         if no_of_inputmodes is None:
             self.no_of_inputmodes = no_of_channels
@@ -70,15 +110,11 @@ class __TdcDllWrapper:
             dll_path = Path(dll_path)
 
         try:
-            self.__dll = CDLL(str(dll_path.absolute()))
+            self._dll = load_library(dll_path)
         except FileNotFoundError as e:
             log.error(e)
             raise
 
-        self.__get_dll_version = self.__dll.get_dll_version
-        self.__get_dll_version.argtypes = [c_char_p, c_uint8]
-        self.__get_dll_version.restype = c_int16
-
         self.__get_dll_version(self.version_str_buf, c_uint8(128))
         self.version_str = str(self.version_str_buf.value)[2:-1]
 
@@ -90,103 +126,8 @@ class __TdcDllWrapper:
                                f"{self.version['major']}.{self.version['minor']}."
                                f"{self.version['patch']} Expected >= 4.0.0, < 5")
 
-        self.__get_dll_debug = self.__dll.get_dll_debug
-        self.__get_dll_debug.restype = c_uint8
         self.dll_is_debug_version = (self.__get_dll_debug() > 0)
 
-        self.__abort_data_collection = self.__dll.abort_data_collection
-
-        self.__deinit_data_collection = self.__dll.deinit_data_collection
-
-        self.__deinit_data_collections = self.__dll.deinit_data_collections
-
-        self.__deinit = self.__dll.deinit
-        self.__deinit.restype = c_uint8
-
-        self.__get_card_focus = self.__dll.get_card_focus
-        self.__get_card_focus.restype = c_uint8
-
-        self.__get_channel_enable = self.__dll.get_channel_enable
-        self.__get_channel_enable.argtypes = [c_uint8]
-        self.__get_channel_enable.restype = c_int8
-
-        self.__get_channel_enables = self.__dll.get_channel_enables
-        self.__get_channel_enables.restype = c_uint8
-
-        self.__get_external_trigger_enable = self.__dll.get_external_trigger_enable
-        self.__get_external_trigger_enable.restype = c_uint8
-
-        self.__get_firmware_version = self.__dll.get_firmware_version
-        self.__get_firmware_version.restype = c_uint16
-
-        self.__get_hardware_countdown_enable = self.__dll.get_hardware_countdown_enable
-        self.__get_hardware_countdown_enable.restype = c_uint8
-
-        self.__get_hardware_countdown_time = self.__dll.get_hardware_countdown_time
-        self.__get_hardware_countdown_time.restype = c_double
-
-        self.__get_rate = self.__dll.get_rate
-        self.__get_rate.argtypes = [c_uint8]
-        self.__get_rate.restype = c_int32
-
-        self.__get_rates = self.__dll.get_rates
-        self.__get_rates.argtypes = [POINTER(c_int32)]
-
-        self.__init = self.__dll.init
-        self.__init.argtypes = [POINTER(ModuleInit), c_uint8, c_char_p]
-        self.__init.restype = c_int16
-
-        self.__initialize_data_collection = self.__dll.initialize_data_collection
-        self.__initialize_data_collection.argtypes = [POINTER(c_uint64)]
-        self.__initialize_data_collection.restype = c_int16
-
-        self.__initialize_data_collections = self.__dll.initialize_data_collections
-        self.__initialize_data_collections.argtypes = [POINTER(c_uint64)]
-        self.__initialize_data_collections.restype = c_int16
-
-        if self.dll_is_debug_version:
-            self.__read_setting = self.__dll.read_setting
-            self.__read_setting.argtypes = [c_uint16]
-            self.__read_setting.restype = c_uint32
-
-        self.__reset_registers = self.__dll.reset_registers
-
-        self.__run_data_collection = self.__dll.run_data_collection
-        self.__run_data_collection.argtypes = [c_uint32, c_uint32]
-        self.__run_data_collection.restype = c_int16
-
-        self.__set_card_focus = self.__dll.set_card_focus
-        self.__set_card_focus.argtypes = [c_uint8]
-        self.__set_card_focus.restype = c_uint8
-
-        self.__set_channel_enable = self.__dll.set_channel_enable
-        self.__set_channel_enable.argtypes = [c_uint8, c_bool]
-        self.__set_channel_enable.restype = c_int16
-
-        self.__set_channel_enables = self.__dll.set_channel_enables
-        self.__set_channel_enables.argtypes = [c_uint8]
-        self.__set_channel_enables.restype = c_int16
-
-        self.__set_external_trigger_enable = self.__dll.set_external_trigger_enable
-        self.__set_external_trigger_enable.argtypes = [c_bool]
-        self.__set_external_trigger_enable.restype = c_int16
-
-        self.__set_hardware_countdown_enable = self.__dll.set_hardware_countdown_enable
-        self.__set_hardware_countdown_enable.argtypes = [c_bool]
-        self.__set_hardware_countdown_enable.restype = c_int16
-
-        self.__set_hardware_countdown_time = self.__dll.set_hardware_countdown_time
-        self.__set_hardware_countdown_time.argtypes = [c_double]
-        self.__set_hardware_countdown_time.restype = c_double
-
-        self.__stop_measurement = self.__dll.stop_measurement
-        self.__stop_measurement.restype = c_int16
-
-        if self.dll_is_debug_version:
-            self.__write_setting = self.__dll.write_setting
-            self.__write_setting.argtypes = [c_uint16, c_uint32]
-            self.__write_setting.restype = c_uint32
-
     @property
     def card_focus(self) -> int:
         return self.__get_card_focus()
@@ -252,6 +193,35 @@ class __TdcDllWrapper:
         self.__get_rates(cast(c_rates, POINTER(c_int32)))
         return c_rates[:]
 
+    @property
+    def instrumented(self) -> bool:
+        return self._instrumented
+
+    def enable_instrumentation(self):
+        '''Starts recording call count, cumulative time and a latency
+        histogram for every dll function called through this instance.'''
+        if not self._instrumented:
+            instrument_dll_functions(self, dll_functions(type(self)).values(), self._dll_stats)
+            self._instrumented = True
+
+    def disable_instrumentation(self):
+        '''Stops recording dll call statistics. Already recorded statistics
+        are kept until reset_stats() is called.'''
+        if self._instrumented:
+            uninstrument_dll_functions(self, dll_functions(type(self)).values())
+            self._instrumented = False
+
+    def reset_stats(self):
+        for stats in self._dll_stats.values():
+            stats.reset()
+
+    def stats(self) -> dict[str, dict]:
+        '''Returns the recorded statistics by dll function name. Each entry
+        holds calls, total_s, mean_s, max_s and histogram, the latter a list
+        of [upper bound in s, count] pairs of all non-empty buckets.'''
+        return {name: stats.as_dict() for name, stats in sorted(self._dll_stats.items())
+                if stats.calls}
+
     def abort_data_collection(self):
         self.__abort_data_collection()
 
@@ -328,88 +298,32 @@ class __TdcDllWrapper:
 
 
 class __8ChannelDllWrapper(__TdcDllWrapper):  # noqa
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.__dll: CDLL = self._TdcDllWrapper__dll
-
-        self.__get_channel_inputmode = self.__dll.get_channel_inputmode
-        self.__get_channel_inputmode.argtypes = [c_uint8]
-        self.__get_channel_inputmode.restype = c_int8
-
-        self.__get_channel_inputmodes = self.__dll.get_channel_inputmodes
-        self.__get_channel_inputmodes.argtypes = [POINTER(c_uint8)]
-
-        self.__get_channel_polarities = self.__dll.get_channel_polarities
-        self.__get_channel_polarities.restype = c_uint8
-
-        self.__get_channel_polarity = self.__dll.get_channel_polarity
-        self.__get_channel_polarity.argtypes = [c_uint8]
-        self.__get_channel_polarity.restype = c_int8
-
-        self.__get_input_threshold = self.__dll.get_input_threshold
-        self.__get_input_threshold.argtypes = [c_uint8]
-        self.__get_input_threshold.restype = c_float
-
-        self.__get_input_thresholds = self.__dll.get_input_thresholds
-        self.__get_input_thresholds.argtypes = [POINTER(c_float)]
-        self.__get_input_thresholds.restype = c_int16
-
-        self.__get_max_trigger_count = self.__dll.get_max_trigger_count
-        self.__get_max_trigger_count.restype = c_uint32
-
-        self.__get_pulsgenerator_enable = self.__dll.get_pulsgenerator_enable
-        self.__get_pulsgenerator_enable.restype = c_uint8
-
-        self.__get_trigger_countdown_enable = self.__dll.get_trigger_countdown_enable
-        self.__get_trigger_countdown_enable.restype = c_uint8
-
-        self.__set_channel_inputmode = self.__dll.set_channel_inputmode
-        self.__set_channel_inputmode.argtypes = [c_uint8, c_uint8]
-        self.__set_channel_inputmode.restype = c_int16
-
-        self.__set_channel_inputmodes = self.__dll.set_channel_inputmodes
-        self.__set_channel_inputmodes.argtypes = [POINTER(c_uint8)]
-        self.__set_channel_inputmodes.restype = c_int16
-
-        self.__set_channel_polarities = self.__dll.set_channel_polarities
-        self.__set_channel_polarities.argtypes = [c_uint8]
-        self.__set_channel_polarities.restype = c_int16
-
-        self.__set_channel_polarity = self.__dll.set_channel_polarity
-        self.__set_channel_polarity.argtypes = [c_uint8, c_bool]
-        self.__set_channel_polarity.restype = c_int16
-
-        self.__set_input_threshold = self.__dll.set_input_threshold
-        self.__set_input_threshold.argtypes = [c_uint8, c_float]
-        self.__set_input_threshold.restype = c_float
-
-        self.__set_input_thresholds = self.__dll.set_input_thresholds
-        self.__set_input_thresholds.argtypes = [POINTER(c_float)]
-
-        self.__set_max_trigger_count = self.__dll.set_max_trigger_count
-        self.__set_max_trigger_count.argtypes = [c_uint32]
-        self.__set_max_trigger_count.restype = c_int64
-
-        self.__set_pulsgenerator_enable = self.__dll.set_pulsgenerator_enable
-        self.__set_pulsgenerator_enable.argtypes = [c_bool]
-        self.__set_pulsgenerator_enable.restype = c_int16
-
-        self.__set_trigger_countdown_enable = self.__dll.set_trigger_countdown_enable
-        self.__set_trigger_countdown_enable.argtypes = [c_bool]
-        self.__set_trigger_countdown_enable.restype = c_int16
-
-        if self.dll_is_debug_version:
-            self.__write_module_type = self.__dll.write_module_type
-            self.__write_module_type.argtypes = [c_uint8, c_char_p]
-            self.__write_module_type.restype = c_int16
-
-            self.__write_production_date = self.__dll.write_production_date
-            self.__write_production_date.argtypes = [c_uint8, c_char_p]
-            self.__write_production_date.restype = c_int16
-
-            self.__write_serial_number = self.__dll.write_serial_number
-            self.__write_serial_number.argtypes = [c_uint8, c_char_p]
-            self.__write_serial_number.restype = c_int16
+    __get_channel_inputmode = DllFunction("get_channel_inputmode", [c_uint8], c_int8)
+    __get_channel_inputmodes = DllFunction("get_channel_inputmodes", [POINTER(c_uint8)])
+    __get_channel_polarities = DllFunction("get_channel_polarities", restype=c_uint8)
+    __get_channel_polarity = DllFunction("get_channel_polarity", [c_uint8], c_int8)
+    __get_input_threshold = DllFunction("get_input_threshold", [c_uint8], c_float)
+    __get_input_thresholds = DllFunction("get_input_thresholds", [POINTER(c_float)], c_int16)
+    __get_max_trigger_count = DllFunction("get_max_trigger_count", restype=c_uint32)
+    __get_pulsgenerator_enable = DllFunction("get_pulsgenerator_enable", restype=c_uint8)
+    __get_trigger_countdown_enable = DllFunction("get_trigger_countdown_enable", restype=c_uint8)
+    __set_channel_inputmode = DllFunction("set_channel_inputmode", [c_uint8, c_uint8], c_int16)
+    __set_channel_inputmodes = DllFunction("set_channel_inputmodes", [POINTER(c_uint8)], c_int16)
+    __set_channel_polarities = DllFunction("set_channel_polarities", [c_uint8], c_int16)
+    __set_channel_polarity = DllFunction("set_channel_polarity", [c_uint8, c_bool], c_int16)
+    __set_input_threshold = DllFunction("set_input_threshold", [c_uint8, c_float], c_float)
+    __set_input_thresholds = DllFunction("set_input_thresholds", [POINTER(c_float)])
+    __set_max_trigger_count = DllFunction("set_max_trigger_count", [c_uint32], c_int64)
+    __set_pulsgenerator_enable = DllFunction("set_pulsgenerator_enable", [c_bool], c_int16)
+    __set_trigger_countdown_enable = DllFunction("set_trigger_countdown_enable", [c_bool], c_int16)
+
+    # only available in the debug version of the dll
+    __write_module_type = DllFunction("write_module_type",
+                                      [c_uint8, c_char_p], c_int16, debug_only=True)
+    __write_production_date = DllFunction("write_production_date",
+                                          [c_uint8, c_char_p], c_int16, debug_only=True)
+    __write_serial_number = DllFunction("write_serial_number",
+                                        [c_uint8, c_char_p], c_int16, debug_only=True)
 
     @property
     def channel_polarities(self):
@@ -511,19 +425,15 @@ class __8ChannelDllWrapper(__TdcDllWrapper):  # noqa
 
 
 class __EventStream32Bit(__TdcDllWrapper):
+    __get_raw_events_from_buffer = DllFunction("get_raw_events_from_buffer",
+                                               [POINTER(c_uint32), c_uint32, c_uint8], c_int64)
+    __get_raw_events_from_buffer_to_file = DllFunction("get_raw_events_from_buffer_to_file",
+                                                       [c_uint32, c_uint32, c_uint8, c_uint32,
+                                                        c_uint32, c_char_p], c_int64)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.file_name = kwargs["default_dll_name"]
-        self.__dll: CDLL = self._TdcDllWrapper__dll
-
-        self.__get_raw_events_from_buffer = self.__dll.get_raw_events_from_buffer
-        self.__get_raw_events_from_buffer.argtypes = [POINTER(c_uint32), c_uint32, c_uint8]
-        self.__get_raw_events_from_buffer.restype = c_int64
-
-        self.__get_raw_events_from_buffer_to_file = self.__dll.get_raw_events_from_buffer_to_file
-        self.__get_raw_events_from_buffer_to_file.argtypes = [c_uint32, c_uint32, c_uint8,
-                                                              c_uint32, c_uint32, c_char_p]
-        self.__get_raw_events_from_buffer_to_file.restype = c_int64
 
     def get_events_from_buffer_to_file(self, card_number: int, dir_path: str, idx: int,
                                        min_events: int, max_events: int | None = None,
@@ -540,143 +450,48 @@ class __EventStream32Bit(__TdcDllWrapper):
 
 
 class SpcQcX04(__EventStream32Bit):
+    __get_events_from_buffer = DllFunction("get_events_from_buffer",
+                                           [POINTER(c_uint32), c_uint32, c_uint8], c_int64)
+    __get_cFD_threshold = DllFunction("get_CFD_threshold", [c_uint8], c_float)
+    __get_cFD_thresholds = DllFunction("get_CFD_thresholds", [POINTER(c_float)], c_int16)
+    __get_cFD_zc = DllFunction("get_CFD_zc", [c_uint8], c_float)
+    __get_cFD_zcs = DllFunction("get_CFD_zcs", [POINTER(c_float)], c_int16)
+    __get_channel_delay = DllFunction("get_channel_delay", [c_uint8], c_float)
+    __get_channel_delays = DllFunction("get_channel_delays", [POINTER(c_float)])
+    __get_channel_divider = DllFunction("get_channel_divider", [c_uint8], c_int8)
+    __get_dithering_enable = DllFunction("get_dithering_enable", restype=c_uint8)
+    __get_marker_enable = DllFunction("get_marker_enable", [c_uint8], c_int16)
+    __get_marker_enables = DllFunction("get_marker_enables", restype=c_uint8)
+    __get_marker_polarities = DllFunction("get_marker_polarities", restype=c_uint8)
+    __get_marker_polarity = DllFunction("get_marker_polarity", [c_uint8], c_int8)
+    __get_marker_status = DllFunction("get_marker_status", restype=c_uint8)
+    __get_module_status = DllFunction("get_module_status", restype=c_uint8)
+    __get_routing_compensation = DllFunction("get_routing_compensation", restype=c_int16)
+    __get_routing_enable = DllFunction("get_routing_enable", [c_uint8], c_int8)
+    __get_routing_enables = DllFunction("get_routing_enables", restype=c_uint8)
+    __get_trigger_polarity = DllFunction("get_trigger_polarity", restype=c_uint8)
+    __set_cFD_threshold = DllFunction("set_CFD_threshold", [c_uint8, c_float], c_float)
+    __set_cFD_thresholds = DllFunction("set_CFD_thresholds", [POINTER(c_float)])
+    __set_cFD_zc = DllFunction("set_CFD_zc", [c_uint8, c_float], c_float)
+    __set_cFD_zcs = DllFunction("set_CFD_zcs", [POINTER(c_float)])
+    __set_channel_delay = DllFunction("set_channel_delay", [c_uint8, c_float], c_float)
+    __set_channel_delays = DllFunction("set_channel_delays", [POINTER(c_float)], c_uint16)
+    __set_channel_divider = DllFunction("set_channel_divider", [c_uint8, c_uint8], c_int16)
+    __set_dithering_enable = DllFunction("set_dithering_enable", [c_bool], c_int16)
+    __set_marker_enable = DllFunction("set_marker_enable", [c_uint8, c_bool], c_int16)
+    __set_marker_enables = DllFunction("set_marker_enables", [c_uint8], c_int16)
+    __set_marker_polarities = DllFunction("set_marker_polarities", [c_uint8], c_int16)
+    __set_marker_polarity = DllFunction("set_marker_polarity", [c_uint8, c_bool], c_int16)
+    __set_measurement_configuration = DllFunction("set_measurement_configuration",
+                                                  [c_uint8, POINTER(c_uint32), POINTER(c_uint32),
+                                                   POINTER(c_uint8)], c_int16)
+    __set_routing_compensation = DllFunction("set_routing_compensation", [c_int8], c_int16)
+    __set_routing_enable = DllFunction("set_routing_enable", [c_uint8, c_bool], c_int16)
+    __set_routing_enables = DllFunction("set_routing_enables", [c_uint8], c_int16)
+    __set_trigger_polarity = DllFunction("set_trigger_polarity", [c_bool], c_int16)
+
     def __init__(self, dll_path: Path | str | None = None):
         super().__init__(default_dll_name="spc_qc_x04", no_of_channels=4, dll_path=dll_path)
-        self.__dll: CDLL = self._EventStream32Bit__dll
-
-        self.__get_events_from_buffer = self.__dll.get_events_from_buffer
-        self.__get_events_from_buffer.argtypes = [POINTER(c_uint32), c_uint32, c_uint8]
-        self.__get_events_from_buffer.restype = c_int64
-
-        self.__get_cFD_threshold = self.__dll.get_CFD_threshold
-        self.__get_cFD_threshold.argtypes = [c_uint8]
-        self.__get_cFD_threshold.restype = c_float
-
-        self.__get_cFD_thresholds = self.__dll.get_CFD_thresholds
-        self.__get_cFD_thresholds.argtypes = [POINTER(c_float)]
-        self.__get_cFD_thresholds.restype = c_int16
-
-        self.__get_cFD_zc = self.__dll.get_CFD_zc
-        self.__get_cFD_zc.argtypes = [c_uint8]
-        self.__get_cFD_zc.restype = c_float
-
-        self.__get_cFD_zcs = self.__dll.get_CFD_zcs
-        self.__get_cFD_zcs.argtypes = [POINTER(c_float)]
-        self.__get_cFD_zcs.restype = c_int16
-
-        self.__get_channel_delay = self.__dll.get_channel_delay
-        self.__get_channel_delay.argtypes = [c_uint8]
-        self.__get_channel_delay.restype = c_float
-
-        self.__get_channel_delays = self.__dll.get_channel_delays
-        self.__get_channel_delays.argtypes = [POINTER(c_float)]
-
-        self.__get_channel_divider = self.__dll.get_channel_divider
-        self.__get_channel_divider.argtypes = [c_uint8]
-        self.__get_channel_divider.restype = c_int8
-
-        self.__get_dithering_enable = self.__dll.get_dithering_enable
-        self.__get_dithering_enable.restype = c_uint8
-
-        self.__get_marker_enable = self.__dll.get_marker_enable
-        self.__get_marker_enable.argtypes = [c_uint8]
-        self.__get_marker_enable.restype = c_int16
-
-        self.__get_marker_enables = self.__dll.get_marker_enables
-        self.__get_marker_enables.restype = c_uint8
-
-        self.__get_marker_polarities = self.__dll.get_marker_polarities
-        self.__get_marker_polarities.restype = c_uint8
-
-        self.__get_marker_polarity = self.__dll.get_marker_polarity
-        self.__get_marker_polarity.argtypes = [c_uint8]
-        self.__get_marker_polarity.restype = c_int8
-
-        self.__get_marker_status = self.__dll.get_marker_status
-        self.__get_marker_status.restype = c_uint8
-
-        self.__get_module_status = self.__dll.get_module_status
-        self.__get_module_status.restype = c_uint8
-
-        self.__get_routing_compensation = self.__dll.get_routing_compensation
-        self.__get_routing_compensation.restype = c_int16
-
-        self.__get_routing_enable = self.__dll.get_routing_enable
-        self.__get_routing_enable.argtypes = [c_uint8]
-        self.__get_routing_enable.restype = c_int8
-
-        self.__get_routing_enables = self.__dll.get_routing_enables
-        self.__get_routing_enables.restype = c_uint8
-
-        self.__get_trigger_polarity = self.__dll.get_trigger_polarity
-        self.__get_trigger_polarity.restype = c_uint8
-
-        self.__set_cFD_threshold = self.__dll.set_CFD_threshold
-        self.__set_cFD_threshold.argtypes = [c_uint8, c_float]
-        self.__set_cFD_threshold.restype = c_float
-
-        self.__set_cFD_thresholds = self.__dll.set_CFD_thresholds
-        self.__set_cFD_thresholds.argtypes = [POINTER(c_float)]
-
-        self.__set_cFD_zc = self.__dll.set_CFD_zc
-        self.__set_cFD_zc.argtypes = [c_uint8, c_float]
-        self.__set_cFD_zc.restype = c_float
-
-        self.__set_cFD_zcs = self.__dll.set_CFD_zcs
-        self.__set_cFD_zcs.argtypes = [POINTER(c_float)]
-
-        self.__set_channel_delay = self.__dll.set_channel_delay
-        self.__set_channel_delay.argtypes = [c_uint8, c_float]
-        self.__set_channel_delay.restype = c_float
-
-        self.__set_channel_delays = self.__dll.set_channel_delays
-        self.__set_channel_delays.argtypes = [POINTER(c_float)]
-        self.__set_channel_delays.restype = c_uint16
-
-        self.__set_channel_divider = self.__dll.set_channel_divider
-        self.__set_channel_divider.argtypes = [c_uint8, c_uint8]
-        self.__set_channel_divider.restype = c_int16
-
-        self.__set_dithering_enable = self.__dll.set_dithering_enable
-        self.__set_dithering_enable.argtypes = [c_bool]
-        self.__set_dithering_enable.restype = c_int16
-
-        self.__set_marker_enable = self.__dll.set_marker_enable
-        self.__set_marker_enable.argtypes = [c_uint8, c_bool]
-        self.__set_marker_enable.restype = c_int16
-
-        self.__set_marker_enables = self.__dll.set_marker_enables
-        self.__set_marker_enables.argtypes = [c_uint8]
-        self.__set_marker_enables.restype = c_int16
-
-        self.__set_marker_polarities = self.__dll.set_marker_polarities
-        self.__set_marker_polarities.argtypes = [c_uint8]
-        self.__set_marker_polarities.restype = c_int16
-
-        self.__set_marker_polarity = self.__dll.set_marker_polarity
-        self.__set_marker_polarity.argtypes = [c_uint8, c_bool]
-        self.__set_marker_polarity.restype = c_int16
-
-        self.__set_measurement_configuration = self.__dll.set_measurement_configuration
-        self.__set_measurement_configuration.argtypes = [c_uint8, POINTER(c_uint32),
-                                                         POINTER(c_uint32), POINTER(c_uint8)]
-        self.__set_measurement_configuration.restype = c_int16
-
-        self.__set_routing_compensation = self.__dll.set_routing_compensation
-        self.__set_routing_compensation.argtypes = [c_int8]
-        self.__set_routing_compensation.restype = c_int16
-
-        self.__set_routing_enable = self.__dll.set_routing_enable
-        self.__set_routing_enable.argtypes = [c_uint8, c_bool]
-        self.__set_routing_enable.restype = c_int16
-
-        self.__set_routing_enables = self.__dll.set_routing_enables
-        self.__set_routing_enables.argtypes = [c_uint8]
-        self.__set_routing_enables.restype = c_int16
-
-        self.__set_trigger_polarity = self.__dll.set_trigger_polarity
-        self.__set_trigger_polarity.argtypes = [c_bool]
-        self.__set_trigger_polarity.restype = c_int16
 
     @property
     def cfd_thresholds(self) -> list[float]:
@@ -930,32 +745,21 @@ class SpcQcX08(__8ChannelDllWrapper):
     input_modes = {"Input": 0, "Calibration Input": 2}
     modes_input = {0: "Input", 2: "Calibration Input"}
 
-    def __init__(self, dll_path: Path | str | None = None):
-        super().__init__(default_dll_name="spc_qc_x08", no_of_channels=8, dll_path=dll_path)
-        self.__dll: CDLL = self._8ChannelDllWrapper__dll
-
-        self.__auto_calibration = self.__dll.auto_calibration
-
-        if self.dll_is_debug_version:
-            self.__get_cal_reg = self.__dll.get_cal_reg
-            self.__get_cal_reg.restype = c_uint32
+    __auto_calibration = DllFunction("auto_calibration")
+    __get_raw_event_triplets_from_buffer_to_file = DllFunction(
+        "get_raw_event_triplets_from_buffer_to_file",
+        [c_uint32, c_uint32, c_uint8, c_uint32, c_uint32, c_char_p], c_int64)
+    __get_raw_event_triplets_from_buffer = DllFunction("get_raw_event_triplets_from_buffer",
+                                                       [POINTER(c_uint64), c_uint32, c_uint8],
+                                                       c_int64)
+    __get_sync_channel = DllFunction("get_sync_channel", restype=c_int8)
+    __set_sync_channel = DllFunction("set_sync_channel", [c_int8], c_int16)
 
-        self.__get_raw_event_triplets_from_buffer_to_file = (
-            self.__dll.get_raw_event_triplets_from_buffer_to_file)
-        self.__get_raw_event_triplets_from_buffer_to_file.argtypes = [c_uint32, c_uint32, c_uint8,
-                                                                      c_uint32, c_uint32, c_char_p]
-        self.__get_raw_event_triplets_from_buffer_to_file.restype = c_int64
+    # only available in the debug version of the dll
+    __get_cal_reg = DllFunction("get_cal_reg", restype=c_uint32, debug_only=True)
 
-        self.__get_raw_event_triplets_from_buffer = self.__dll.get_raw_event_triplets_from_buffer
-        self.__get_raw_event_triplets_from_buffer.argtypes = [POINTER(c_uint64), c_uint32, c_uint8]
-        self.__get_raw_event_triplets_from_buffer.restype = c_int64
-
-        self.__get_sync_channel = self.__dll.get_sync_channel
-        self.__get_sync_channel.restype = c_int8
-
-        self.__set_sync_channel = self.__dll.set_sync_channel
-        self.__set_sync_channel.argtypes = [c_int8]
-        self.__set_sync_channel.restype = c_int16
+    def __init__(self, dll_path: Path | str | None = None):
+        super().__init__(default_dll_name="spc_qc_x08", no_of_channels=8, dll_path=dll_path)
 
     @property
     def _cal_reg(self):
@@ -1035,31 +839,19 @@ class Pms800(__8ChannelDllWrapper, __EventStream32Bit):
     input_modes = {"Input": 0, "Gated Input": 1, "Calibration Input": 2}
     modes_input = {0: "Input", 1: "Gated Input", 2: "Calibration Input"}
 
+    __get_event_count_threshold = DllFunction("get_event_count_threshold", [c_uint8], c_int16)
+    __get_event_count_thresholds = DllFunction("get_event_count_thresholds", [POINTER(c_uint8)])
+    __set_event_count_threshold = DllFunction("set_event_count_threshold",
+                                              [c_uint8, c_uint8], c_int16)
+    __set_event_count_thresholds = DllFunction("set_event_count_thresholds",
+                                               [POINTER(c_uint8)], c_int16)
+    __set_measurement_configuration = DllFunction("set_measurement_configuration",
+                                                  [c_uint8, POINTER(c_uint32), POINTER(c_uint32),
+                                                   POINTER(c_uint8), POINTER(c_uint32)], c_int16)
+
     def __init__(self, dll_path: Path | str | None = None):
         super().__init__(default_dll_name="pms_800", no_of_channels=8, no_of_inputmodes=4,
                          no_of_rates=5, dll_path=dll_path)
-        self.__dll: CDLL = self._8ChannelDllWrapper__dll
-
-        self.__get_event_count_threshold = self.__dll.get_event_count_threshold
-        self.__get_event_count_threshold.argtypes = [c_uint8]
-        self.__get_event_count_threshold.restype = c_int16
-
-        self.__get_event_count_thresholds = self.__dll.get_event_count_thresholds
-        self.__get_event_count_thresholds.argtypes = [POINTER(c_uint8)]
-
-        self.__set_event_count_threshold = self.__dll.set_event_count_threshold
-        self.__set_event_count_threshold.argtypes = [c_uint8, c_uint8]
-        self.__set_event_count_threshold.restype = c_int16
-
-        self.__set_event_count_thresholds = self.__dll.set_event_count_thresholds
-        self.__set_event_count_thresholds.argtypes = [POINTER(c_uint8)]
-        self.__set_event_count_thresholds.restype = c_int16
-
-        self.__set_measurement_configuration = self.__dll.set_measurement_configuration
-        self.__set_measurement_configuration.argtypes = [c_uint8, POINTER(c_uint32),
-                                                         POINTER(c_uint32), POINTER(c_uint8),
-                                                         POINTER(c_uint32)]
-        self.__set_measurement_configuration.restype = c_int16
 
     @property
     def event_count_thresholds(self):
@@ -0,0 +1,82 @@
+import pytest
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+from Crypto.PublicKey import RSA
+from bhpy import bh_connect
+
+
+@pytest.fixture(scope="session")
+def build_stub_library(tmp_path_factory):
+    '''Returns a function compiling C source into a shared library that
+    stands in for one of the Windows dlls.'''
+    compiler = shutil.which("cc") or shutil.which("gcc")
+    if compiler is None or sys.platform == "win32":
+        pytest.skip("no C compiler to build a stand-in library")
+
+    def build(name: str, source: str):
+        directory = tmp_path_factory.mktemp(name)
+        (directory / f"{name}.c").write_text(source)
+        library = directory / f"{name}.so"
+        subprocess.check_call([compiler, "-shared", "-fPIC", "-o", str(library),
+                               str(directory / f"{name}.c")])
+        return library
+    return build
+
+
+@pytest.fixture(scope="session")
+def rsa_keys():
+    '''A client and a server key pair, small to keep the tests fast.'''
+    return RSA.generate(1024), RSA.generate(1024)
+
+
+def serve_commands(sock, crypto, answers):
+    '''Answers commands of a socket pair with answers(command), sending all
+    answers to the commands received so far in one segment.'''
+    buffer = bytearray()
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return
+        buffer += data
+        reply = b""
+        while (message := crypto.decrypt_from(buffer)) is not None:
+            command, size = message
+            del buffer[:size]
+            reply += crypto.encrypt(answers(command.decode().strip("$")))
+        sock.sendall(reply)
+
+
+@pytest.fixture
+def fake_spcm(rsa_keys):
+    '''Returns a function creating a BHConnect (keyword arguments are passed
+    on) connected to a fake SPCM through a socket pair. With answers the
+    commands are answered by answers(command) on a thread, otherwise the
+    test drives the SPCM end itself. Returns the connection, the SPCM
+    socket and its SessionCrypto, all are closed at teardown.'''
+    client_key, server_key = rsa_keys
+    created = []
+
+    def connect(answers=None, reuse_session_key=False, **kwargs):
+        client_sock, server_sock = socket.socketpair()
+        server_crypto = bh_connect.SessionCrypto(server_key, client_key.public_key())
+        connection = bh_connect.BHConnect(reuse_session_key=reuse_session_key, **kwargs)
+        connection.sock = client_sock
+        connection.crypto = bh_connect.SessionCrypto(client_key, server_key.public_key(),
+                                                     reuse_session_key=reuse_session_key)
+        server = None
+        if answers is not None:
+            server = threading.Thread(target=serve_commands,
+                                      args=(server_sock, server_crypto, answers))
+            server.start()
+        created.append((connection, server, server_sock))
+        return connection, server_sock, server_crypto
+
+    yield connect
+    for connection, server, server_sock in created:
+        connection.disconnect_spcm_instance()
+        if server is not None:
+            server.join()
+        server_sock.close()
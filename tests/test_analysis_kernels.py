@@ -0,0 +1,60 @@
+import numpy as np
+from bhpy.spc_tdc_export import EVENT_DTYPE
+from benchmarks import analysis_kernels
+from benchmarks.synthetic_events import EventDecoder, encode_events
+
+
+def make_events(no_of_events=10_000, seed=1):
+    rng = np.random.default_rng(seed)
+    events = np.zeros(no_of_events, dtype=EVENT_DTYPE)
+    events["macro_time"] = np.cumsum(rng.integers(1, 5_000, no_of_events, dtype=np.uint64))
+    events["micro_time"] = rng.integers(0, 4096, no_of_events)
+    events["channel"] = rng.integers(0, 4, no_of_events)
+    return events
+
+
+class Test_AnalysisKernels:  # noqa
+    def test_decode_round_trip_in_chunks(self):
+        events = make_events()
+        events["marker"][::100] = 0x3
+        events["channel"][::100] = 0
+        words = encode_events(events)
+        assert words.size > events.size  # overflow words were inserted
+
+        decoder = EventDecoder()
+        decoded = np.concatenate([decoder.decode(words[i:i + 777])
+                                  for i in range(0, words.size, 777)])
+        assert np.array_equal(decoded, events)
+
+    def test_histogram(self):
+        events = make_events()
+        hist = analysis_kernels.histogram(events, 4096, 4)
+        assert hist.shape == (4, 4096)
+        assert hist.sum() == events.size
+        assert hist[2].sum() == np.count_nonzero(events["channel"] == 2)
+
+    def test_flim_chunked(self):
+        lines, pixels = 4, 5
+        rows = []
+        for _frame in range(2):
+            for line in range(lines):
+                for pixel in range(pixels):
+                    marker = 0x1 | (0x2 if pixel == 0 else 0) | (0x4 if pixel == line == 0 else 0)
+                    rows.append((0, 0, 0, marker))
+                    rows += [(0, line, 0, 0)] * (pixel + 1)
+        events = np.array(rows, dtype=EVENT_DTYPE)
+
+        whole = analysis_kernels.FlimBuilder(lines, pixels, 8).add(events).copy()
+        chunked = analysis_kernels.FlimBuilder(lines, pixels, 8)
+        for i in range(0, events.size, 7):
+            chunked.add(events[i:i + 7])
+        assert np.array_equal(whole, chunked.cube)
+        for line in range(lines):  # micro time of the photons was set to their line
+            assert np.array_equal(whole[line, :, line], 2 * np.arange(1, pixels + 1))
+        assert whole.sum() == 2 * lines * pixels * (pixels + 1) // 2
+
+    def test_cross_correlation_peak(self):
+        times_a = np.arange(0, 1_000_000, 1_000, dtype=np.uint64)
+        lags, g = analysis_kernels.cross_correlation(times_a, times_a + 300, 100, 10)
+        assert lags[3] == 300
+        assert np.argmax(g) == 3
@@ -0,0 +1,370 @@
+import numpy as np
+import os
+import pytest
+import socket
+import threading
+import time
+from queue import Queue
+import Crypto.Cipher.AES
+from bhpy import bh_connect, bh_tiff
+
+
+class Test_Connect:  # noqa
+    def test_recv_all_into_grows(self):
+        a, b = socket.socketpair()
+        payload = bytes(range(256)) * 100
+        buffer = bytearray(1000)
+        sender = threading.Thread(target=lambda: (b.sendall(payload), b.close()))
+        sender.start()
+        size = bh_connect._recv_all_into(a, buffer)
+        sender.join()
+        a.close()
+        assert size == len(payload)
+        assert buffer[:size] == payload
+
+    def test_in_memory_image_receive(self):
+        image = np.arange(120 * 80, dtype=np.uint16).reshape(120, 80)
+        requests, done = Queue(), Queue()
+        server = bh_connect.CustomTCPServer(("127.0.0.1", 0), bh_connect._ImageReceiveHandler,
+                                            requests, done, receive_buffer=bytearray(16),
+                                            all_windows=True)
+
+        def send(name, data=b""):
+            with socket.create_connection(server.server_address) as s:
+                s.sendall(bytes([len(name)]) + name + data)
+
+        try:
+            sender = threading.Thread(target=lambda: (send(b"img.tif", bh_tiff.encode_tiff(image)),
+                                                      send(b"EOT")))
+            sender.start()
+            while done.empty():
+                server.handle_request()
+            sender.join()
+        finally:
+            server.server_close()
+        assert np.array_equal(requests.get(), image)
+        assert requests.empty()
+
+    def test_image_receive_error_is_queued(self):
+        requests, done = Queue(), Queue()
+        server = bh_connect.CustomTCPServer(("127.0.0.1", 0), bh_connect._ImageReceiveHandler,
+                                            requests, done, receive_buffer=bytearray(16),
+                                            all_windows=True)
+
+        def send(name, data=b""):
+            with socket.create_connection(server.server_address) as s:
+                s.sendall(bytes([len(name)]) + name + data)
+
+        try:
+            sender = threading.Thread(target=lambda: (send(b"img.tif", b"no tiff" * 10),
+                                                      send(b"EOT")))
+            sender.start()
+            while done.empty():
+                server.handle_request()
+            sender.join()
+        finally:
+            server.server_close()
+        assert isinstance(requests.get(), ValueError)
+
+    def test_trace_receive(self):
+        trace = np.random.default_rng(5).integers(0, 1 << 32, 100_001, dtype=np.uint32)
+        requests = Queue()
+        server = bh_connect.CustomTCPServer(("127.0.0.1", 0), bh_connect._TraceReceiveHandler,
+                                            requests)
+
+        def send():
+            with socket.create_connection(server.server_address) as s:
+                data = len(trace).to_bytes(4, "little") + trace.astype("<u4").tobytes()
+                for i in range(0, len(data), 4093):  # values straddle the segments
+                    s.sendall(data[i:i + 4093])
+
+        try:
+            sender = threading.Thread(target=send)
+            sender.start()
+            server.handle_request()
+            sender.join()
+        finally:
+            server.server_close()
+        received = requests.get()
+        assert received.dtype == np.dtype("<u4")
+        assert np.array_equal(received, trace)
+
+
+class Test_KeyManager:  # noqa
+    def test_key_is_reused_across_sessions(self, tmp_path):
+        key = bh_connect.ClientKeyManager(tmp_path, key_size=1024).get_key()
+        assert (tmp_path / "cli_private.pem").exists()
+        assert (tmp_path / "send_cli_public.pem").exists()
+        reloaded = bh_connect.ClientKeyManager(tmp_path, key_size=1024).get_key()
+        assert reloaded.n == key.n
+        # A cached key of another size is not used
+        assert bh_connect.ClientKeyManager(tmp_path, key_size=2048).get_key().n != key.n
+
+    def test_rotation(self, tmp_path):
+        manager = bh_connect.ClientKeyManager(tmp_path, key_size=1024, max_age_s=3600)
+        key = manager.get_key()
+        assert manager.get_key() is key
+
+        old = time.time() - 3500  # inside the prefetch margin
+        os.utime(tmp_path / "cli_private.pem", (old, old))
+        manager = bh_connect.ClientKeyManager(tmp_path, key_size=1024, max_age_s=3600)
+        assert manager.get_key().n == key.n
+        old = time.time() - 3700  # expired, the prefetched key replaces it
+        os.utime(tmp_path / "cli_private.pem", (old, old))
+        manager._ClientKeyManager__created = old
+        rotated = manager.get_key()
+        assert rotated.n != key.n
+        assert bh_connect.ClientKeyManager(tmp_path, key_size=1024).get_key().n == rotated.n
+
+
+class Test_SessionCrypto:  # noqa
+    def test_round_trip_and_session_key_reuse(self, rsa_keys):
+        client_key, server_key = rsa_keys
+        client = bh_connect.SessionCrypto(client_key, server_key.public_key(),
+                                          reuse_session_key=True)
+        server = bh_connect.SessionCrypto(server_key, client_key.public_key())
+
+        first, second = client.encrypt(b"$Version:number$"), client.encrypt(b"$pressmenu:x$")
+        assert first[:128] == second[:128]  # same RSA encrypted session key
+        assert first[128:144] != second[128:144]  # fresh nonce
+        assert server.decrypt(first) == b"$Version:number$"
+        assert server.decrypt(second) == b"$pressmenu:x$"
+
+        answers = [server.encrypt(b"OK") for _ in range(2)]
+        assert answers[0][:128] != answers[1][:128]
+        assert [client.decrypt(a) for a in answers] == [b"OK", b"OK"]
+
+    def test_session_key_cache_is_bounded(self, rsa_keys):
+        client_key, server_key = rsa_keys
+        client = bh_connect.SessionCrypto(client_key, server_key.public_key())
+        server = bh_connect.SessionCrypto(server_key, client_key.public_key())
+        for i in range(bh_connect.SessionCrypto.SESSION_KEY_CACHE_SIZE + 5):
+            assert client.decrypt(server.encrypt(str(i).encode())) == str(i).encode()
+        assert len(client._SessionCrypto__session_keys) == client.SESSION_KEY_CACHE_SIZE
+
+
+class Test_CommandBatch:  # noqa
+    def test_command_batch(self, fake_spcm):
+        def answers(command):
+            if command.startswith("bad"):
+                return b"ERROR: unknown command"
+            if command.startswith("get"):
+                return b"OK:" + b"x" * 1000
+            return b"OK:42"
+
+        connection, _, _ = fake_spcm(answers, reuse_session_key=True)
+        results = connection.command_batch(["setparameter:pixelx,64", "bad", "get", "set"])
+        assert results[0] == 42.0
+        assert isinstance(results[1], ValueError)
+        assert results[2] == "x" * 1000
+        assert results[3] == 42.0
+        assert connection.command_batch(["a", "b", "c"], max_in_flight=2) == [42.0] * 3
+
+    def test_framed_receive(self, fake_spcm):
+        connection, server_sock, server_crypto = fake_spcm()
+
+        def send():
+            server_sock.recv(4096)
+            data = server_crypto.encrypt(b"OK:" + b"p" * 200_000)
+            for i in range(0, len(data), 1000):
+                server_sock.sendall(data[i:i + 1000])
+            server_sock.recv(4096)
+            # Two answers in one segment
+            server_sock.sendall(server_crypto.encrypt(b"OK:1") + server_crypto.encrypt(b"OK"))
+            server_sock.recv(4096)
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        try:
+            assert connection.command("getparameters") == "p" * 200_000
+            assert connection.command("a") == 1.0
+            assert connection.command("b") is True
+        finally:
+            sender.join()
+
+    def test_eax_message_length(self):
+        key, nonce = bytes(range(16)), bytes(range(16, 32))
+        for length in (16, 32, 160, 4096):
+            cipher = Crypto.Cipher.AES.new(key, Crypto.Cipher.AES.MODE_EAX, nonce)
+            cipher_text, tag = cipher.encrypt_and_digest(bytes(length))
+            data = cipher_text + bytes(range(64))
+            assert bh_connect._eax_message_length(key, nonce, tag, data) == length
+            assert bh_connect._eax_message_length(key, nonce, tag, cipher_text[:-16]) is None
+
+    def test_eax_scan_incremental(self):
+        key, nonce = bytes(range(16)), bytes(range(16, 32))
+        cipher = Crypto.Cipher.AES.new(key, Crypto.Cipher.AES.MODE_EAX, nonce)
+        cipher_text, tag = cipher.encrypt_and_digest(bytes(4096))
+        data = cipher_text + bytes(range(64))
+        scan = bh_connect._EaxScan(key, nonce, tag)
+        for size in (0, 10, 1000, 2050, 4080):
+            assert scan.feed(data[:size]) is None
+            assert scan.scanned == size // 16 * 16
+        assert scan.feed(data) == 4096
+
+
+def push(port, data):
+    with socket.create_connection(("127.0.0.1", port)) as s:
+        s.sendall(data)
+
+
+class Test_ReceiveEndpoint:  # noqa
+    def test_transfers_reuse_listeners(self, fake_spcm):
+        ports = []
+        image = np.arange(32 * 32, dtype=np.uint16).reshape(32, 32)
+        trace = np.arange(1000, dtype=np.uint32)
+
+        def answers(command):
+            port = int(command.split(",")[1])
+            ports.append(port)
+            if command.startswith("getData:image"):
+                for i in range(3):
+                    push(port, b"\x05w.tif" + bh_tiff.encode_tiff(image + i))
+                push(port, b"\x03EOT")
+            elif command.startswith("getData:trace"):
+                push(port, len(trace).to_bytes(4, "little") + trace.tobytes())
+            return b"OK"
+
+        connection, _, _ = fake_spcm(answers, persistent_receiver=True)
+        connection.transfer_timeout = 30
+        results = {}
+
+        def pull(name, func):
+            results[name] = [func() for _ in range(3)]
+
+        threads = [threading.Thread(target=pull, args=(
+                       "images", lambda: connection.get_image(window=-1, in_memory=True))),
+                   threading.Thread(target=pull, args=("traces", connection.get_trace))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(ports)) == 2  # one image and one trace listener for all transfers
+        for images in results["images"]:
+            assert [int(i[0, 0]) for i in images] == [0, 1, 2]
+            assert np.array_equal(images[2], image + 2)
+        assert all(np.array_equal(t, trace) for t in results["traces"])
+
+    def test_windows_are_received_in_parallel(self, fake_spcm):
+        windows = [np.full((1024, 2048), i, dtype=np.uint32) for i in range(4)]
+
+        def answers(command):
+            port = int(command.split(",")[1])
+            connections = [socket.create_connection(("127.0.0.1", port)) for _ in windows]
+            for i, s in enumerate(connections):
+                s.sendall(bytes([6]) + f"w{i}.tif".encode())
+            # Every window waits for the next one to be received completely, which only works if
+            # the windows are received in parallel (the images exceed the socket buffers)
+            done = [threading.Event() for _ in windows]
+
+            def send_window(i):
+                if i + 1 < len(windows):
+                    done[i + 1].wait(10)
+                connections[i].sendall(bh_tiff.encode_tiff(windows[i]))
+                connections[i].close()
+                done[i].set()
+            senders = [threading.Thread(target=send_window, args=(i,)) for i in range(4)]
+            for sender in senders:
+                sender.start()
+            for sender in senders:
+                sender.join()
+            push(port, b"\x03EOT")
+            return b"OK"
+
+        connection, _, _ = fake_spcm(answers, persistent_receiver=True)
+        connection.transfer_timeout = 30
+        start = time.monotonic()
+        images = connection.get_image(window=-1, in_memory=True)
+        assert time.monotonic() - start < 10
+        assert [int(image[0, 0]) for image in images] == [0, 1, 2, 3]
+        assert np.array_equal(images[3], windows[3])
+
+    def test_receive_errors_fail_the_transfer(self):
+        endpoint = bh_connect._ReceiveEndpoint()
+        try:
+            transfer = endpoint.expect_image(in_memory=True)
+            push(endpoint.image_port, b"")  # closed before the name header
+            push(endpoint.image_port, b"\x05w.tif" + b"no tiff" * 10)
+            push(endpoint.image_port, b"\x03EOT")
+            with pytest.raises(ConnectionError):
+                transfer.future.result(10)
+            assert isinstance(transfer.results[1].exception(), ValueError)
+        finally:
+            endpoint.close()
+
+    def test_stalled_name_header_times_out(self):
+        endpoint = bh_connect._ReceiveEndpoint()
+        endpoint.NAME_TIMEOUT_S = 0.2
+        image = np.arange(16, dtype=np.uint8).reshape(4, 4)
+        try:
+            stalled = endpoint.expect_image(in_memory=True)
+            with socket.create_connection(("127.0.0.1", endpoint.image_port)):
+                push(endpoint.image_port, b"\x05w.tif" + bh_tiff.encode_tiff(image))
+                push(endpoint.image_port, b"\x03EOT")
+                with pytest.raises(TimeoutError):
+                    stalled.future.result(10)
+            transfer = endpoint.expect_image(in_memory=True)
+            push(endpoint.image_port, b"\x05w.tif" + bh_tiff.encode_tiff(image))
+            push(endpoint.image_port, b"\x03EOT")
+            assert np.array_equal(transfer.future.result(10)[0], image)
+        finally:
+            endpoint.close()
+
+
+@pytest.mark.parametrize("persistent_receiver", [True, False])
+def test_transfer_timeout(fake_spcm, persistent_receiver):
+    # Acknowledges the getData commands without ever sending the data
+    connection, _, _ = fake_spcm(lambda command: b"OK", persistent_receiver=persistent_receiver)
+    connection.transfer_timeout = 0.2
+    for func in (connection.get_trace, connection.get_image):
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            func()
+        assert time.monotonic() - start < 5
+
+
+def test_transfer_after_timeout(fake_spcm):
+    # The first getData of each kind is acknowledged without sending the data
+    requests = {}
+    image = np.arange(16, dtype=np.uint8).reshape(4, 4)
+    trace = np.arange(100, dtype=np.uint32)
+
+    def answers(command):
+        kind, port = command.split(",")[0], int(command.split(",")[1])
+        requests[kind] = requests.get(kind, 0) + 1
+        if requests[kind] > 1:
+            if kind == "getData:image":
+                push(port, b"\x05w.tif" + bh_tiff.encode_tiff(image))
+                push(port, b"\x03EOT")
+            else:
+                push(port, len(trace).to_bytes(4, "little") + trace.tobytes())
+        return b"OK"
+
+    connection, _, _ = fake_spcm(answers, persistent_receiver=True)
+    connection.transfer_timeout = 0.2
+    for func in (connection.get_trace, connection.get_image):
+        with pytest.raises(TimeoutError):
+            func()
+    connection.transfer_timeout = 10
+    assert np.array_equal(connection.get_trace(), trace)
+    assert np.array_equal(connection.get_image(in_memory=True)[0], image)
+
+
+def test_trace_subscription_count_is_monotonic():
+    subscription = bh_connect.TraceSubscription(None, capacity=4)
+    store = subscription._TraceSubscription__store
+    for i in range(6):
+        store(float(i), np.full(10, i, dtype=np.uint32))
+    assert subscription.wait(6, timeout=0)
+    # A changed trace length drops the stored traces but not the count
+    store(6.0, np.full(20, 6, dtype=np.uint32))
+    assert subscription.count == 7
+    assert subscription.wait(7, timeout=0)
+    timestamps, traces = subscription.latest(3)
+    assert timestamps.tolist() == [6.0] and traces.shape == (1, 20)
+    for i in range(7, 12):
+        store(float(i), np.full(20, i, dtype=np.uint32))
+    timestamps, traces = subscription.latest(10)
+    assert timestamps.tolist() == [8.0, 9.0, 10.0, 11.0]
+    assert traces[:, 0].tolist() == [8, 9, 10, 11]
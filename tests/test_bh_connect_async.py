@@ -0,0 +1,104 @@
+import asyncio
+import numpy as np
+import pytest
+from Crypto.PublicKey import RSA
+from bhpy import bh_connect, bh_connect_async, bh_tiff
+
+IMAGE = np.arange(64 * 48, dtype=np.uint16).reshape(64, 48)
+TRACE = np.arange(10_000, dtype=np.uint32) * 7
+
+
+async def push(port, data):
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def fake_spcm(reader, writer, server_key):
+    '''Minimal SPCConnect v2 answerer: handshake, Version:number and the
+    image and trace transfers.'''
+    client_key = RSA.import_key(await reader.read(4096))
+    crypto = bh_connect.SessionCrypto(server_key, client_key)
+    writer.write(crypto.encrypt(server_key.public_key().export_key()))
+    buffer = bytearray()
+    while data := await reader.read(65536):
+        buffer += data
+        while (message := crypto.decrypt_from(buffer)) is not None:
+            command, size = message
+            del buffer[:size]
+            command = command.decode().strip("$")
+            if command == "Version:number":
+                answer = b"OK:SPCConnect 2.0.0"
+            elif command.startswith("getData:image"):
+                port = int(command.split(",")[1])
+                writer.write(crypto.encrypt(b"OK"))
+                await writer.drain()
+                for name in (b"a.tif", b"b.tif"):
+                    await push(port, bytes([len(name)]) + name + bh_tiff.encode_tiff(IMAGE))
+                await push(port, b"\x03EOT")
+                continue
+            elif command.startswith("getData:trace"):
+                port = int(command.split(",")[1])
+                writer.write(crypto.encrypt(b"OK"))
+                await writer.drain()
+                if command.endswith(",99"):  # trace 100 is never sent
+                    continue
+                await push(port, len(TRACE).to_bytes(4, "little") + TRACE.tobytes())
+                continue
+            else:
+                answer = b"ERROR"
+            writer.write(crypto.encrypt(answer))
+            await writer.drain()
+    writer.close()
+
+
+class Test_AsyncConnect:  # noqa
+    def test_instances_in_parallel(self, tmp_path):
+        async def main():
+            server_key = RSA.generate(1024)
+            servers = [await asyncio.start_server(
+                lambda r, w: fake_spcm(r, w, server_key), "127.0.0.1", 0) for _ in range(3)]
+            key_manager = bh_connect.ClientKeyManager(tmp_path, key_size=1024)
+            spcms = [bh_connect_async.AsyncBHConnect(
+                "127.0.0.1", server.sockets[0].getsockname()[1], key_manager=key_manager)
+                for server in servers]
+            versions = await asyncio.gather(*(spcm.connect_spcm_instance() for spcm in spcms))
+            assert versions == ["SPCConnect 2.0.0"] * 3
+
+            images = await asyncio.gather(*(spcm.get_image(in_memory=True) for spcm in spcms))
+            traces = await asyncio.gather(*(spcm.get_trace() for spcm in spcms))
+            results = await spcms[0].command_batch(["Version:number", "unknown"])
+            for spcm in spcms:
+                await spcm.disconnect_spcm_instance()
+            for server in servers:
+                server.close()
+            return images, traces, results
+
+        images, traces, results = asyncio.run(asyncio.wait_for(main(), 60))
+        for pair in images:
+            assert len(pair) == 2
+            assert all(np.array_equal(image, IMAGE) for image in pair)
+        assert all(np.array_equal(trace, TRACE) for trace in traces)
+        assert results[0] == "SPCConnect 2.0.0"
+        assert isinstance(results[1], ValueError)
+
+    def test_transfer_timeout(self, tmp_path):
+        async def main():
+            server_key = RSA.generate(1024)
+            server = await asyncio.start_server(
+                lambda r, w: fake_spcm(r, w, server_key), "127.0.0.1", 0)
+            spcm = bh_connect_async.AsyncBHConnect(
+                "127.0.0.1", server.sockets[0].getsockname()[1],
+                key_manager=bh_connect.ClientKeyManager(tmp_path, key_size=1024))
+            await spcm.connect_spcm_instance()
+            spcm.transfer_timeout = 0.5
+            with pytest.raises(TimeoutError):
+                await spcm.get_trace(trace_number=100)
+            trace = await spcm.get_trace()
+            await spcm.disconnect_spcm_instance()
+            server.close()
+            return trace
+
+        assert np.array_equal(asyncio.run(asyncio.wait_for(main(), 60)), TRACE)
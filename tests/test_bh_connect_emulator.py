@@ -0,0 +1,178 @@
+import asyncio
+import numpy as np
+import pytest
+from bhpy import bh_connect, bh_connect_async, bh_connect_emulator
+
+
+@pytest.fixture(scope="module", params=[True, False],
+                ids=["answer_after_transfer", "answer_first"])
+def emulator(request):
+    with bh_connect_emulator.SpcConnectEmulator(key_size=1024, image_shape=(64, 32),
+                                                windows=3, trace_length=1000,
+                                                answer_after_transfer=request.param) as emulator:
+        yield emulator
+
+
+@pytest.fixture
+def key_manager(tmp_path):
+    return bh_connect.ClientKeyManager(tmp_path, key_size=1024)
+
+
+@pytest.mark.parametrize("persistent_receiver", [True, False])
+class Test_Emulator:  # noqa
+    def test_session(self, emulator, key_manager, persistent_receiver):
+        spcm = bh_connect.BHConnect(key_manager=key_manager,
+                                    persistent_receiver=persistent_receiver)
+        assert spcm.connect_spcm_instance(*emulator.address) == "SPCConnect 2.0.0"
+        try:
+            spcm.set_image_size(48, 16)
+            assert emulator.parameters["pixelx"] == "48"
+            assert emulator.menu == "systemparameter"
+            assert spcm.command("getparameter:pixely") == 16.0
+            with pytest.raises(ValueError):
+                spcm.command("unknown")
+
+            images = spcm.get_image(window=-1, in_memory=True)
+            assert [image.shape for image in images] == [(16, 48)] * 3
+            assert abs(images[1].mean() - images[0].mean() - 100) < 5  # windows differ
+            assert len(spcm.get_image(window=2, in_memory=True)) == 1
+            trace = spcm.get_trace()
+            assert trace.dtype == np.dtype("<u4") and trace.size == 1000
+            assert spcm.command_batch(["setparameter:pixelx,32", "bad"])[0] is True
+        finally:
+            spcm.command("setparameter:pixelx,32")
+            spcm.command("setparameter:pixely,64")
+            spcm.disconnect_spcm_instance()
+
+    def test_iter_images(self, emulator, key_manager, persistent_receiver):
+        spcm = bh_connect.BHConnect(key_manager=key_manager,
+                                    persistent_receiver=persistent_receiver)
+        spcm.connect_spcm_instance(*emulator.address)
+        try:
+            series = list(spcm.iter_images(range(1, 5), windows=(1, 3), prefetch=3))
+            assert [(window, cycle) for window, cycle, _ in series] == \
+                [(window, cycle) for cycle in range(1, 5) for window in (1, 3)]
+            assert all(len(images) == 1 and images[0].shape == (64, 32)
+                       for _, _, images in series)
+            assert abs(series[1][2][0].mean() - series[0][2][0].mean() - 200) < 5
+
+            # Closing early still receives the prefetched transfers
+            images = spcm.iter_images(range(1, 10), windows=(2,))
+            next(images)
+            images.close()
+            image, = spcm.get_image(window=3, in_memory=True)
+            assert abs(image.mean() - series[1][2][0].mean()) < 5
+        finally:
+            spcm.disconnect_spcm_instance()
+
+    def test_async_session(self, emulator, key_manager, persistent_receiver):
+        async def main():
+            spcm = bh_connect_async.AsyncBHConnect(*emulator.address, key_manager=key_manager)
+            await spcm.connect_spcm_instance()
+            images, trace = await asyncio.gather(spcm.get_image(window=-1, in_memory=True),
+                                                 spcm.get_trace())
+            await spcm.disconnect_spcm_instance()
+            return images, trace
+
+        images, trace = asyncio.run(asyncio.wait_for(main(), 60))
+        assert len(images) == 3 and trace.size == 1000
+
+
+def test_instrumentation(emulator, key_manager):
+    spcm = bh_connect.BHConnect(key_manager=key_manager)
+    spcm.connect_spcm_instance(*emulator.address)
+    try:
+        spcm.command("Version:number")
+        assert spcm.stats() == {}
+
+        spcm.enable_instrumentation()
+        for _ in range(3):
+            spcm.command("Version:number")
+        images = spcm.get_image(window=-1, in_memory=True)
+        spcm.get_trace()
+        stats = spcm.stats()
+        # get_image and get_trace send a getData command each
+        assert stats["command"]["calls"] == 5
+        assert all(stats[f"command.{phase}"]["calls"] == 5
+                   for phase in ("encrypt", "send", "wait", "decrypt"))
+        assert stats["command.wait"]["total_s"] <= stats["command"]["total_s"]
+        assert stats["get_image"]["bytes"] == sum(image.nbytes for image in images)
+        assert stats["get_trace"]["bytes"] == 4000
+
+        spcm.disable_instrumentation()
+        spcm.command("Version:number")
+        assert spcm.stats()["command"]["calls"] == 5
+        spcm.reset_stats()
+        assert spcm.stats() == {}
+    finally:
+        spcm.disconnect_spcm_instance()
+
+
+def test_parameter_cache(emulator, key_manager):
+    spcm = bh_connect.BHConnect(key_manager=key_manager, cache_parameters=True)
+    spcm.connect_spcm_instance(*emulator.address)
+    try:
+        sent = len(emulator.commands)
+        for _ in range(2):
+            spcm.command("setparameter:pixelx,32")
+            spcm.command("setparameter:pixely,64")
+        assert len(emulator.commands) == sent + 2
+        assert spcm.cached_parameters() == {"pixelx": "32", "pixely": "64"}
+
+        # Changed and unknown values are sent
+        assert spcm.command_batch(["setparameter:pixelx,16", "setparameter:pixelx,32",
+                                   "setparameter:pixely,64"]) == [True] * 3
+        assert emulator.commands[-2:] == ["setparameter:pixelx,16", "setparameter:pixelx,32"]
+        assert spcm.command("getparameter:pixelx") == 32.0
+        spcm.command("setparameter:pixelx,32")
+        assert emulator.commands[-1] == "getparameter:pixelx"
+
+        # pressmenu is always sent, but only setup commands clear the cache
+        spcm.invalidate_parameter_cache()
+        sent = len(emulator.commands)
+        spcm.set_image_size(32, 64)
+        spcm.set_image_size(32, 64)
+        assert emulator.commands[sent:] == ["pressmenu:systemparameter", "setparameter:pixelx,32",
+                                            "setparameter:pixely,64", "pressmenu:systemparameter"]
+        assert spcm.command_batch(["pressmenu:systemparameter", "setparameter:pixelx,32"]) == \
+            [True] * 2
+        assert emulator.commands[-1] == "pressmenu:systemparameter"
+        with pytest.raises(ValueError):
+            spcm.command("loadsetup:other.set")
+        assert spcm.cached_parameters() == {}
+        spcm.command("setparameter:pixelx,32")
+        spcm.invalidate_parameter_cache()
+        spcm.command("setparameter:pixelx,32")
+        assert emulator.commands[-2:] == ["setparameter:pixelx,32"] * 2
+    finally:
+        spcm.disconnect_spcm_instance()
+    assert spcm.cached_parameters() == {}
+
+
+def test_trace_subscription(emulator, key_manager):
+    spcm = bh_connect.BHConnect(key_manager=key_manager)
+    spcm.connect_spcm_instance(*emulator.address)
+    try:
+        subscription = bh_connect.TraceSubscription(spcm, rate_hz=200, capacity=4)
+        timestamps, traces = subscription.latest(3)
+        assert timestamps.size == 0 and traces.shape == (0, 0)
+        with subscription:
+            assert subscription.wait(6, timeout=30)
+            timestamps, traces = subscription.latest(10)
+        assert subscription.count >= 6 and not subscription.running
+        assert traces.shape == (4, 1000) and traces.dtype == np.dtype("<u4")
+        assert np.all(np.diff(timestamps) > 0)
+        assert subscription.errors == 0
+        assert spcm.command("Version:number") == "SPCConnect 2.0.0"
+    finally:
+        spcm.disconnect_spcm_instance()
+
+
+def test_ping_and_shutdown(key_manager):
+    with bh_connect_emulator.SpcConnectEmulator(key_size=1024) as emulator:
+        assert bh_connect.BHConnect()._BHConnect__wait_host_port(*emulator.address)
+        spcm = bh_connect.BHConnect(key_manager=key_manager)
+        spcm.connect_spcm_instance(*emulator.address)
+        spcm.shutdown_spcm_instance()
+        assert emulator.shutdown_requested.wait(5)
+        spcm.disconnect_spcm_instance()
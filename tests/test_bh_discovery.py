@@ -0,0 +1,49 @@
+import socket
+import time
+import pytest
+from zeroconf import IPVersion, ServiceInfo, Zeroconf
+from bhpy import bh_discovery
+
+
+@pytest.fixture
+def zeroconf():
+    try:
+        zc = Zeroconf(interfaces=["127.0.0.1"], ip_version=IPVersion.V4Only)
+    except OSError as e:
+        pytest.skip(f"No multicast on loopback: {e}")
+    yield zc
+    zc.close()
+
+
+def service(service_id, port):
+    return ServiceInfo(bh_discovery.SERVICE_TYPE,
+                       f"SPCMRemoteControl:{service_id}.{bh_discovery.SERVICE_TYPE}",
+                       addresses=[socket.inet_aton("127.0.0.1")], port=port,
+                       server="spcm-test.local.")
+
+
+class Test_Discovery:  # noqa
+    def test_service_id(self):
+        assert bh_discovery.SpcmDiscovery.service_id(
+            "SPCMRemoteControl:12._bhipc._tcp.local.") == 12
+        assert bh_discovery.SpcmDiscovery.service_id("Other:1._bhipc._tcp.local.") is None
+
+    def test_lookup(self, zeroconf):
+        zeroconf.register_service(service(7, 4567))
+        with bh_discovery.SpcmDiscovery(zeroconf) as discovery:
+            instance = discovery.lookup(7, timeout=10)
+            if instance is None:
+                pytest.skip("mDNS announcements are not delivered on this host")
+            assert (instance.host, instance.port) == ("spcm-test", 4567)
+            assert "127.0.0.1" in instance.addresses
+
+            start = time.monotonic()
+            assert discovery.lookup(7).port == 4567  # cached
+            assert time.monotonic() - start < 0.1
+            assert discovery.lookup(8, timeout=0.2) is None
+            assert set(discovery.instances()) == {7}
+
+            discovery.ttl_s = 0  # revalidated with a direct query
+            assert discovery.lookup(7).port == 4567
+            discovery.forget(7)
+            assert 7 not in discovery.instances()
@@ -0,0 +1,95 @@
+import socket
+import threading
+import time
+import pytest
+from bhpy import bh_connect, bh_connect_emulator, bh_fit_scheduler
+
+
+@pytest.fixture
+def emulators():
+    emulators = [bh_connect_emulator.SpcConnectEmulator(key_size=1024, image_shape=(16, 16))
+                 for _ in range(2)]
+    for emulator in emulators:
+        emulator.start()
+    yield emulators
+    for emulator in emulators:
+        emulator.close()
+
+
+def closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Test_FitJobScheduler:  # noqa
+    def test_jobs_spread_and_retried(self, emulators, tmp_path):
+        key_manager = bh_connect.ClientKeyManager(tmp_path, key_size=1024)
+        instances = [("127.0.0.1", closed_port())] + [e.address for e in emulators]
+        with bh_fit_scheduler.FitJobScheduler(instances, key_manager=key_manager) as scheduler:
+            futures = scheduler.map(bh_fit_scheduler.FitJob(cycle=cycle, fit_config=("fit", 1))
+                                    for cycle in range(1, 21))
+            results = [future.result(60) for future in futures]
+            failing = scheduler.submit(bh_fit_scheduler.FitJob(commands=["unknown"]))
+            with pytest.raises(ValueError):
+                failing.result(60)
+        assert all(len(images) == 1 and images[0].shape == (16, 16) for images in results)
+
+        stats = scheduler.stats()
+        assert stats["submitted"] == 21
+        assert stats["completed"] == 20 and stats["failed"] == 1
+        assert stats["jobs_per_s"] > 0
+        dead, *alive = stats["instances"].values()
+        assert not dead["alive"] and dead["completed"] == 0
+        assert sum(instance["completed"] for instance in alive) == 20
+        # the failing job was tried on both remaining instances, max_attempts times in total
+        assert all(instance["failed"] >= 1 for instance in alive)
+        assert sum(instance["failed"] for instance in alive) == 3
+        assert all(any(c.startswith("getData:fitimage") for c in e.commands) for e in emulators)
+        with pytest.raises(RuntimeError):
+            scheduler.submit(bh_fit_scheduler.FitJob())
+
+    def test_no_instance_left(self, tmp_path):
+        key_manager = bh_connect.ClientKeyManager(tmp_path, key_size=1024)
+        with bh_fit_scheduler.FitJobScheduler([("127.0.0.1", closed_port())],
+                                              key_manager=key_manager) as scheduler:
+            with pytest.raises(ConnectionError):
+                scheduler.submit(bh_fit_scheduler.FitJob()).result(60)
+            with pytest.raises(ConnectionError):
+                scheduler.submit(bh_fit_scheduler.FitJob()).result(60)
+
+    def test_timeout_keeps_the_instance(self, emulators, tmp_path):
+        key_manager = bh_connect.ClientKeyManager(tmp_path, key_size=1024)
+
+        class SlowJob(bh_fit_scheduler.FitJob):
+            def run(self, connection):
+                raise TimeoutError("SPCM did not send the requested data in time")
+
+        with bh_fit_scheduler.FitJobScheduler([emulators[0].address],
+                                              key_manager=key_manager) as scheduler:
+            with pytest.raises(TimeoutError):
+                scheduler.submit(SlowJob()).result(60)
+            assert len(scheduler.submit(bh_fit_scheduler.FitJob()).result(60)) == 1
+        instance, = scheduler.stats()["instances"].values()
+        assert instance["alive"] and instance["completed"] == 1
+
+    def test_close_timeout(self, emulators, tmp_path):
+        key_manager = bh_connect.ClientKeyManager(tmp_path, key_size=1024)
+        release = threading.Event()
+
+        class BlockingJob(bh_fit_scheduler.FitJob):
+            def run(self, connection):
+                release.wait(30)
+                return []
+
+        scheduler = bh_fit_scheduler.FitJobScheduler([emulators[0].address],
+                                                     key_manager=key_manager)
+        running = scheduler.submit(BlockingJob())
+        queued = scheduler.submit(BlockingJob())
+        start = time.monotonic()
+        scheduler.close(timeout=0.5)
+        assert time.monotonic() - start < 5
+        with pytest.raises(TimeoutError):
+            queued.result(0)
+        release.set()
+        assert running.result(30) == []
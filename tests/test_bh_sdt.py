@@ -0,0 +1,57 @@
+import numpy as np
+from bhpy import bh_sdt
+
+
+class Test_Sdt:  # noqa
+    def test_round_trip(self, tmp_path):
+        rng = np.random.default_rng(3)
+        decay = rng.integers(0, 1000, 256, dtype=np.uint32)
+        decays = rng.integers(0, 1000, (4, 256)).astype(np.uint16)
+        cube = rng.integers(0, 100, (8, 16, 64), dtype=np.uint32)
+        path = tmp_path / "out.sdt"
+        with bh_sdt.SdtWriter(path, title="test", measure_info={"tac_r": 50e-9}) as writer:
+            assert writer.add_block(decay) == 0
+            writer.add_block(decays)
+            writer.add_block(cube)
+
+        with bh_sdt.SdtFile(path) as sdt:
+            assert sdt.header["header_valid"] == bh_sdt.HEADER_VALID
+            assert "SPC Setup & Data File" in sdt.info
+            assert len(sdt) == 3
+            assert len(sdt.measure_info) == 2
+            assert np.isclose(sdt.measure_info[0]["tac_r"], 50e-9)
+            assert sdt.measure_info[0]["date"] in sdt.info  # MM-DD-YYYY like the INFO block
+            assert isinstance(sdt[0], np.memmap)
+            assert np.array_equal(sdt[0], decay)
+            assert sdt[1].dtype == np.uint16
+            assert np.array_equal(sdt[1], decays)
+            assert sdt.blocks[2].content == "IMG_BLOCK"
+            assert sdt[2].shape == (8, 16, 64)
+            assert np.array_equal(sdt[2][3, 5], cube[3, 5])
+
+    def test_checksum(self, tmp_path):
+        path = tmp_path / "out.sdt"
+        with bh_sdt.SdtWriter(path) as writer:
+            writer.add_block(np.ones(16))
+        words = np.fromfile(path, dtype="<u2", count=bh_sdt.FILE_HEADER.itemsize // 2)
+        assert int(words.sum()) & 0xFFFF == bh_sdt.HEADER_CHKSUM
+
+    def test_flim_cube(self, tmp_path):
+        cube = np.zeros((4, 4, 32), dtype=np.uint32)
+        cube[1, 2, 3] = 7
+        with bh_sdt.SdtWriter(tmp_path / "flim.sdt") as writer:
+            writer.add_block(cube)
+        with bh_sdt.SdtFile(tmp_path / "flim.sdt") as sdt:
+            assert sdt[0].shape == (4, 4, 32)
+            assert sdt[0][1, 2, 3] == 7
+
+    def test_compressed_block(self, tmp_path):
+        data = np.arange(4 * 128, dtype="<u2").reshape(4, 128)
+        with bh_sdt.SdtWriter(tmp_path / "out.sdt") as writer:
+            writer.add_block(data, compress=True)
+            writer.add_block(data)
+        with bh_sdt.SdtFile(tmp_path / "out.sdt") as sdt:
+            assert sdt.blocks[0].compressed
+            assert sdt.blocks[0].header["block_length"] < data.nbytes
+            assert np.array_equal(sdt[0], data)
+            assert np.array_equal(sdt[1], data)
@@ -0,0 +1,66 @@
+import ctypes
+import ctypes.util
+import pytest
+import sys
+import bhpy as bh
+from bhpy.bh_telemetry import CallStats, TimedCall, TransferStats
+
+
+@pytest.fixture
+def libc_abs():
+    if sys.platform == "win32":
+        libc = ctypes.CDLL("msvcrt")
+    else:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+    function = libc["abs"]
+    function.argtypes = [ctypes.c_uint8]  # same signature as get_rate
+    function.restype = ctypes.c_int
+    return function
+
+
+class Test_Telemetry:  # noqa
+    def test_call_stats(self):
+        stats = CallStats()
+        stats.record(0.5e-6)
+        stats.record(3e-6)
+        stats.record(10.0)
+        result = stats.as_dict()
+        assert result["calls"] == 3
+        assert result["max_s"] == 10.0
+        assert result["histogram"] == [[1e-6, 1], [4e-6, 1], [float("inf"), 1]]
+        stats.reset()
+        assert stats.as_dict()["calls"] == 0
+
+    def test_transfer_stats(self):
+        stats = TransferStats()
+        stats.record(0.5, 1000)
+        stats.record(1.5, 3000)
+        result = stats.as_dict()
+        assert result["calls"] == 2
+        assert result["bytes"] == 4000
+        assert result["bytes_per_s"] == 2000.0
+        assert result["size_histogram"] == [[1024, 1], [4096, 1]]
+        stats.reset()
+        assert stats.as_dict()["bytes"] == 0
+
+    def test_tdc_wrapper_instrumentation(self, libc_abs):
+        card = object.__new__(bh.SpcQcX04)  # no dll on this platform, bind a libc function
+        card._dll_stats = {}
+        card._instrumented = False
+        card._TdcDllWrapper__get_rate = libc_abs
+
+        assert card.get_rate(7) == 7
+        assert card.stats() == {}
+
+        card.enable_instrumentation()
+        assert isinstance(card._TdcDllWrapper__get_rate, TimedCall)
+        for _ in range(5):
+            card.get_rate(3)
+        assert card.stats()["get_rate"]["calls"] == 5
+
+        card.disable_instrumentation()
+        assert card._TdcDllWrapper__get_rate is libc_abs
+        card.get_rate(3)
+        assert card.stats()["get_rate"]["calls"] == 5
+        card.reset_stats()
+        assert card.stats() == {}
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import struct
+from bhpy import bh_tiff
+
+
+class Test_Tiff:  # noqa
+    @pytest.mark.parametrize("dtype", ["u1", "u2", "i2", "u4", "i4", "f4", "f8"])
+    def test_round_trip(self, dtype):
+        image = (np.arange(37 * 53) % 251).astype(dtype).reshape(37, 53)
+        assert np.array_equal(bh_tiff.decode_tiff(bh_tiff.encode_tiff(image)), image)
+
+    def test_multiple_strips(self):
+        image = np.random.default_rng(4).random((64, 48), dtype=np.float32)
+        decoded = bh_tiff.decode_tiff(bytearray(bh_tiff.encode_tiff(image, rows_per_strip=5)))
+        assert decoded.dtype == np.float32
+        assert np.array_equal(decoded, image)
+
+    def test_big_endian(self):
+        image = np.arange(12, dtype=">u2").reshape(3, 4)
+        entries = [(256, 3, 1, 4 << 16), (257, 3, 1, 3 << 16), (258, 3, 1, 16 << 16),
+                   (273, 4, 1, 8 + 2 + 5 * 12 + 4), (279, 4, 1, image.nbytes)]
+        ifd = struct.pack(">H", len(entries)) + b"".join(struct.pack(">HHII", *e)
+                                                         for e in entries)
+        tiff = b"MM\0*" + struct.pack(">I", 8) + ifd + bytes(4) + image.tobytes()
+        assert np.array_equal(bh_tiff.decode_tiff(tiff), image)
+
+    def test_unsupported(self):
+        tiff = bytearray(bh_tiff.encode_tiff(np.zeros((2, 2), np.uint8)))
+        entry = tiff.index(struct.pack("<HHI", bh_tiff.COMPRESSION, 3, 1))
+        tiff[entry + 8:entry + 10] = struct.pack("<H", 5)  # LZW
+        with pytest.raises(ValueError):
+            bh_tiff.decode_tiff(tiff)
+        with pytest.raises(ValueError):
+            bh_tiff.decode_tiff(b"not a tiff")
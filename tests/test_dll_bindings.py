@@ -0,0 +1,67 @@
+import pytest
+import bhpy as bh
+from bhpy.bh_dll import dll_functions, load_library, missing_symbols
+
+WRAPPERS = [bh.SpcQcX04, bh.SpcQcX08, bh.Pms800]
+
+
+def stub_source(cls):
+    '''C source exporting every symbol of the signature table of cls. Only
+    the version query does something, everything else returns 0.'''
+    lines = ['#include <string.h>',
+             'short get_dll_version(char *buf, unsigned char len)'
+             ' { strncpy(buf, "4.0.0+abc123", len); return 0; }']
+    for symbol in dll_functions(cls):
+        if symbol != "get_dll_version":
+            lines.append(f"int {symbol}(void) {{ return 0; }}")
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture(params=WRAPPERS, ids=lambda cls: cls.__name__)
+def stub(request, build_stub_library):
+    cls = request.param
+    return cls, build_stub_library(cls.__name__.lower(), stub_source(cls))
+
+
+class Test_DllBindings:  # noqa
+    def test_signature_tables(self):
+        for cls in WRAPPERS:
+            table = dll_functions(cls)
+            assert table["get_rates"].argtypes is not None
+            assert table["read_setting"].debug_only
+        assert len(dll_functions(bh.SpcQcX08)) > 50
+        # subclasses override bindings of the same symbol with their own signature
+        assert len(dll_functions(bh.Pms800)["set_measurement_configuration"].argtypes) == 5
+        assert len(dll_functions(bh.SpcQcX04)["set_measurement_configuration"].argtypes) == 4
+
+    def test_stub_library(self, stub):
+        cls, library = stub
+        assert missing_symbols(cls, library) == []
+
+        card = cls(dll_path=library)
+        other = cls(dll_path=library)
+        assert card._dll is other._dll is load_library(library)
+        assert card.version["major"] == 4
+        assert card.dll_is_debug_version is False
+
+        # only the functions called so far are bound
+        bound = [name for name in vars(card) if "__" in name and callable(vars(card)[name])]
+        assert sorted(bound) == ["_TdcDllWrapper__get_dll_debug",
+                                 "_TdcDllWrapper__get_dll_version"]
+        assert card.card_focus == 0
+        assert "_TdcDllWrapper__get_card_focus" in vars(card)
+        assert "_TdcDllWrapper__get_card_focus" not in vars(other)
+
+    def test_lazy_binding_instrumentation(self, stub):
+        cls, library = stub
+        card = cls(dll_path=library)
+        card.enable_instrumentation()
+        card.card_focus = 0
+        card.rates
+        card.rates
+        stats = card.stats()
+        assert stats["get_rates"]["calls"] == 2
+        assert stats["set_card_focus"]["calls"] == 1
+        card.disable_instrumentation()
+        card.rates
+        assert card.stats()["get_rates"]["calls"] == 2
@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+HEAVY = "('numpy', 'zeroconf', 'Crypto', 'appdirs', 'socketserver')"
+
+
+def loaded_after(statement):
+    script = (f"import sys\n{statement}\n"
+              f"print(','.join(p for p in {HEAVY} if p in sys.modules))")
+    output = subprocess.check_output([sys.executable, "-c", script], text=True).strip()
+    return set(output.split(",")) - {""}
+
+
+class Test_Import:  # noqa
+    def test_import_is_lazy(self):
+        assert loaded_after("import bhpy") == set()
+
+    def test_tdc_wrapper_skips_connect_stack(self):
+        assert loaded_after("import bhpy; bhpy.SpcQcX04") == {"numpy"}
+
+    def test_names_resolve(self):
+        import bhpy
+        for name in bhpy.__all__:
+            assert getattr(bhpy, name).__name__ == name
+        assert bhpy.spc_tdc_export.PtuWriter is bhpy.PtuWriter
+        assert "BHConnect" in dir(bhpy)
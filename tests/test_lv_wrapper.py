@@ -0,0 +1,189 @@
+import ctypes
+import threading
+import time
+import pytest
+import bhpy as bh
+
+STUB_SOURCE = '''#include <stdio.h>
+#include <string.h>
+#include <unistd.h>
+static int active = 0, max_active = 0;
+int Dll_ControlQC008(const char *cmd, const char *machine, unsigned timeout, char *error,
+                     char *result, float *rates, int error_len, int result_len, int rates_len)
+{
+    if (strncmp(machine, "slow", 4) == 0)
+        usleep(1000 * (strlen(machine) - 4) * 100);  /* "slow" + n characters: n * 0.1 s */
+    if (strcmp(machine, "fail") == 0) {
+        snprintf(error, error_len, "%s not reachable", machine);
+        return 66;
+    }
+    int now = __sync_add_and_fetch(&active, 1);
+    if (now > max_active) max_active = now;
+    /* write the answer in two halves, so shared buffers would mix answers */
+    size_t half = strlen(cmd) / 2;
+    strncpy(result, cmd, half);
+    usleep(200);
+    strcpy(result + half, cmd + half);
+    for (int i = 0; i < rates_len; i++) rates[i] = (float)strlen(cmd);
+    __sync_sub_and_fetch(&active, 1);
+    return 0;
+}
+int get_max_active(void) { int m = max_active; max_active = 0; return m; }
+'''
+
+
+@pytest.fixture(scope="module")
+def stub(build_stub_library):
+    return build_stub_library("controlqc008", STUB_SOURCE)
+
+
+def run_threads(instances: list, machines: list[str], commands: int = 50) -> list:
+    errors = []
+
+    def worker(thread: int, qc008, machine: str):
+        for i in range(commands):
+            command = f"Echo{thread}x{i}" + "y" * (thread % 5)
+            result, rates = qc008._command(command, machine_name=machine)
+            if result != command or rates != [len(command)] * 8:
+                errors.append((command, result))
+
+    threads = [threading.Thread(target=worker, args=(thread, qc008, machine))
+               for thread, (qc008, machine) in enumerate(zip(instances, machines))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class Test_LVConnectQC008:  # noqa
+    def test_concurrent_commands(self, stub):
+        max_active = ctypes.CDLL(str(stub)).get_max_active
+        qc008 = bh.LVConnectQC008(dll_path=stub, lock_machine=False)
+        assert run_threads([qc008] * 8, ["localhost"] * 8) == []
+
+        # commands to one machine are serialized by all instances
+        locked = [bh.LVConnectQC008(dll_path=stub) for _ in range(2)]
+        max_active()
+        assert run_threads(locked * 4, ["a"] * 8) == []
+        assert max_active() == 1
+        assert run_threads(locked * 4, ["a", "b", "c", "d"] * 2) == []
+
+
+class Test_LVConnectQC008Group:  # noqa
+    def test_fan_out(self, stub):
+        machines = ["slow--", "slow---", "slow--x", "slow-x-"]
+        with bh.LVConnectQC008Group(machines, dll_path=stub) as group:
+            start = time.perf_counter()
+            assert group.command("StartMeasurement") == dict.fromkeys(machines)
+            assert time.perf_counter() - start < 0.5  # the slowest takes 0.3 s
+            rates = group.run(lambda qc008: qc008._command("GetRates")[1])
+            assert rates == dict.fromkeys(machines, [len("GetRates")] * 8)
+
+    def test_errors_and_deadline(self, stub):
+        with bh.LVConnectQC008Group(["fail", "slow", "slow----------"],
+                                    dll_path=stub) as group:
+            results = group.command("StopMeasurement", timeout=0.5)
+            # The timed out call still runs, the machine is reported busy without waiting
+            start = time.perf_counter()
+            busy = group.command("StopMeasurement", timeout=0.5)
+            assert time.perf_counter() - start < 0.4
+        assert results["slow"] is None and busy["slow"] is None
+        assert "busy" in str(busy["slow----------"])
+        errors = bh.LVConnectQC008Group.errors(results)
+        assert list(errors) == ["fail", "slow----------"]
+        assert isinstance(errors["fail"], ChildProcessError)
+        assert "fail not reachable (66)" in str(errors["fail"])
+        assert isinstance(errors["slow----------"], TimeoutError)
+
+
+BDU_STUB_SOURCE = '''#include <stdio.h>
+#include <string.h>
+static int loading = 0, gets = 0;
+static char serial[64] = "BDU123", freqs[64] = "20MHz;50MHz;CW";
+int dll_ControlBDU(const char *cmd, const char *machine, unsigned timeout, char *error,
+                   char *result, int error_len, int result_len)
+{
+    if (loading > 0) {
+        loading--;
+        snprintf(result, result_len, "Still loading");
+        return 0;
+    }
+    if (strncmp(cmd, "Get", 3) == 0 && strcmp(cmd, "GetAppVersion") != 0) gets++;
+    if (strcmp(cmd, "GetAppVersion") == 0) snprintf(result, result_len, "1.0.0.92");
+    else if (strcmp(cmd, "GetSN") == 0) snprintf(result, result_len, "%s", serial);
+    else if (strcmp(cmd, "GetWL") == 0) snprintf(result, result_len, "485,5");
+    else if (strcmp(cmd, "GetFreqStrings") == 0) snprintf(result, result_len, "%s", freqs);
+    else if (strcmp(cmd, "GetFwVersion") == 0) snprintf(result, result_len, "FW1.2");
+    else snprintf(result, result_len, "OK");
+    return 0;
+}
+void set_loading(int n) { loading = n; }
+void set_serial(const char *sn) { strncpy(serial, sn, sizeof(serial) - 1); }
+void set_freqs(const char *f) { strncpy(freqs, f, sizeof(freqs) - 1); }
+int get_queries(void) { int n = gets; gets = 0; return n; }
+'''
+
+
+@pytest.fixture(scope="module")
+def bdu_stub(build_stub_library):
+    return build_stub_library("controlbdu", BDU_STUB_SOURCE)
+
+
+class Test_LVConnectBDU:  # noqa
+    def test_static_property_cache(self, bdu_stub):
+        library = ctypes.CDLL(str(bdu_stub))
+        bdu = bh.LVConnectBDU(dll_path=bdu_stub)
+        library.get_queries()
+        for _ in range(3):
+            assert bdu.serial_number == "BDU123"
+            assert bdu.wavelength == 485.5
+            assert bdu.frequencies == ["20MHz", "50MHz", "CW"]
+            assert bdu.firmware_version == "FW1.2"
+        bdu.frequency = "CW"  # validated against the cached names
+        assert library.get_queries() == 4
+
+        assert bdu.connected
+        assert bdu.wavelength == 485.5
+        assert library.get_queries() == 1  # connected always asks for the serial number
+
+        library.set_serial(b"NC")
+        assert not bdu.connected
+        assert bdu.serial_number is None
+        library.set_serial(b"BDU456")
+        assert bdu.connected
+        assert bdu.serial_number == "BDU456"
+        assert bdu.wavelength == 485.5
+        assert library.get_queries() == 4
+        library.set_serial(b"BDU123")
+
+    def test_empty_frequencies_are_not_cached(self, bdu_stub):
+        library = ctypes.CDLL(str(bdu_stub))
+        bdu = bh.LVConnectBDU(dll_path=bdu_stub)
+        library.set_freqs(b"")
+        try:
+            library.get_queries()
+            assert bdu.frequencies is None
+            assert bdu.frequencies is None
+            assert library.get_queries() == 2
+            with pytest.raises(ValueError):
+                bdu.frequency = "CW"
+        finally:
+            library.set_freqs(b"20MHz;50MHz;CW")
+        assert bdu.frequencies == ["20MHz", "50MHz", "CW"]
+
+    def test_loading_backoff(self, bdu_stub):
+        library = ctypes.CDLL(str(bdu_stub))
+        library.set_loading(4)
+        bdu = bh.LVConnectBDU(dll_path=bdu_stub)
+        start = time.perf_counter()
+        assert bdu.command("GetArmed") == "OK"
+        assert time.perf_counter() - start < 1.5  # 0.05 + 0.1 + 0.2 + 0.4 s
+
+        library.set_loading(1000)
+        bdu = bh.LVConnectBDU(dll_path=bdu_stub, ready_timeout_s=0.3)
+        start = time.perf_counter()
+        with pytest.raises(ChildProcessError, match="still loading after 0.3 s"):
+            bdu.command("GetArmed")
+        assert time.perf_counter() - start < 1.0
+        library.set_loading(0)
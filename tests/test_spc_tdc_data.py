@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+from bhpy import spc_tdc_data
+
+
+class Test_Data:  # noqa
+    @pytest.mark.parametrize("dtype", [np.uint32, np.uint64])
+    def test_record_file(self, tmp_path, dtype):
+        words = np.random.default_rng(3).integers(0, np.iinfo(dtype).max, 10_000, dtype=dtype)
+        path = tmp_path / "spc_qc_x04_record_0.data"
+        spc_tdc_data.write_record_file(path, words[:1000])
+        spc_tdc_data.write_record_file(path, words[1000:], append=True)
+        assert np.array_equal(spc_tdc_data.read_record_file(path, dtype), words)
+        chunks = list(spc_tdc_data.iter_record_file(path, 4096, dtype))
+        assert all(chunk.size == 4096 and chunk.dtype == dtype for chunk in chunks[:-1])
+        assert np.array_equal(np.concatenate(chunks), words)
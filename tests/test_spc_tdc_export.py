@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import struct
+from bhpy import spc_tdc_export
+
+
+def make_events(no_of_events=20_000, seed=2):
+    rng = np.random.default_rng(seed)
+    events = np.zeros(no_of_events, dtype=spc_tdc_export.EVENT_DTYPE)
+    steps = rng.integers(1, 3_000, no_of_events, dtype=np.uint64)
+    steps[::1000] = 5_000_000  # gaps needing more than one overflow record
+    events["macro_time"] = np.cumsum(steps)
+    events["micro_time"] = rng.integers(0, 4096, no_of_events)
+    events["channel"] = rng.integers(0, 8, no_of_events)
+    events["marker"][::50] = 0x1
+    events["channel"][::50] = 0
+    return events
+
+
+def read_ptu(path):
+    with open(path, "rb") as f:
+        assert f.read(16) == b"PQTTTR\0\0" + b"1.0.00\0\0"
+        tags = {}
+        while True:
+            ident, _, tag_type = struct.unpack("<32siI", f.read(40))
+            ident = ident.rstrip(b"\0").decode()
+            value = f.read(8)
+            if tag_type == spc_tdc_export.PtuWriter.TY_ANSI_STRING:
+                f.read(struct.unpack("<q", value)[0])
+            tags[ident] = value
+            if ident == "Header_End":
+                break
+        records = np.fromfile(f, dtype=np.uint32)
+    return tags, records
+
+
+def decode_ptu(records):
+    special = records >> 31
+    channel = (records >> 25) & 0x3F
+    nsync = records & 0x3FF
+    overflow = (special == 1) & (channel == 0x3F)
+    offset = np.cumsum(np.where(overflow, nsync, 0)) * 1024
+    keep = ~overflow
+    events = np.zeros(keep.sum(), dtype=spc_tdc_export.EVENT_DTYPE)
+    events["macro_time"] = offset[keep] + nsync[keep]
+    events["micro_time"] = (records[keep] >> 10) & 0x7FFF
+    events["channel"] = np.where(special[keep] == 1, 0, channel[keep])
+    events["marker"] = np.where(special[keep] == 1, channel[keep], 0)
+    return events
+
+
+class Test_Export:  # noqa
+    def test_ptu_round_trip(self, tmp_path):
+        events = make_events()
+        path = tmp_path / "out.ptu"
+        with spc_tdc_export.PtuWriter(path, resolution_s=1e-12, sync_period_s=12.5e-9) as writer:
+            for i in range(0, events.size, 3_000):
+                writer.write(events[i:i + 3_000])
+
+        tags, records = read_ptu(path)
+        assert struct.unpack("<q", tags["TTResult_NumberOfRecords"])[0] == records.size
+        assert (struct.unpack("<q", tags["TTResultFormat_TTTRRecType"])[0]
+                == spc_tdc_export.PtuWriter.REC_TYPE_HYDRAHARP2_T3)
+        assert np.array_equal(decode_ptu(records), events)
+
+    def test_export_stream(self, tmp_path):
+        events = make_events()
+        with spc_tdc_export.PtuWriter(tmp_path / "out.ptu", 1e-12, 12.5e-9) as writer:
+            exported = spc_tdc_export.export_stream(
+                (events[i:i + 4_096] for i in range(0, events.size, 4_096)), writer)
+        assert exported == events.size
+        assert np.array_equal(decode_ptu(read_ptu(tmp_path / "out.ptu")[1]), events)
+
+    def test_failed_header_closes_file(self, tmp_path, monkeypatch):
+        opened = []
+
+        def tracking_open(*args, **kwargs):
+            opened.append(open(*args, **kwargs))
+            return opened[-1]
+        monkeypatch.setattr(spc_tdc_export, "open", tracking_open, raising=False)
+        with pytest.raises(ZeroDivisionError):
+            spc_tdc_export.PtuWriter(tmp_path / "out.ptu", 1e-12, sync_period_s=0.0)
+        assert len(opened) == 1 and opened[0].closed
+
+    def test_photon_hdf5(self, tmp_path):
+        h5py = pytest.importorskip("h5py")
+        events = make_events()
+        with spc_tdc_export.PhotonHdf5Writer(tmp_path / "out.h5", 12.5e-9, 1e-12,
+                                             4096, chunk_events=1024) as writer:
+            spc_tdc_export.export_stream(
+                (events[i:i + 5_000] for i in range(0, events.size, 5_000)), writer)
+
+        photons = events[events["marker"] == 0]
+        with h5py.File(tmp_path / "out.h5") as f:
+            assert f.attrs["format_name"] == "Photon-HDF5"
+            assert np.array_equal(f["photon_data/timestamps"][:], photons["macro_time"])
+            assert np.array_equal(f["photon_data/detectors"][:], photons["channel"])
+            assert np.array_equal(f["photon_data/nanotimes"][:], photons["micro_time"])
+            assert f["photon_data/nanotimes_specs/tcspc_num_bins"][()] == 4096